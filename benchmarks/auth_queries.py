@@ -0,0 +1,102 @@
+"""
+Per-request authentication cost on the invoice list endpoint.
+
+Creates a throwaway test database with one user owning `--invoices` rows, then lists
+them with a real JWT bearer token, first with the stock JWTAuthentication and then
+with CachedJWTAuthentication. Reports SQL queries (and how many of them read the
+user table) and latency per request.
+
+    python benchmarks/auth_queries.py --invoices 1000 --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.authentication import JWTAuthentication  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+from invoices import authentication  # noqa: E402
+from invoices.models import Invoice  # noqa: E402
+from invoices.views import InvoiceViewSet  # noqa: E402
+
+URL = '/api/v1/invoices/invoices/'
+
+AUTHENTICATORS = {
+    'jwt': JWTAuthentication,
+    'cached_jwt': authentication.CachedJWTAuthentication,
+}
+
+
+def seed(user, count):
+    Invoice.objects.bulk_create(
+        (Invoice(user=user, file=f"invoices/bench-{index}.pdf", file_type='pdf', file_size=120 * 1024,
+                 invoice_number=f"BENCH-{index}", status='completed') for index in range(count)),
+        batch_size=5000,
+    )
+
+
+def measure(client, requests):
+    latencies = []
+    queries = []
+    user_queries = []
+    user_table = User._meta.db_table
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(URL, {'pagination': 'cursor'})
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+        queries.append(len(captured))
+        user_queries.append(sum(f'FROM "{user_table}"' in query['sql'] for query in captured.captured_queries))
+    return {
+        'queries_per_request': statistics.mean(queries),
+        'user_queries_per_request': statistics.mean(user_queries),
+        'median_ms': statistics.median(latencies) * 1000,
+        'p95_ms': sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(username='bench-auth', password='benchmark-password')
+        seed(user, args.invoices)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+        results = {}
+        for name, authenticator in AUTHENTICATORS.items():
+            InvoiceViewSet.authentication_classes = [authenticator]
+            authentication._user_cache = None  # Reset; the warm-up request below fills it
+            client.get(URL, {'pagination': 'cursor'})  # Warm up URL resolution and imports
+            results[name] = measure(client, args.requests)
+
+        saved = results['jwt']['queries_per_request'] - results['cached_jwt']['queries_per_request']
+        print(json.dumps(dict(invoices=args.invoices, requests=args.requests, queries_saved_per_request=saved,
+                              **results), indent=2))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
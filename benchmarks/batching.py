@@ -0,0 +1,90 @@
+"""
+Batched vs. unbatched LLM extraction throughput.
+
+Extracts a set of small synthetic text invoices from a pool of worker threads
+against the local stub LLM, once with one call per invoice and once through the
+LLMBatcher, and reports invoices/sec for both.
+
+    python benchmarks/batching.py --invoices 200 --workers 16 --latency 0.5 --batch-size 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from invoices.batching import LLMBatcher  # noqa: E402
+from invoices.llm_backends import StubBackend  # noqa: E402
+from invoices.llm_service import InvoiceExtractor  # noqa: E402
+
+
+def write_corpus(directory, count):
+    paths = []
+    for index in range(count):
+        path = Path(directory) / f"invoice-{index}.txt"
+        path.write_text(f"Vendor {index}\nRef {index:05d}\nPlease remit {index + 10}.00 within 30 days.\n")
+        paths.append(str(path))
+    return paths
+
+
+def measure(extractor, paths, workers):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(extractor.extract_invoice_data, paths))
+    elapsed = time.perf_counter() - started
+    return {
+        'invoices': len(paths),
+        'seconds': elapsed,
+        'invoices_per_second': len(paths) / elapsed,
+        'failures': sum(1 for result in results if not result['success']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.5, help="Stub LLM round-trip seconds.")
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--flush-interval', type=float, default=0.2)
+    parser.add_argument('--token-budget', type=int, default=8000)
+    parser.add_argument('--max-concurrent', type=int, default=4)
+    args = parser.parse_args()
+
+    # Force every invoice through the LLM
+    settings.AI_SETTINGS['RULES_ENABLED'] = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_corpus(directory, args.invoices)
+        backend = StubBackend(latency=args.latency)
+
+        unbatched = measure(InvoiceExtractor(backend=backend), paths, args.workers)
+        batcher = LLMBatcher(
+            backend,
+            max_invoices=args.batch_size,
+            token_budget=args.token_budget,
+            flush_interval=args.flush_interval,
+            max_concurrent=args.max_concurrent,
+        )
+        batched = measure(InvoiceExtractor(backend=backend, batcher=batcher), paths, args.workers)
+
+    print(json.dumps({
+        'unbatched': unbatched,
+        'batched': dict(batched, **batcher.stats()),
+        'speedup': batched['invoices_per_second'] / unbatched['invoices_per_second'],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-file vs. bulk upload wall-clock comparison.
+
+Creates a throwaway test database, then uploads the same synthetic batch (default 500
+small text invoices) three ways: one POST per file, one multipart POST to
+/invoices/bulk/, and one ZIP POST to /invoices/bulk/.
+
+    python benchmarks/bulk_upload.py --files 500
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+URL = '/api/v1/invoices/invoices/'
+
+
+def make_files(count):
+    return [
+        (f"invoice-{index}.txt", f"Invoice Number: BULK-{index:05d}\nTotal Amount Due: {index}.00\n".encode())
+        for index in range(count)
+    ]
+
+
+def per_file(client, files):
+    for name, content in files:
+        response = client.post(URL, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        assert response.status_code == 202, (name, response.status_code, response.data)
+
+
+def bulk_multipart(client, files):
+    response = client.post(f"{URL}bulk/", {'files': [SimpleUploadedFile(name, content) for name, content in files]},
+                           format='multipart')
+    assert response.status_code == 202, (response.status_code, response.content[:200])
+
+
+def bulk_zip(client, files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+    response = client.post(f"{URL}bulk/", {'files': SimpleUploadedFile('batch.zip', buffer.getvalue())},
+                           format='multipart')
+    assert response.status_code == 202, (response.status_code, response.content[:200])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            files = make_files(args.files)
+            results = {}
+            for label, upload in (('per_file', per_file), ('bulk_multipart', bulk_multipart), ('bulk_zip', bulk_zip)):
+                user = User.objects.create_user(username=f"bench-{label}", password='benchmark-password')
+                client = APIClient()
+                client.force_authenticate(user)
+
+                started = time.perf_counter()
+                upload(client, files)
+                results[label] = {
+                    'seconds': time.perf_counter() - started,
+                    'invoices_created': user.invoices.count(),
+                }
+            print(json.dumps(dict(files=args.files, **results), indent=2))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Cost of repeated invoice reads with ETags and the completed-invoice detail cache.
+
+Creates a throwaway test database with one user owning `--invoices` completed rows,
+then replays what the dashboard does: fetch the list and some details once, and keep
+re-fetching them with If-None-Match. Also re-reads the details without an ETag, before
+and after another invoice changes. Reports SQL queries and latency per request kind,
+plus the 304 rate, detail cache hit rate and bytes saved.
+
+    python benchmarks/conditional_reads.py --invoices 1000 --requests 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from invoices.conditional import response_cache_stats  # noqa: E402
+from invoices.models import Invoice  # noqa: E402
+
+URL = '/api/v1/invoices/invoices/'
+DETAILS = 10  # Invoices the simulated user keeps opening
+
+
+def seed(user, count):
+    Invoice.objects.bulk_create(
+        (Invoice(user=user, file=f"invoices/bench-{index}.pdf", file_type='pdf', file_size=120 * 1024,
+                 invoice_number=f"BENCH-{index}", amount=index, status='completed',
+                 processing_completed_at=timezone.now()) for index in range(count)),
+        batch_size=5000,
+    )
+
+
+def measure(client, urls, requests, etags=None, expected=200):
+    latencies = []
+    queries = []
+    for index in range(requests):
+        url = urls[index % len(urls)]
+        headers = {'HTTP_IF_NONE_MATCH': etags[url]} if etags else {}
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == expected, (url, response.status_code)
+        queries.append(len(captured))
+    return {'queries_per_request': statistics.mean(queries), 'median_ms': statistics.median(latencies) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(username='bench-conditional', password='benchmark-password')
+        seed(user, args.invoices)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        ids = list(Invoice.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:DETAILS + 1])
+        lists = [URL, f"{URL}?page=2"]
+        details = [f"{URL}{invoice_id}/" for invoice_id in ids[:DETAILS]]
+
+        results = {'first_fetch': measure(client, lists + details, len(lists) + len(details))}
+        etags = {url: client.get(url)['ETag'] for url in lists + details}
+        results['list_revalidated'] = measure(client, lists, args.requests, etags, expected=304)
+        results['detail_revalidated'] = measure(client, details, args.requests, etags, expected=304)
+        results['detail_cached'] = measure(client, details, args.requests)
+
+        # Another invoice changes: ETags move on, cached payloads are revalidated against their rows
+        changed = Invoice.objects.get(id=ids[DETAILS])
+        changed.amount = 1
+        changed.save()
+        results['detail_after_change'] = measure(client, details, len(details))
+        results['detail_cached_again'] = measure(client, details, args.requests)
+
+        print(json.dumps(dict(invoices=args.invoices, requests=args.requests, **results,
+                              counters=response_cache_stats()), indent=2))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
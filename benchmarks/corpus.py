@@ -0,0 +1,225 @@
+"""
+Synthetic invoice corpus with known ground truth.
+
+Writes text, digital (text-layer) PDF, scanned (image-only) PDF and PNG invoices at
+the requested page counts, plus a manifest.json with each document's expected
+fields and the exact strings they were rendered as. Generation is seeded, so the
+same arguments always produce the same corpus. Needs only Pillow; no network.
+
+    python benchmarks/corpus.py corpus/ --per-kind 20 --pages 1,3,10
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+KINDS = ('text', 'pdf', 'scanned_pdf', 'png')
+
+EXTENSIONS = {
+    'text': '.txt',
+    'pdf': '.pdf',
+    'scanned_pdf': '.pdf',
+    'png': '.png',
+}
+
+# Label variants; the last of each is phrased so the regex fast path misses it and the LLM must answer
+NUMBER_LABELS = ("Invoice Number: {}", "Invoice #: {}", "Bill No. {}", "Reference {}")
+INVOICE_DATE_LABELS = ("Invoice Date: {}", "Statement Date: {}", "Issued on {}")
+DUE_DATE_LABELS = ("Payment Due Date: {}", "Due By: {}", "Kindly settle before {}")
+AMOUNT_LABELS = ("Total Amount Due: ${}", "Balance Due: ${}", "Amount payable {} USD")
+DATE_RENDERINGS = ('%Y-%m-%d', '%m/%d/%Y', '%B %d, %Y')
+
+VENDORS = ("Northwind Traders", "Contoso Utilities", "Globex Supply Co.", "Initech Services", "Umbrella Freight")
+ITEMS = ("Consulting services", "Cloud hosting", "Office supplies", "Freight charges", "Maintenance plan",
+         "Software licence", "Support retainer", "Printing", "Electricity usage", "Water usage")
+
+LINES_PER_PAGE = 40
+
+# Scanned pages: 150 DPI US Letter
+PAGE_SIZE = (1275, 1650)
+MARGIN = 75
+
+
+def document_id(index):
+    return f"BENCH-{index:05d}"
+
+
+def make_invoice(index, pages, rng):
+    """Returns (truth, rendered, page_lines) for one synthetic invoice."""
+    invoice_date = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    due_date = invoice_date + timedelta(days=rng.choice((15, 30, 45)))
+    amount = Decimal(rng.randrange(1000, 2500000)) / 100
+
+    truth = {
+        'invoice_number': document_id(index),
+        'invoice_date': invoice_date.isoformat(),
+        'due_date': due_date.isoformat(),
+        'amount': f"{amount:.2f}",
+    }
+    rendered = {
+        'invoice_number': truth['invoice_number'],
+        'invoice_date': invoice_date.strftime(rng.choice(DATE_RENDERINGS)),
+        'due_date': due_date.strftime(rng.choice(DATE_RENDERINGS)),
+        'amount': f"{amount:,.2f}",
+    }
+
+    header = [
+        rng.choice(VENDORS),
+        f"{rng.randrange(1, 999)} Market Street, Springfield",
+        "",
+        rng.choice(NUMBER_LABELS).format(rendered['invoice_number']),
+        rng.choice(INVOICE_DATE_LABELS).format(rendered['invoice_date']),
+        f"Customer: Account {rng.randrange(100000, 999999)}",
+        "",
+        "Description                      Qty      Price",
+    ]
+    footer = [
+        "",
+        f"Subtotal: {amount:,.2f}",
+        rng.choice(AMOUNT_LABELS).format(rendered['amount']),
+        rng.choice(DUE_DATE_LABELS).format(rendered['due_date']),
+        "Thank you for your business.",
+    ]
+
+    body_lines = max(1, pages * LINES_PER_PAGE - len(header) - len(footer))
+    body = [
+        f"{rng.choice(ITEMS):<32} {rng.randrange(1, 20):>3}   {rng.randrange(100, 50000) / 100:>9.2f}"
+        for _ in range(body_lines)
+    ]
+    lines = header + body + footer
+    page_lines = [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)]
+    return truth, rendered, page_lines
+
+
+def _pdf_string(text):
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return f"({escaped})".encode('latin-1', errors='replace')
+
+
+def write_text_pdf(path, page_lines):
+    """Writes a minimal PDF with a real text layer (Helvetica, one content stream per page)."""
+    font_id = 3
+    objects = {font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"}
+    page_ids = []
+    next_id = 4
+    for lines in page_lines:
+        content = b"BT /F1 11 Tf 15 TL 54 750 Td " + b" ".join(_pdf_string(line) + b" Tj T*" for line in lines) + b" ET"
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (font_id, content_id)
+        )
+        page_ids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    Path(path).write_bytes(bytes(output))
+
+
+def _load_font():
+    from PIL import ImageFont
+
+    for name in ('DejaVuSansMono.ttf', 'DejaVuSans.ttf', 'LiberationMono-Regular.ttf'):
+        try:
+            return ImageFont.truetype(name, 24), 1
+        except OSError:
+            continue
+    return ImageFont.load_default(), 3  # Tiny bitmap font: draw small, then upscale
+
+
+def render_page(lines, font, scale):
+    """Rasterizes one page of text the way a 150 DPI grayscale scan would look."""
+    from PIL import Image, ImageDraw
+
+    width, height = PAGE_SIZE[0] // scale, PAGE_SIZE[1] // scale
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    line_height = (PAGE_SIZE[1] - 2 * MARGIN) // LINES_PER_PAGE // scale
+    for row, line in enumerate(lines):
+        draw.text((MARGIN // scale, MARGIN // scale + row * line_height), line, fill=0, font=font)
+    if scale != 1:
+        image = image.resize(PAGE_SIZE, Image.LANCZOS)
+    return image
+
+
+def write_document(path, kind, page_lines, font=None):
+    if kind == 'text':
+        Path(path).write_text("\n\f\n".join("\n".join(lines) for lines in page_lines))
+    elif kind == 'pdf':
+        write_text_pdf(path, page_lines)
+    else:
+        font, scale = font
+        images = [render_page(lines, font, scale) for lines in page_lines]
+        if kind == 'png':
+            images[0].save(path, 'PNG', dpi=(150, 150))
+        else:
+            images[0].save(path, 'PDF', resolution=150, save_all=True, append_images=images[1:])
+
+
+def generate(directory, per_kind=10, pages=(1, 3), kinds=KINDS, seed=1234):
+    """Writes the corpus into `directory` and returns the manifest entries."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    font = _load_font() if {'scanned_pdf', 'png'} & set(kinds) else None
+
+    manifest = []
+    index = 0
+    for kind in kinds:
+        # Images hold a single page; everything else cycles through the requested page counts
+        kind_pages = (1,) if kind == 'png' else pages
+        for position in range(per_kind):
+            page_count = kind_pages[position % len(kind_pages)]
+            truth, rendered, page_lines = make_invoice(index, page_count, rng)
+            name = f"{kind}-{index:05d}{EXTENSIONS[kind]}"
+            write_document(directory / name, kind, page_lines, font)
+            manifest.append({
+                'file': name, 'kind': kind, 'pages': len(page_lines),
+                'truth': truth, 'rendered': rendered,
+            })
+            index += 1
+
+    (directory / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load_manifest(directory):
+    return json.loads((Path(directory) / 'manifest.json').read_text())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--per-kind', type=int, default=10)
+    parser.add_argument('--pages', default='1,3', help="Comma-separated page counts to cycle through.")
+    parser.add_argument('--kinds', default=",".join(KINDS))
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    manifest = generate(
+        args.directory,
+        per_kind=args.per_kind,
+        pages=tuple(int(count) for count in args.pages.split(',')),
+        kinds=tuple(args.kinds.split(',')),
+        seed=args.seed,
+    )
+    print(json.dumps({'directory': args.directory, 'documents': len(manifest)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
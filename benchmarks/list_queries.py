@@ -0,0 +1,85 @@
+"""
+Invoice list endpoint query budget and latency.
+
+Creates a throwaway test database with one user owning `--invoices` rows, then lists
+them with page-number and cursor pagination, reporting SQL queries and latency per
+request. Exits non-zero when a request exceeds its query budget.
+
+    python benchmarks/list_queries.py --invoices 100000 --requests 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from invoices.models import Invoice  # noqa: E402
+
+URL = '/api/v1/invoices/invoices/'
+
+# Page-number pagination: COUNT + page; cursor pagination: page only; both read the ETag version first
+QUERY_BUDGETS = {'page': 3, 'cursor': 2}
+
+
+def seed(user, count):
+    Invoice.objects.bulk_create(
+        (Invoice(user=user, file=f"invoices/bench-{index}.pdf", file_type='pdf', file_size=120 * 1024,
+                 invoice_number=f"BENCH-{index}", status='completed') for index in range(count)),
+        batch_size=5000,
+    )
+
+
+def measure(client, params, requests):
+    latencies = []
+    queries = []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(URL, params)
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+        queries.append(len(captured))
+    return {'max_queries': max(queries), 'median_ms': statistics.median(latencies) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(username='bench-list', password='benchmark-password')
+        seed(user, args.invoices)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        results = {
+            'page': measure(client, {}, args.requests),
+            'cursor': measure(client, {'pagination': 'cursor'}, args.requests),
+        }
+        print(json.dumps(dict(invoices=args.invoices, **results), indent=2))
+        over_budget = any(results[mode]['max_queries'] > budget for mode, budget in QUERY_BUDGETS.items())
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
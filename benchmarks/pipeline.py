@@ -0,0 +1,249 @@
+"""
+End-to-end extraction benchmark on the synthetic corpus, fully offline.
+
+Runs InvoiceExtractor over every document of a corpus (generated by corpus.py, or
+on the fly into a temp dir) against a deterministic local LLM stub, and reports
+throughput, p50/p95 latency per pipeline stage, peak RSS and field accuracy as
+JSON. With --baseline, the run is compared against an earlier JSON report and the
+script exits non-zero on any regression beyond --tolerance.
+
+    python benchmarks/pipeline.py --per-kind 20 --pages 1,3,10 --latency 0.3 --output run.json
+    python benchmarks/pipeline.py --corpus corpus/ --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from invoices import pdf_extraction  # noqa: E402
+from invoices.ai_settings import ai_setting  # noqa: E402
+from invoices.batching import BATCH_ID_PATTERN  # noqa: E402
+from invoices.instrumentation import ExtractionTrace  # noqa: E402
+from invoices.llm_backends import LLMBackend  # noqa: E402
+from invoices.llm_service import INVOICE_FIELDS, InvoiceExtractor  # noqa: E402
+
+import corpus  # noqa: E402
+
+DOCUMENT_ID_PATTERN = re.compile(r'BENCH-\d{5}')
+
+# Relative slack before a metric counts as regressed; accuracy uses absolute points
+DEFAULT_TOLERANCE = 0.15
+ACCURACY_TOLERANCE = 0.02
+
+
+class CorpusStubBackend(LLMBackend):
+    """
+    Deterministic LLM stand-in that "reads" perfectly but only what reaches it.
+
+    A field is answered only if its rendered string appears in the prompt, so text
+    lost to OCR errors, early stopping or chunk selection shows up as lower accuracy.
+    """
+
+    name = 'corpus-stub'
+
+    def __init__(self, manifest, latency=0.0):
+        self.documents = {entry['truth']['invoice_number']: entry for entry in manifest}
+        self.latency = latency
+
+    def _answer(self, text):
+        flat = " ".join(text.split())
+        match = DOCUMENT_ID_PATTERN.search(flat)
+        entry = self.documents.get(match.group(0)) if match else None
+        if entry is None:
+            return {field: None for field in INVOICE_FIELDS}
+        return {
+            field: entry['truth'][field] if " ".join(entry['rendered'][field].split()) in flat else None
+            for field in INVOICE_FIELDS
+        }
+
+    def invoke(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+
+        headers = list(BATCH_ID_PATTERN.finditer(prompt))
+        if not headers:
+            return json.dumps(self._answer(prompt))
+        answers = {}
+        for position, header in enumerate(headers):
+            end = headers[position + 1].start() if position + 1 < len(headers) else len(prompt)
+            answers[header.group(1)] = self._answer(prompt[header.end():end])
+        return json.dumps(answers)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def field_correct(field, expected, actual):
+    if actual is None:
+        return False
+    if field == 'amount':
+        return Decimal(str(actual)) == Decimal(expected)
+    return str(actual) == expected
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of reaped children (ru_maxrss is KB on Linux)."""
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor,
+    }
+
+
+def run(directory, manifest, extractor, workers):
+    def extract(entry):
+        trace = ExtractionTrace()
+        started = time.perf_counter()
+        result = extractor.extract_invoice_data(str(Path(directory) / entry['file']), trace=trace)
+        return entry, result, trace, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(extract, manifest))
+    wall = time.perf_counter() - started
+
+    # Child processes (PDF pool) only count towards RUSAGE_CHILDREN once reaped
+    if pdf_extraction._pool is not None:
+        pdf_extraction._pool.shutdown()
+        pdf_extraction._reset_pool()
+
+    stage_times = defaultdict(list)
+    totals = []
+    correct = defaultdict(int)
+    checked = defaultdict(int)
+    failures = 0
+    for entry, result, trace, seconds in outcomes:
+        totals.append(seconds)
+        for stage, stage_seconds in trace.stages.items():
+            stage_times[stage].append(stage_seconds)
+        if not result['success']:
+            failures += 1
+        data = result.get('data', {}) if result['success'] else {}
+        for field in INVOICE_FIELDS:
+            checked[entry['kind']] += 1
+            correct[entry['kind']] += field_correct(field, entry['truth'][field], data.get(field))
+
+    return {
+        'documents': len(manifest),
+        'failures': failures,
+        'seconds': wall,
+        'documents_per_second': len(manifest) / wall if wall else 0.0,
+        'latency': {'p50': percentile(totals, 0.5), 'p95': percentile(totals, 0.95)},
+        'stages': {
+            stage: {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'count': len(values)}
+            for stage, values in sorted(stage_times.items())
+        },
+        'accuracy': sum(correct.values()) / sum(checked.values()) if checked else 0.0,
+        'accuracy_by_kind': {kind: correct[kind] / checked[kind] for kind in sorted(checked)},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Lists metrics that got worse than the baseline by more than the tolerance."""
+    regressions = []
+
+    def record(name, now, before, worse):
+        if before is not None and worse:
+            regressions.append({'metric': name, 'baseline': before, 'current': now})
+
+    def slower(name, now, before):
+        # Ignore sub-millisecond jitter on stages that are cheap to begin with
+        record(name, now, before, before is not None and now > before * (1 + tolerance) and now - before > 0.001)
+
+    def less_accurate(name, now, before):
+        record(name, now, before, before is not None and now < before - ACCURACY_TOLERANCE)
+
+    before = baseline.get('documents_per_second')
+    record('documents_per_second', current['documents_per_second'], before,
+           before is not None and current['documents_per_second'] < before * (1 - tolerance))
+    for quantile in ('p50', 'p95'):
+        slower(f'latency.{quantile}', current['latency'][quantile], baseline.get('latency', {}).get(quantile))
+    for stage, values in current['stages'].items():
+        slower(f'stages.{stage}.p95', values['p95'], baseline.get('stages', {}).get(stage, {}).get('p95'))
+    slower('peak_rss_mb.self', current['peak_rss_mb']['self'], baseline.get('peak_rss_mb', {}).get('self'))
+    less_accurate('accuracy', current['accuracy'], baseline.get('accuracy'))
+    for kind, value in current['accuracy_by_kind'].items():
+        less_accurate(f'accuracy_by_kind.{kind}', value, baseline.get('accuracy_by_kind', {}).get(kind))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help="Existing corpus directory (default: generate one into a temp dir).")
+    parser.add_argument('--per-kind', type=int, default=10)
+    parser.add_argument('--pages', default='1,3')
+    parser.add_argument('--kinds', default=",".join(corpus.KINDS))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent extractions.")
+    parser.add_argument('--latency', type=float, default=0.2, help="Stub LLM round-trip seconds.")
+    parser.add_argument('--no-rules', action='store_true', help="Disable the regex fast path.")
+    parser.add_argument('--output', help="Also write the JSON report to this file.")
+    parser.add_argument('--baseline', help="JSON report to compare against; exit 1 on regressions.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    settings.AI_SETTINGS['RULES_ENABLED'] = not args.no_rules
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.corpus or scratch
+        if args.corpus:
+            manifest = corpus.load_manifest(directory)
+        else:
+            manifest = corpus.generate(
+                directory,
+                per_kind=args.per_kind,
+                pages=tuple(int(count) for count in args.pages.split(',')),
+                kinds=tuple(args.kinds.split(',')),
+                seed=args.seed,
+            )
+
+        extractor = InvoiceExtractor(backend=CorpusStubBackend(manifest, latency=args.latency))
+        report = run(directory, manifest, extractor, args.workers)
+
+    report['config'] = {
+        'workers': args.workers,
+        'latency': args.latency,
+        'rules': not args.no_rules,
+        'pages': args.pages,
+        'kinds': sorted({entry['kind'] for entry in manifest}),
+        'ocr_workers': ai_setting('OCR_WORKERS') or os.cpu_count(),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        report['regressions'] = compare(report, baseline, args.tolerance)
+        if baseline.get('config') != report['config']:
+            report['baseline_config_differs'] = True  # Numbers may not be comparable
+        exit_code = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
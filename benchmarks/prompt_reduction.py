@@ -0,0 +1,88 @@
+"""
+Prompt-size reduction benchmark.
+
+Runs the extractor over a corpus directory of `<name>.txt` invoices with matching
+`<name>.json` ground truth, once with full-text prompts and once with relevance-based
+chunk selection, and reports tokens sent, LLM latency and field accuracy.
+
+    DJANGO_SETTINGS_MODULE=invoice_extractor.settings python benchmarks/prompt_reduction.py corpus/ --ranker keyword
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from invoices.chunking import estimate_tokens, select_relevant_text  # noqa: E402
+from invoices.llm_service import INVOICE_FIELDS, InvoiceExtractor  # noqa: E402
+
+
+def field_matches(expected, actual):
+    return str(expected) == str(actual) if expected is not None else actual is None
+
+
+def run(corpus, chunk_selection, ranker):
+    """Extracts every document in the corpus and returns aggregate numbers."""
+    settings.AI_SETTINGS.update({
+        'CHUNK_SELECTION': chunk_selection,
+        'CHUNK_RANKER': ranker,
+        'RULES_ENABLED': False,  # Always exercise the LLM path
+    })
+    extractor = InvoiceExtractor()
+
+    tokens = 0
+    seconds = 0.0
+    correct = 0
+    total = 0
+    for text_path in sorted(corpus.glob('*.txt')):
+        expected = json.loads(text_path.with_suffix('.json').read_text())
+        text = text_path.read_text()
+        tokens += estimate_tokens(select_relevant_text(text, INVOICE_FIELDS) if chunk_selection else text)
+
+        started = time.perf_counter()
+        result = extractor.extract_invoice_data(str(text_path))
+        seconds += time.perf_counter() - started
+
+        data = result.get('data', {}) if result['success'] else {}
+        for field in INVOICE_FIELDS:
+            total += 1
+            correct += field_matches(expected.get(field), data.get(field))
+
+    return {
+        'chunk_selection': chunk_selection,
+        'documents': len(list(corpus.glob('*.txt'))),
+        'tokens_sent': tokens,
+        'llm_seconds': seconds,
+        'field_accuracy': correct / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', type=Path)
+    parser.add_argument('--ranker', choices=['keyword', 'embedding'], default='keyword')
+    args = parser.parse_args()
+
+    baseline = run(args.corpus, chunk_selection=False, ranker=args.ranker)
+    reduced = run(args.corpus, chunk_selection=True, ranker=args.ranker)
+    print(json.dumps({
+        'ranker': args.ranker,
+        'full_text': baseline,
+        'chunk_selection': reduced,
+        'tokens_saved': baseline['tokens_sent'] - reduced['tokens_sent'],
+        'seconds_saved': baseline['llm_seconds'] - reduced['llm_seconds'],
+        'accuracy_change': reduced['field_accuracy'] - baseline['field_accuracy'],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
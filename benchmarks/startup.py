@@ -0,0 +1,78 @@
+"""
+Django startup time / RSS benchmark.
+
+Boots the project in fresh interpreters (as `manage.py migrate`, a shell or a gunicorn
+worker would) with model preloading off and on, and reports wall time and peak RSS.
+
+    python benchmarks/startup.py --runs 5 --max-seconds 3 --max-rss-mb 250
+
+Exits non-zero when the lazy (default) startup exceeds the given budgets.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Runs in the child interpreter; prints elapsed seconds and peak RSS in MB
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss_kb / 1024 / 1024 if sys.platform == 'darwin' else rss_kb / 1024
+print(json.dumps({'seconds': elapsed, 'rss_mb': rss_mb}))
+"""
+
+
+def measure(preload, runs):
+    """Boots Django `runs` times and returns median seconds and peak RSS."""
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+    env['PRELOAD_MODELS'] = 'True' if preload else 'False'
+
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        'preload': preload,
+        'runs': runs,
+        'median_seconds': statistics.median(s['seconds'] for s in samples),
+        'max_rss_mb': max(s['rss_mb'] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--with-preload', action='store_true', help="Also measure PRELOAD_MODELS=True.")
+    parser.add_argument('--max-seconds', type=float, help="Fail if lazy startup is slower than this.")
+    parser.add_argument('--max-rss-mb', type=float, help="Fail if lazy startup RSS exceeds this.")
+    args = parser.parse_args()
+
+    results = [measure(preload=False, runs=args.runs)]
+    if args.with_preload:
+        results.append(measure(preload=True, runs=args.runs))
+    print(json.dumps(results, indent=2))
+
+    lazy = results[0]
+    failed = (
+        (args.max_seconds is not None and lazy['median_seconds'] > args.max_seconds) or
+        (args.max_rss_mb is not None and lazy['max_rss_mb'] > args.max_rss_mb)
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
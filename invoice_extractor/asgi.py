@@ -0,0 +1,7 @@
+import os
+from django.core.asgi import get_asgi_application
+
+# ✅ ASGI entry point; serve with an ASGI server so status event subscribers don't each hold a thread
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_extractor.settings')
+
+application = get_asgi_application()
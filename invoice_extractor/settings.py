@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # 🔹 Full-text and trigram search lookups
     
     # 🔹 Third-party packages
     'rest_framework',
@@ -104,13 +105,16 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# ✅ Uploads are streamed through a handler that enforces size/type limits and hashes as chunks arrive
+FILE_UPLOAD_HANDLERS = ['invoices.uploads.InvoiceUploadHandler']
+
 # ✅ Default Primary Key Field Type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ✅ Django REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'invoices.authentication.CachedJWTAuthentication',  # JWT, with the user resolved from a short-TTL cache
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -127,6 +131,20 @@ SIMPLE_JWT = {
     'SIGNING_KEY': SECRET_KEY,
 }
 
+# ✅ Authenticated user cache (see invoices.authentication)
+AUTH_USER_CACHE = {
+    'TTL': 60,  # Seconds; also the longest a change made by another process can go unnoticed without BACKEND
+    'MAX_ENTRIES': 10000,
+    'BACKEND': os.getenv('AUTH_USER_CACHE_BACKEND') or None,  # A CACHES alias shared by all processes (e.g. Redis)
+}
+
+# ✅ Conditional invoice reads: weak ETags from a per-user change version, cached completed-invoice payloads
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True',
+    'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', 'default'),  # CACHES alias; share one (e.g. Redis) across processes
+    'TTL': 300,
+}
+
 # ✅ CORS Configuration (for Frontend Integration)
 CORS_ALLOW_ALL_ORIGINS = os.getenv('CORS_ALLOW_ALL_ORIGINS', 'True') == 'True'
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
@@ -137,8 +155,102 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "your-google-api-key")
 # ✅ AI-Powered Invoice Extraction Settings
 AI_SETTINGS = {
     'LLM_MODEL': "gemini-pro",
+    'LLM_BACKEND': os.getenv('LLM_BACKEND', 'gemini'),  # 'gemini', 'stub' or a dotted path to an LLMBackend
     'EMBEDDING_MODEL': "sentence-transformers/all-MiniLM-L6-v2",
+    'WHISPER_MODEL': "base",
+    'PRELOAD_MODELS': os.getenv('PRELOAD_MODELS', 'False') == 'True',  # Load ML models at startup (use with gunicorn --preload)
     'CHUNK_SIZE': 512,
     'CHUNK_OVERLAP': 128,
+    'CHUNK_SELECTION': True,  # Send only the most relevant chunks to the LLM
+    'CHUNK_RANKER': 'keyword',  # 'keyword' or 'embedding' (needs sentence-transformers)
+    'PROMPT_TOKEN_BUDGET': 2000,  # Approximate document tokens per prompt
+    'PDF_WORKERS': None,  # Processes for parallel PDF text extraction (None = CPU count)
+    'PDF_PAGES_PER_CHUNK': 8,  # Pages handed to a PDF worker at a time
+    'PDF_PARALLEL_MIN_PAGES': 16,  # Smaller PDFs are read serially
+    'PDF_EARLY_STOP': False,  # Stop reading once total/date/number candidates are found
+    'OCR_FALLBACK': True,  # OCR PDF pages that have no text layer
+    'OCR_WORKERS': None,  # Parallel rasterize/tesseract jobs (None = CPU count)
+    'OCR_DPI': 300,  # Rasterization DPI; higher-DPI images are downscaled to it
+    'OCR_MAX_DIMENSION': 3500,  # Longest side in pixels fed to tesseract
+    'LLM_BATCHING': os.getenv('LLM_BATCHING', 'False') == 'True',  # Pack concurrent LLM requests into one prompt
+    'BATCH_MAX_INVOICES': 10,  # Invoices per batched prompt
+    'BATCH_TOKEN_BUDGET': 8000,  # Approximate document tokens per batched prompt
+    'BATCH_FLUSH_INTERVAL': 2.0,  # Seconds a request waits for company before the batch is sent
+    'BATCH_MAX_CONCURRENT': 4,  # Batched prompts in flight at once
+    'LLM_GUARD': True,  # Rate limit, retry and circuit-break LLM calls
+    'LLM_MAX_CONCURRENT': 4,  # In-flight LLM requests per process
+    'LLM_REQUESTS_PER_MINUTE': 60,  # Per-process request budget (split the provider quota across processes)
+    'LLM_MAX_RETRIES': 4,  # Retries for transient errors (jittered exponential backoff)
+    'LLM_BREAKER_THRESHOLD': 5,  # Consecutive transient failures before the breaker opens
+    'LLM_BREAKER_RESET': 60.0,  # Seconds the breaker stays open; parked invoices retry after this
+    'LLM_BREAKER_PROBE_TIMEOUT': 60.0,  # Seconds before a half-open probe with no outcome is replaced
+    'RULES_ENABLED': True,  # Resolve fields with regex rules before calling the LLM
+    'RULES_MIN_CONFIDENCE': 0.9,  # Rule matches below this are re-asked from the LLM
+    'EXTRACTION_CACHE_ENABLED': True,  # Reuse results for identical file content
+    'EXTRACTION_CACHE_MAX_ENTRIES': 10000,  # LRU bound for the extraction cache table
+}
+
+
+# ✅ Background Extraction Queue (see `manage.py run_extraction_workers`)
+EXTRACTION_QUEUE = {
+    'WORKERS': int(os.getenv('EXTRACTION_WORKERS', '4')),
+    'POOL': os.getenv('EXTRACTION_POOL', 'thread'),  # 'thread' or 'process'
+    'BATCH_SIZE': 10,  # Invoices claimed per poll
+    'POLL_INTERVAL': 2.0,  # Seconds between polls when the queue is empty
+    'VISIBILITY_TIMEOUT': 300,  # Seconds without a lease renewal (every third of this) before a 'processing' invoice is reclaimed
+    'MAX_ATTEMPTS': 3,  # Claims before an invoice is marked failed
+}
+
+# ✅ Bulk Upload (POST /invoices/bulk/)
+BULK_UPLOAD = {
+    'MAX_FILES': 500,  # Invoices accepted per request
+    'MAX_ARCHIVE_SIZE': 256 * 1024 * 1024,  # Bytes per uploaded ZIP archive
+    'MAX_REQUEST_SIZE': 512 * 1024 * 1024,  # Larger request bodies are refused before any file is read
+    'MAX_ARCHIVE_UNCOMPRESSED': 1024 * 1024 * 1024,  # Total inflated bytes per request (ZIP bomb guard)
+    'BULK_CREATE_BATCH_SIZE': 100,
 }
+# Django refuses multipart bodies with more file parts (default 100) before the bulk view runs
+DATA_UPLOAD_MAX_NUMBER_FILES = BULK_UPLOAD['MAX_FILES']
 
+# ✅ Invoice Status Events (GET /invoices/events/ and /invoices/events/stream/)
+STATUS_EVENTS = {
+    'POLL_INTERVAL': 1.0,  # Seconds between change-log reads (one query per process, shared by all subscribers)
+    'LONG_POLL_TIMEOUT': 25,  # Seconds a long-poll request waits before returning an empty batch
+    'HEARTBEAT_INTERVAL': 15,  # Seconds between SSE keep-alive comments
+    'RETENTION_HOURS': 24,  # Older events are pruned by the extraction workers
+}
+
+# ✅ Extraction Instrumentation (stage timings are stored on Invoice.processing_metrics)
+INSTRUMENTATION = {
+    'METRICS_PORT': int(os.getenv('EXTRACTION_METRICS_PORT', '0')) or None,  # Prometheus endpoint on the workers
+    'PROFILE_SAMPLE_RATE': float(os.getenv('EXTRACTION_PROFILE_SAMPLE_RATE', '0')),  # Fraction of jobs run under cProfile
+    'PROFILE_DIR': BASE_DIR / 'profiles',  # Where sampled .prof files are written
+}
+
+# ✅ Invoice Text Search (GET /invoices/search/?q=)
+SEARCH = {
+    'CONFIG': 'english',  # PostgreSQL text search configuration
+    'COMPRESS_THRESHOLD': 1024,  # Extracted texts above this many bytes are stored zlib-compressed
+    'MAX_INDEXED_CHARS': 200000,  # Only the first N characters go into the search vector
+    'SNIPPET_CHARS': 200,  # Length of the highlighted excerpt per result
+    'MAX_RESULTS': 100,
+}
+
+# ✅ Near-duplicate detection at ingest (see invoices.dedup)
+DEDUP = {
+    'ENABLED': os.getenv('DEDUP_ENABLED', 'True') == 'True',
+    'TEXT_THRESHOLD': 0.85,  # Estimated text similarity above which an upload is flagged as a copy
+    'MAX_CANDIDATES': 20,
+    'MAX_TEXT_CHARS': 50000,
+}
+
+# ✅ Audio invoices (Whisper); the model lives in one `run_transcription_worker` process per host
+TRANSCRIPTION = {
+    'WORKER_ADDRESS': os.getenv('TRANSCRIPTION_WORKER_ADDRESS') or None,  # e.g. '127.0.0.1:6010'; unset = in-process
+    'AUTHKEY': os.getenv('TRANSCRIPTION_AUTHKEY') or None,  # Shared secret, required when WORKER_ADDRESS is set
+    'CHUNK_SECONDS': 30,  # Whisper's context window
+    'BATCH_SIZE': int(os.getenv('TRANSCRIPTION_BATCH_SIZE', '8')),  # Chunks per forward pass
+    'LANGUAGE': 'en',
+    'TIMEOUT': 900,  # Seconds an extraction waits for its transcript
+    'RETRY_AFTER': 60,  # Seconds an audio invoice is parked while the worker is down
+}
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def ai_setting(name, default=None):
+    """Returns a value from settings.AI_SETTINGS (extraction, OCR, PDF, chunking, cache and LLM options)."""
+    return getattr(settings, 'AI_SETTINGS', {}).get(name, default)
@@ -0,0 +1,236 @@
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+from .models import Invoice, InvoiceAmountBucket, InvoiceStats
+
+# ✅ Invoice fields that feed the per-user aggregates
+TRACKED_FIELDS = ('user_id', 'status', 'amount', 'due_date', 'invoice_date', 'uploaded_at', 'is_deleted')
+
+STATUS_COUNT_FIELDS = {status: f"{status}_count" for status, _ in Invoice.STATUS_CHOICES}
+
+CENT = Decimal('0.01')  # Invoice.amount precision; unsaved values are rounded the way the DB stores them
+
+
+def snapshot(invoice):
+    """Captures the tracked fields of an invoice instance."""
+    return {field: getattr(invoice, field) for field in TRACKED_FIELDS}
+
+
+def contribution(state):
+    """What one invoice adds to its owner's aggregates (nothing once soft-deleted)."""
+    if not state or state['is_deleted']:
+        return None
+
+    has_amount = state['amount'] is not None
+    month_source = state['invoice_date'] or (state['uploaded_at'].date() if state['uploaded_at'] else None)
+    return {
+        'user_id': state['user_id'],
+        'status': state['status'],
+        'amount': Decimal(str(state['amount'])).quantize(CENT) if has_amount else Decimal('0'),
+        'due': state['due_date'] if has_amount else None,
+        'month': month_source.replace(day=1) if has_amount and month_source else None,
+    }
+
+
+def _bump_stats(user_id, deltas):
+    """Adds `deltas` to a user's InvoiceStats row; rebuilds the row if it doesn't exist yet."""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+    updates['updated_at'] = timezone.now()  # update() skips auto_now
+    if InvoiceStats.objects.filter(user_id=user_id).update(**updates):
+        return
+    # First change for this user (or stats were never built): derive everything from the table
+    rebuild_user_stats(user_id)
+
+
+def _bump_bucket(user_id, kind, day, amount, count):
+    updates = {'amount': F('amount') + amount, 'count': F('count') + count}
+    if InvoiceAmountBucket.objects.filter(user_id=user_id, kind=kind, day=day).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            InvoiceAmountBucket.objects.create(user_id=user_id, kind=kind, day=day, amount=amount, count=count)
+    except IntegrityError:
+        InvoiceAmountBucket.objects.filter(user_id=user_id, kind=kind, day=day).update(**updates)
+
+
+def _apply(user_id, signed_changes):
+    """Adds (sign=1) or removes (sign=-1) invoice contributions for one user, one UPDATE per row touched."""
+    if not InvoiceStats.objects.filter(user_id=user_id).exists():
+        rebuild_user_stats(user_id)  # The rebuild already reflects the current table
+        return
+
+    stats = Counter()
+    buckets = {}
+    for change, sign in signed_changes:
+        stats['invoice_count'] += sign
+        stats['total_amount'] += sign * change['amount']
+        stats[STATUS_COUNT_FIELDS[change['status']]] += sign
+        for kind in ('due', 'month'):
+            if change[kind]:
+                amount, count = buckets.get((kind, change[kind]), (Decimal('0'), 0))
+                buckets[(kind, change[kind])] = (amount + sign * change['amount'], count + sign)
+
+    _bump_stats(user_id, stats)
+    for (kind, day), (amount, count) in buckets.items():
+        if amount or count:
+            _bump_bucket(user_id, kind, day, amount, count)
+
+
+def apply_change(old_state, new_state):
+    """Moves the aggregates from an invoice's old state to its new one (either may be None)."""
+    old, new = contribution(old_state), contribution(new_state)
+    if old == new:
+        return
+
+    by_user = {}
+    for change, sign in ((old, -1), (new, 1)):
+        if change:
+            by_user.setdefault(change['user_id'], []).append((change, sign))
+    with transaction.atomic():
+        for user_id, signed_changes in by_user.items():
+            _apply(user_id, signed_changes)
+
+
+def bump_versions(user_ids):
+    """Marks the users' invoices as changed, so clients holding an older ETag get fresh data."""
+    for user_id in set(user_ids):
+        if InvoiceStats.objects.filter(user_id=user_id).update(version=F('version') + 1):
+            continue
+        rebuild_user_stats(user_id)
+        InvoiceStats.objects.filter(user_id=user_id).update(version=F('version') + 1)
+
+
+def user_version(user_id):
+    """Current change version of a user's invoices (0 before their first write)."""
+    return InvoiceStats.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+
+def record_created(invoices):
+    """Adds invoices inserted without save() signals (bulk_create), batched per user."""
+    by_user = {}
+    for invoice in invoices:
+        change = contribution(snapshot(invoice))
+        if change:
+            by_user.setdefault(change['user_id'], []).append((change, 1))
+    with transaction.atomic():
+        for user_id, signed_changes in by_user.items():
+            _apply(user_id, signed_changes)
+        bump_versions(invoice.user_id for invoice in invoices)
+
+
+def record_changes(changes):
+    """Applies invoices written with bulk_update() given their (old state, new state) snapshots, batched per user."""
+    by_user = {}
+    for old_state, new_state in changes:
+        old, new = contribution(old_state), contribution(new_state)
+        if old == new:
+            continue
+        for change, sign in ((old, -1), (new, 1)):
+            if change:
+                by_user.setdefault(change['user_id'], []).append((change, sign))
+    with transaction.atomic():
+        for user_id, signed_changes in by_user.items():
+            _apply(user_id, signed_changes)
+        bump_versions(new_state['user_id'] for _, new_state in changes)
+
+
+def record_status_changes(rows, new_status):
+    """Applies a queryset.update(status=...) given the (user_id, old status) of each updated row."""
+    moves = Counter((user_id, status) for user_id, status in rows if status != new_status)
+    with transaction.atomic():
+        for (user_id, old_status), count in moves.items():
+            _bump_stats(user_id, {STATUS_COUNT_FIELDS[old_status]: -count, STATUS_COUNT_FIELDS[new_status]: count})
+        bump_versions(user_id for user_id, _ in rows)
+
+
+def compute_user_stats(user_id):
+    """Aggregates a user's invoices from scratch: (stats fields, {(kind, day): (amount, count)})."""
+    live = Invoice.objects.filter(user_id=user_id, is_deleted=False)
+
+    totals = live.aggregate(
+        invoice_count=Count('id'),
+        total_amount=Coalesce(Sum('amount'), Decimal('0')),
+        **{field: Count('id', filter=Q(status=status)) for status, field in STATUS_COUNT_FIELDS.items()},
+    )
+
+    buckets = {}
+    with_amount = live.filter(amount__isnull=False)
+    for row in with_amount.filter(due_date__isnull=False).values('due_date').annotate(
+            total=Sum('amount'), n=Count('id')):
+        buckets[('due', row['due_date'])] = (row['total'], row['n'])
+    months = with_amount.annotate(
+        month_source=Coalesce('invoice_date', TruncDate('uploaded_at'), output_field=DateField()),
+    ).annotate(month=TruncMonth('month_source', output_field=DateField()))
+    for row in months.values('month').annotate(total=Sum('amount'), n=Count('id')):
+        if row['month']:
+            buckets[('month', row['month'])] = (row['total'], row['n'])
+
+    return totals, buckets
+
+
+def rebuild_user_stats(user_id):
+    """Replaces a user's aggregates with freshly computed ones."""
+    totals, buckets = compute_user_stats(user_id)
+    with transaction.atomic():
+        InvoiceStats.objects.update_or_create(user_id=user_id, defaults=totals)
+        InvoiceAmountBucket.objects.filter(user_id=user_id).delete()
+        InvoiceAmountBucket.objects.bulk_create(
+            InvoiceAmountBucket(user_id=user_id, kind=kind, day=day, amount=amount, count=count)
+            for (kind, day), (amount, count) in buckets.items()
+        )
+
+
+def verify_user_stats(user_id):
+    """Returns a list of human-readable mismatches between stored and recomputed aggregates."""
+    totals, buckets = compute_user_stats(user_id)
+    stored = InvoiceStats.objects.filter(user_id=user_id).values(*totals.keys()).first()
+    if stored is None:
+        return ["missing stats row"] if totals['invoice_count'] else []
+
+    problems = [
+        f"{field}: stored {stored[field]}, actual {value}"
+        for field, value in totals.items() if stored[field] != value
+    ]
+    stored_buckets = {
+        (row['kind'], row['day']): (row['amount'], row['count'])
+        for row in InvoiceAmountBucket.objects.filter(user_id=user_id).exclude(count=0).values('kind', 'day', 'amount', 'count')
+    }
+    for key in set(stored_buckets) | set(buckets):
+        if stored_buckets.get(key) != buckets.get(key):
+            problems.append(f"{key[0]} bucket {key[1]}: stored {stored_buckets.get(key)}, actual {buckets.get(key)}")
+    return problems
+
+
+def user_analytics(user, days=30, months=12):
+    """Dashboard numbers for a user, read from the summary tables (three small indexed queries)."""
+    stats = InvoiceStats.objects.filter(user=user).first()
+    if stats is None:
+        rebuild_user_stats(user.pk)
+        stats = InvoiceStats.objects.get(user=user)
+
+    today = timezone.localdate()
+    due = InvoiceAmountBucket.objects.filter(
+        user=user, kind='due', day__gte=today, day__lte=today + timedelta(days=days),
+    ).aggregate(amount=Coalesce(Sum('amount'), Decimal('0')), count=Coalesce(Sum('count'), 0))
+
+    first_month = (today.replace(day=1) - timedelta(days=31 * (months - 1))).replace(day=1)
+    monthly = InvoiceAmountBucket.objects.filter(
+        user=user, kind='month', day__gte=first_month, count__gt=0,
+    ).order_by('day').values('day', 'amount', 'count')
+
+    return {
+        'invoice_count': stats.invoice_count,
+        'total_amount': stats.total_amount,
+        'status_counts': {status: getattr(stats, field) for status, field in STATUS_COUNT_FIELDS.items()},
+        'due_soon': {'days': days, 'amount': due['amount'], 'count': due['count']},
+        'monthly_spend': [
+            {'month': row['day'].strftime('%Y-%m'), 'amount': row['amount'], 'count': row['count']}
+            for row in monthly
+        ],
+    }
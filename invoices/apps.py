@@ -1,9 +1,7 @@
 from django.apps import AppConfig
 import logging
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-import torch
-import whisper
+from .ai_settings import ai_setting
 
 logger = logging.getLogger(__name__)
 
@@ -11,30 +9,17 @@ class InvoicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoices'
 
-    llm = None  # Google Generative AI Model
-    whisper_model = None  # Whisper Model
-
     def ready(self):
         logger.info("📄 Invoice app is initializing...")
 
-        # ✅ Load Google Generative AI (Gemini) for invoice processing
-        google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
-            logger.warning("⚠️ GOOGLE_API_KEY is missing. LLM features might not work.")
-        else:
-            try:
-                InvoicesConfig.llm = ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=google_api_key)
-                logger.info("✅ Google Generative AI (Gemini) initialized successfully!")
-            except Exception as e:
-                logger.error(f"❌ Failed to initialize Google Generative AI: {e}")
+        # ✅ Keeps the per-user summaries and the status event log in step with invoice saves
+        from . import signals  # noqa: F401
 
-        # ✅ Load Whisper for audio-based invoice processing
-        try:
-            if torch.cuda.is_available():
-                InvoicesConfig.whisper_model = whisper.load_model("base").to("cuda")
-            else:
-                InvoicesConfig.whisper_model = whisper.load_model("base")
-            logger.info("✅ Whisper AI model loaded successfully!")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Whisper model: {e}")
+        # ✅ The Gemini client is created lazily by llm_service.get_extractor() and shared per process
+        if not os.getenv("GOOGLE_API_KEY"):
+            logger.warning("⚠️ GOOGLE_API_KEY is missing. LLM features might not work.")
 
+        # ✅ Whisper (torch) is only imported on first use unless preloading is requested
+        if ai_setting('PRELOAD_MODELS', False):
+            from .ml import preload_models
+            preload_models()
@@ -0,0 +1,134 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+# ✅ Defaults for the authenticated-user cache (overridable via settings.AUTH_USER_CACHE)
+AUTH_CACHE_DEFAULTS = {
+    'TTL': 60,  # Seconds a resolved user is reused; bounds staleness across processes without a shared backend
+    'MAX_ENTRIES': 10000,  # In-process LRU size
+    'BACKEND': None,  # Name of a Django cache (e.g. Redis) shared by all processes; None = in-process only
+}
+
+CACHE_KEY_PREFIX = 'jwt-user:'
+
+
+def auth_cache_setting(name):
+    """Returns a user cache setting, falling back to AUTH_CACHE_DEFAULTS."""
+    return getattr(settings, 'AUTH_USER_CACHE', {}).get(name, AUTH_CACHE_DEFAULTS[name])
+
+
+class LocalUserCache:
+    """Size-bounded LRU of user objects with a per-entry TTL, safe to share between threads."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # user_id -> (expires_at, user)
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+
+class SharedUserCache:
+    """The same interface on top of a Django cache backend, so invalidation reaches every process."""
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, user_id):
+        return self.cache.get(f"{CACHE_KEY_PREFIX}{user_id}")
+
+    def set(self, user_id, user):
+        self.cache.set(f"{CACHE_KEY_PREFIX}{user_id}", user, self.ttl)
+
+    def delete(self, user_id):
+        self.cache.delete(f"{CACHE_KEY_PREFIX}{user_id}")
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    """Returns the process-wide user cache, built from settings on first use."""
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                backend = auth_cache_setting('BACKEND')
+                if backend:
+                    _user_cache = SharedUserCache(backend, auth_cache_setting('TTL'))
+                else:
+                    _user_cache = LocalUserCache(auth_cache_setting('MAX_ENTRIES'), auth_cache_setting('TTL'))
+    return _user_cache
+
+
+def invalidate_user(user_id):
+    """Drops a user's cached entry (connected to User save/delete in invoices.signals)."""
+    if _user_cache is not None or auth_cache_setting('BACKEND'):
+        get_user_cache().delete(str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from a short-TTL cache instead
+    of loading the User row on every request.
+
+    Misses fall through to the stock lookup. Cached users get the same active and
+    password-change checks. Each request receives its own copy of the cached user.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)  # Raises InvalidToken
+
+        user_id = str(user_id)  # Same key whether the claim was serialized as a number or a string
+        cache = get_user_cache()
+        user = cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(user_id, user)
+            return copy.copy(user)
+
+        self.check_user(user, validated_token)
+        return copy.copy(user)
+
+    def check_user(self, user, validated_token):
+        """The checks JWTAuthentication.get_user applies after loading the user."""
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            from rest_framework_simplejwt.utils import get_md5_hash_password
+
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
@@ -0,0 +1,212 @@
+import re
+import json
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from .chunking import estimate_tokens
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Prompt for several invoices at once; the response is keyed by invoice id
+BATCH_PROMPT_TEMPLATE = """
+        You are an invoice data extraction assistant. Extract the following information from EACH of the invoices below:
+
+{field_descriptions}
+
+        Format the response as a **valid JSON object** keyed by invoice id, where every value has these exact keys:
+        ```
+        {{{{
+            "<invoice id>": {{{{
+{json_keys}
+            }}}}
+        }}}}
+        ```
+
+        If any field is missing, return `null` for that field. Include every invoice id exactly once.
+
+{{documents}}
+
+        JSON Response:
+        """
+
+BATCH_DOCUMENT_TEMPLATE = """        Invoice id "{key}":
+        ```
+        {text}
+        ```
+"""
+
+# Matches the id headers of a batch prompt (used by StubBackend to answer batches)
+BATCH_ID_PATTERN = re.compile(r'^\s*Invoice id "([^"]+)":', re.MULTILINE)
+
+
+class BatchSliceError(Exception):
+    """An invoice's slice of a batched response was missing or malformed; retry it on its own."""
+
+
+def parse_json_response(response_text):
+    """Pulls the outermost JSON object out of an LLM response."""
+    response_text = response_text.strip()
+    json_match = re.search(r'({.*})', response_text.replace('\n', ''), re.DOTALL)
+    return json.loads(json_match.group(1) if json_match else response_text)
+
+
+def build_batch_prompt(items):
+    """Builds one prompt for [(key, text)] asking for every invoice field."""
+    from .llm_service import FIELD_DESCRIPTIONS, FIELD_FORMATS, INVOICE_FIELDS
+
+    template = BATCH_PROMPT_TEMPLATE.format(
+        field_descriptions="\n".join(f"        {FIELD_DESCRIPTIONS[field]}" for field in INVOICE_FIELDS),
+        json_keys=",\n".join(f'                "{field}": {FIELD_FORMATS[field]}' for field in INVOICE_FIELDS),
+    )
+    documents = "\n".join(BATCH_DOCUMENT_TEMPLATE.format(key=key, text=text) for key, text in items)
+    return template.format(documents=documents)
+
+
+class _Pending:
+    __slots__ = ('key', 'text', 'tokens', 'future', 'queued_at')
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class LLMBatcher:
+    """
+    Packs LLM requests from concurrent extractions into a single prompt.
+
+    Callers block on the returned future while a flusher thread sends a batch once it
+    holds `max_invoices` documents, reaches `token_budget` tokens, or its oldest request
+    has waited `flush_interval` seconds. A lone request goes out right away when no batch
+    is in flight and nothing else was queued for `flush_interval` seconds. Up to
+    `max_concurrent` batches are in flight at once.
+
+    LLMUnavailable (breaker open, retries exhausted) fails every member with that error,
+    since retrying each alone would only add load. Any other failure of the batch call,
+    e.g. an unparseable response, and any unusable slice of a valid response fall back
+    to a single-invoice call for the members affected.
+    """
+
+    def __init__(self, backend, max_invoices=10, token_budget=8000, flush_interval=2.0, max_concurrent=4):
+        self.backend = backend
+        self.max_invoices = max_invoices
+        self.token_budget = token_budget
+        self.flush_interval = flush_interval
+
+        self._queue = []
+        self._in_flight = 0  # Batches handed to the senders and not finished yet
+        self._taken_at = 0.0  # When the last batch left the queue
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._stats = {'batches': 0, 'batched_invoices': 0, 'fallbacks': 0, 'failed_batches': 0}
+        self._senders = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='llm-batch')
+        self._thread = threading.Thread(target=self._run, name='llm-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        """Queues a document; the future resolves to its parsed field dict or raises BatchSliceError."""
+        with self._condition:
+            self._sequence += 1
+            pending = _Pending(str(self._sequence), text)
+            self._queue.append(pending)
+            self._condition.notify()
+        return pending.future
+
+    def stats(self):
+        with self._condition:
+            snapshot = dict(self._stats)
+        snapshot['avg_batch_size'] = (
+            snapshot['batched_invoices'] / snapshot['batches'] if snapshot['batches'] else 0.0
+        )
+        return snapshot
+
+    def _take_batch(self):
+        """Pops the next batch once it is full or old enough; caller holds the lock."""
+        if not self._queue:
+            return None
+
+        batch = []
+        tokens = 0
+        for pending in self._queue:
+            if batch and (len(batch) >= self.max_invoices or tokens + pending.tokens > self.token_budget):
+                break
+            batch.append(pending)
+            tokens += pending.tokens
+
+        now = time.monotonic()
+        full = len(batch) < len(self._queue) or len(batch) >= self.max_invoices or tokens >= self.token_budget
+        expired = now - self._queue[0].queued_at >= self.flush_interval
+        # A lone request with nothing in flight and no recent traffic has nobody to wait for
+        idle = len(self._queue) == 1 and not self._in_flight and now - self._taken_at >= self.flush_interval
+        if not (full or expired or idle):
+            return None
+
+        self._taken_at = now
+        del self._queue[:len(batch)]
+        if len(batch) > 1:
+            self._in_flight += 1
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                batch = self._take_batch()
+                while batch is None:
+                    timeout = None
+                    if self._queue:
+                        timeout = max(0.0, self.flush_interval - (time.monotonic() - self._queue[0].queued_at))
+                    self._condition.wait(timeout)
+                    batch = self._take_batch()
+            self._senders.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        from .resilience import LLMUnavailable
+
+        if len(batch) == 1:
+            # Nothing to share the call with; let the caller use the regular single-invoice prompt
+            batch[0].future.set_exception(BatchSliceError("single invoice, no batching"))
+            return
+
+        try:
+            try:
+                response = parse_json_response(self.backend.invoke(build_batch_prompt(
+                    [(pending.key, pending.text) for pending in batch]
+                )))
+            except LLMUnavailable as e:
+                # Retrying each member alone would multiply the load on a backend that is shedding it
+                logger.warning(f"⚠️ Batched LLM call for {len(batch)} invoices failed: {e}")
+                for pending in batch:
+                    pending.future.set_exception(e)
+                with self._condition:
+                    self._stats['failed_batches'] += 1
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Batched LLM call for {len(batch)} invoices failed, retrying them one by one: {e}")
+                for pending in batch:
+                    pending.future.set_exception(BatchSliceError(f"batch call failed: {e}"))
+                with self._condition:
+                    self._stats['failed_batches'] += 1
+                    self._stats['fallbacks'] += len(batch)
+                return
+
+            fallbacks = 0
+            for pending in batch:
+                data = response.get(pending.key) if isinstance(response, dict) else None
+                if isinstance(data, dict):
+                    pending.future.set_result(data)
+                else:
+                    fallbacks += 1
+                    pending.future.set_exception(BatchSliceError(f"no usable result for invoice {pending.key}"))
+
+            with self._condition:
+                self._stats['batches'] += 1
+                self._stats['batched_invoices'] += len(batch) - fallbacks
+                self._stats['fallbacks'] += fallbacks
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify()
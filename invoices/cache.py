@@ -0,0 +1,101 @@
+import logging
+import threading
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+from .ai_settings import ai_setting
+from .models import ExtractionCacheEntry
+from .llm_service import EXTRACTOR_VERSION, PROMPT_VERSION
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Process-wide hit/miss counters
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def _record(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def cache_stats():
+    """Returns a snapshot of the cache counters with the hit rate."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+    return snapshot
+
+
+class ExtractionCache:
+    """Persistent, size-bounded LRU cache of extraction results keyed by file SHA-256."""
+
+    _stale_purged = False  # Entries from older prompt/extractor versions are purged once per process
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or ai_setting('EXTRACTION_CACHE_MAX_ENTRIES', 10000)
+
+    def _current(self):
+        return ExtractionCacheEntry.objects.filter(
+            extractor_version=EXTRACTOR_VERSION,
+            prompt_version=PROMPT_VERSION,
+        )
+
+    def get(self, file_hash):
+        """Returns {'text', 'data'} for a cached file, or None on a miss."""
+        if not file_hash:
+            return None
+        try:
+            entry = self._current().filter(file_hash=file_hash).only('id', 'extracted_text', 'data').first()
+            if entry is None:
+                _record('misses')
+                return None
+
+            self._current().filter(pk=entry.pk).update(
+                hit_count=F('hit_count') + 1,
+                last_used_at=timezone.now(),
+            )
+        except DatabaseError as e:
+            logger.warning(f"⚠️ Extraction cache lookup failed: {e}")
+            return None
+
+        _record('hits')
+        return {'text': entry.extracted_text, 'data': entry.data}
+
+    def put(self, file_hash, text, data):
+        """Stores an extraction result and evicts the least recently used entries."""
+        if not file_hash:
+            return
+        try:
+            ExtractionCacheEntry.objects.update_or_create(
+                file_hash=file_hash,
+                extractor_version=EXTRACTOR_VERSION,
+                prompt_version=PROMPT_VERSION,
+                defaults={'extracted_text': text, 'data': data, 'last_used_at': timezone.now()},
+            )
+            _record('stores')
+            self.evict()
+        except DatabaseError as e:
+            logger.warning(f"⚠️ Extraction cache store failed: {e}")
+
+    def evict(self):
+        """Drops stale-version entries, then trims the cache down to max_entries."""
+        if not ExtractionCache._stale_purged:
+            deleted, _ = ExtractionCacheEntry.objects.exclude(
+                extractor_version=EXTRACTOR_VERSION,
+                prompt_version=PROMPT_VERSION,
+            ).delete()
+            ExtractionCache._stale_purged = True
+            if deleted:
+                _record('evictions', deleted)
+                logger.info(f"🧹 Purged {deleted} extraction cache entries from older prompt versions")
+
+        overflow = ExtractionCacheEntry.objects.count() - self.max_entries
+        if overflow > 0:
+            oldest = list(
+                ExtractionCacheEntry.objects.order_by('last_used_at').values_list('id', flat=True)[:overflow]
+            )
+            deleted, _ = ExtractionCacheEntry.objects.filter(id__in=oldest).delete()
+            _record('evictions', deleted)
@@ -0,0 +1,127 @@
+import re
+import logging
+import threading
+from .ai_settings import ai_setting
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Words that tend to sit next to each field; used by the default keyword ranker
+FIELD_KEYWORDS = {
+    'invoice_date': ('invoice date', 'statement date', 'bill date', 'date issued', 'issue date'),
+    'invoice_number': ('invoice number', 'invoice no', 'invoice #', 'bill number', 'account number', 'statement number'),
+    'amount': ('total amount due', 'amount due', 'balance due', 'total due', 'payment amount', 'grand total', 'total'),
+    'due_date': ('due date', 'payment due', 'due by', 'pay by', 'auto pay date'),
+}
+
+# Values that look like the answers themselves
+VALUE_PATTERNS = {
+    'invoice_date': re.compile(r'\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b|\b[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4}\b'),
+    'due_date': re.compile(r'\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b|\b[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4}\b'),
+    'amount': re.compile(r'[$€£]\s*\d|\b\d{1,3}(?:,\d{3})*\.\d{2}\b'),
+    'invoice_number': re.compile(r'\b[A-Z]{2,}[-/]?\d{3,}\b'),
+}
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def split_into_chunks(text, chunk_size=None, overlap=None):
+    """Splits text into overlapping chunks of roughly CHUNK_SIZE tokens (whitespace words)."""
+    chunk_size = chunk_size or ai_setting('CHUNK_SIZE', 512)
+    overlap = ai_setting('CHUNK_OVERLAP', 128) if overlap is None else overlap
+    step = max(1, chunk_size - overlap)
+
+    words = text.split()
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+class KeywordRanker:
+    """Scores chunks by field keywords and value-shaped tokens; no model needed."""
+
+    def score(self, chunks, fields):
+        scores = []
+        for position, chunk in enumerate(chunks):
+            lowered = chunk.lower()
+            score = 0.0
+            for field in fields:
+                score += sum(2.0 for keyword in FIELD_KEYWORDS[field] if keyword in lowered)
+                score += min(3, len(VALUE_PATTERNS[field].findall(chunk))) * 0.5
+            # Header fields usually sit near the top of the document
+            score += 1.0 / (1 + position)
+            scores.append(score)
+        return scores
+
+
+class EmbeddingRanker:
+    """Scores chunks by cosine similarity to the field descriptions using a local sentence-transformers model."""
+
+    _model = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_model(cls):
+        if cls._model is None:
+            with cls._lock:
+                if cls._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    cls._model = SentenceTransformer(ai_setting('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2'))
+        return cls._model
+
+    def score(self, chunks, fields):
+        model = self.get_model()
+        query = "; ".join(keyword for field in fields for keyword in FIELD_KEYWORDS[field])
+        embeddings = model.encode([query] + chunks, normalize_embeddings=True)
+        return [float(embeddings[0] @ vector) for vector in embeddings[1:]]
+
+
+RANKERS = {
+    'keyword': KeywordRanker,
+    'embedding': EmbeddingRanker,
+}
+
+
+def get_ranker(name=None):
+    """Returns the ranker named in AI_SETTINGS['CHUNK_RANKER'], falling back to keywords."""
+    name = name or ai_setting('CHUNK_RANKER', 'keyword')
+    if name == 'embedding':
+        try:
+            EmbeddingRanker.get_model()
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding ranker unavailable, using keyword ranker: {e}")
+            name = 'keyword'
+    return RANKERS[name]()
+
+
+def select_relevant_text(text, fields, token_budget=None, ranker=None):
+    """
+    Returns the part of `text` most relevant to `fields`, within `token_budget` tokens.
+
+    Text that already fits is returned unchanged. Otherwise the best-ranked chunks are
+    kept and reassembled in document order.
+    """
+    token_budget = token_budget or ai_setting('PROMPT_TOKEN_BUDGET', 2000)
+    if estimate_tokens(text) <= token_budget:
+        return text
+
+    chunks = split_into_chunks(text)
+    scores = (ranker or get_ranker()).score(chunks, fields)
+    ranked = sorted(range(len(chunks)), key=lambda index: scores[index], reverse=True)
+
+    selected = []
+    used = 0
+    for index in ranked:
+        cost = estimate_tokens(chunks[index])
+        if used + cost > token_budget and selected:
+            continue
+        selected.append(index)
+        used += cost
+
+    return "\n...\n".join(chunks[index] for index in sorted(selected))
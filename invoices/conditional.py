@@ -0,0 +1,158 @@
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Invoice
+from .serializers import UserSerializer
+
+# ✅ Defaults for conditional invoice reads (overridable via settings.RESPONSE_CACHE)
+RESPONSE_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'default',  # CACHES alias for completed-invoice payloads; a shared one (e.g. Redis) serves all processes
+    'TTL': 300,  # Seconds a cached payload is kept
+}
+
+KEY_PREFIX = 'invoice-detail:'
+MAX_TRACKED_BODIES = 10000  # Response sizes remembered per ETag, to count the bytes a 304 saved
+
+# ✅ Process-wide counters
+_stats_lock = threading.Lock()
+_stats = {'not_modified': 0, 'full_responses': 0, 'detail_hits': 0, 'detail_misses': 0, 'bytes_saved': 0}
+_body_sizes = OrderedDict()  # etag -> length of the body sent with it
+
+
+def response_cache_setting(name):
+    """Returns a conditional read setting, falling back to RESPONSE_CACHE_DEFAULTS."""
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, RESPONSE_CACHE_DEFAULTS[name])
+
+
+def _record(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def response_cache_stats():
+    """Returns a snapshot of the counters with the 304 and detail cache hit rates."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    requests = snapshot['not_modified'] + snapshot['full_responses']
+    lookups = snapshot['detail_hits'] + snapshot['detail_misses']
+    snapshot['not_modified_rate'] = snapshot['not_modified'] / requests if requests else 0.0
+    snapshot['detail_hit_rate'] = snapshot['detail_hits'] / lookups if lookups else 0.0
+    return snapshot
+
+
+def invoice_etag(request, version):
+    """
+    Weak ETag of an invoice read: the user's change version plus everything else the body depends on.
+
+    Read the version before the invoices, so a concurrent write can only make the
+    tag older than the data (one extra full response), never newer.
+    """
+    parts = (request.user.pk, version, request.build_absolute_uri(), request.META.get('HTTP_ACCEPT', ''))
+    return f'W/"{blake2b(repr(parts).encode(), digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    """Weak comparison against If-None-Match."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
+
+
+def _remember_size(etag, size):
+    with _stats_lock:
+        _body_sizes[etag] = size
+        _body_sizes.move_to_end(etag)
+        while len(_body_sizes) > MAX_TRACKED_BODIES:
+            _body_sizes.popitem(last=False)
+
+
+def not_modified(etag):
+    """304 for a client whose copy is current."""
+    with _stats_lock:
+        saved = _body_sizes.get(etag, 0)  # Unknown if another process sent the full body
+    _record('not_modified')
+    _record('bytes_saved', saved)
+    return tag_response(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+
+def tag_response(response, etag):
+    """Adds the ETag to a successful read; no-cache makes browsers revalidate instead of reusing it blindly."""
+    if response.status_code == status.HTTP_200_OK:
+        _record('full_responses')
+
+        def remember_size(rendered):
+            _remember_size(etag, len(rendered.content))
+        response.add_post_render_callback(remember_size)
+    elif response.status_code != status.HTTP_304_NOT_MODIFIED:
+        return response
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _detail_cache():
+    return caches[response_cache_setting('BACKEND')]
+
+
+def _origin(request):
+    return request.build_absolute_uri('/')  # Cached payloads contain absolute file URLs
+
+
+def cached_detail(request, pk, version):
+    """
+    Returns the cached serialized payload of a completed invoice, or None.
+
+    Writes delete their rows' entries (forget_invoices), but another process's
+    cache may not be reachable from here. So an entry stored under an older
+    version is only served after checking that the row wasn't reprocessed,
+    deleted or unlinked from its original since. The embedded owner is always
+    the requesting user, serialized fresh.
+    """
+    key = f"{KEY_PREFIX}{pk}"
+    cache = _detail_cache()
+    entry = cache.get(key)
+    if entry is None or entry['user_id'] != request.user.pk or entry['origin'] != _origin(request):
+        _record('detail_misses')
+        return None
+
+    if entry['version'] != version:
+        current = Invoice.objects.filter(
+            pk=entry['pk'], user_id=entry['user_id'], is_deleted=False, status='completed',
+            processing_completed_at=entry['completed_at'], duplicate_of_id=entry['data'].get('duplicate_of'),
+        ).exists()
+        if not current:
+            cache.delete(key)
+            _record('detail_misses')
+            return None
+        entry['version'] = version
+        cache.set(key, entry, response_cache_setting('TTL'))
+
+    _record('detail_hits')
+    data = dict(entry['data'])
+    data['user'] = UserSerializer(request.user).data  # The owner's profile may have changed since
+    return data
+
+
+def cache_detail(request, invoice, version, data):
+    """Stores the serialized payload of a completed invoice for cached_detail()."""
+    if invoice.status != 'completed':
+        return
+    entry = {
+        'pk': invoice.pk, 'user_id': invoice.user_id, 'version': version, 'origin': _origin(request),
+        'completed_at': invoice.processing_completed_at, 'data': data,
+    }
+    _detail_cache().set(f"{KEY_PREFIX}{invoice.pk}", entry, response_cache_setting('TTL'))
+
+
+def forget_invoices(invoice_ids):
+    """Drops the cached payloads of invoices that were just written."""
+    if response_cache_setting('ENABLED') and invoice_ids:
+        _detail_cache().delete_many([f"{KEY_PREFIX}{invoice_id}" for invoice_id in invoice_ids])
@@ -0,0 +1,179 @@
+import random
+import re
+from array import array
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from hashlib import blake2b
+from django.conf import settings
+from .models import Invoice, InvoiceFingerprint, InvoiceText
+
+# ✅ Defaults for near-duplicate detection (overridable via settings.DEDUP)
+DEDUP_DEFAULTS = {
+    'ENABLED': True,
+    'TEXT_THRESHOLD': 0.85,  # Estimated Jaccard similarity of word shingles that counts as the same document
+    'MAX_CANDIDATES': 20,  # Candidates whose signatures are compared per check
+    'MAX_TEXT_CHARS': 50000,  # Text beyond this doesn't contribute to the signature
+}
+
+# MinHash with 128 permutations split into 16 LSH bands of 8 rows: documents with a
+# similarity of 0.85 share at least one band ~99.9% of the time, at 0.5 only ~6%.
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_WORDS = 3
+
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240501)  # Fixed seed: stored signatures must stay comparable across releases
+PERMUTATIONS = tuple((_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(MERSENNE_PRIME))
+                     for _ in range(NUM_PERMUTATIONS))
+
+WORD_PATTERN = re.compile(r'[a-z0-9]{2,}')
+OCR_LOOKALIKES = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'L': '1', 'S': '5', 'B': '8'})
+
+
+def dedup_setting(name):
+    """Returns a duplicate detection setting, falling back to DEDUP_DEFAULTS."""
+    return getattr(settings, 'DEDUP', {}).get(name, DEDUP_DEFAULTS[name])
+
+
+def _hash64(data):
+    """Stable signed 64-bit hash (fits a BigIntegerField)."""
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'big', signed=True)
+
+
+@lru_cache(maxsize=16)  # The check before the LLM call and index_invoice() after it hash the same text
+def text_signature(text):
+    """MinHash signature (NUM_PERMUTATIONS 32-bit values) of the text's word shingles, or None if too short."""
+    words = WORD_PATTERN.findall(text[:dedup_setting('MAX_TEXT_CHARS')].lower())
+    if len(words) < SHINGLE_WORDS:
+        return None
+    hashes = {
+        int.from_bytes(blake2b(" ".join(words[index:index + SHINGLE_WORDS]).encode(), digest_size=8).digest(), 'big')
+        % MERSENNE_PRIME
+        for index in range(len(words) - SHINGLE_WORDS + 1)
+    }
+    return array('I', (min((a * value + b) % MERSENNE_PRIME for value in hashes) & 0xFFFFFFFF
+                       for a, b in PERMUTATIONS))
+
+
+def band_keys(signature):
+    return [_hash64(bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(signature, other)) / NUM_PERMUTATIONS
+
+
+def normalize_number(number):
+    """Invoice number with punctuation dropped and OCR look-alike characters folded."""
+    return re.sub(r'[^0-9A-Z]', '', str(number).upper()).translate(OCR_LOOKALIKES) if number else None
+
+
+def normalize_amount(amount):
+    try:
+        return str(Decimal(str(amount).replace(',', '')).quantize(Decimal('0.01'))) if amount is not None else None
+    except InvalidOperation:
+        return None
+
+
+def field_key(number, amount):
+    """Key shared by invoices with the same normalized (invoice number, amount), or None if either is missing."""
+    number, amount = normalize_number(number), normalize_amount(amount)
+    if not number or not amount:
+        return None
+    return _hash64(f"fields:{number}|{amount}".encode())
+
+
+def index_invoice(invoice, text):
+    """Stores the text signature and replaces the lookup keys of a processed invoice."""
+    signature = text_signature(text)
+    keys = set(band_keys(signature)) if signature is not None else set()
+    if invoice.invoice_number != invoice.default_invoice_number():  # An auto-assigned number matches nothing
+        amount_key = field_key(invoice.invoice_number, invoice.amount)
+        if amount_key is not None:
+            keys.add(amount_key)
+
+    InvoiceText.objects.filter(invoice_id=invoice.pk).update(
+        minhash=signature.tobytes() if signature is not None else None)
+    InvoiceFingerprint.objects.filter(invoice_id=invoice.pk).delete()
+    InvoiceFingerprint.objects.bulk_create(
+        InvoiceFingerprint(user_id=invoice.user_id, invoice_id=invoice.pk, key=key) for key in keys
+    )
+
+
+def _fields_conflict(candidates, original):
+    """Whether a value the rules found in the new text disagrees with the stored invoice (e.g. next month's bill)."""
+    normalizers = {'invoice_number': normalize_number, 'amount': normalize_amount, 'invoice_date': str, 'due_date': str}
+    return any(
+        field in candidates and original[field] is not None and normalize(candidates[field][0]) != normalize(original[field])
+        for field, normalize in normalizers.items()
+    )
+
+
+def find_duplicate(invoice, text, candidates=None):
+    """
+    Looks for an earlier invoice of the same user that this text is probably a copy of.
+
+    Candidates come from one indexed lookup on the LSH band keys and the normalized
+    (invoice number, amount) key, so the cost doesn't grow with the number of stored
+    invoices. A candidate is a duplicate if the key fields match, or if the text is
+    at least TEXT_THRESHOLD similar and no field found by the rules contradicts it.
+    Returns {'invoice_id', 'score', 'data'} or None; `data` holds the original's
+    non-empty fields that can be reused (dates only when the text matched too).
+
+    Only invoices uploaded before this one (lower ids) qualify, and never one that is
+    itself marked as a copy of this invoice, so reprocessing can't link two rows to
+    each other.
+    """
+    if not dedup_setting('ENABLED'):
+        return None
+    candidates = candidates or {}
+    signature = text_signature(text)
+    keys = band_keys(signature) if signature is not None else []
+    amount_key = field_key(candidates.get('invoice_number', (None,))[0], candidates.get('amount', (None,))[0])
+    if amount_key is not None:
+        keys.append(amount_key)
+    if not keys:
+        return None
+
+    max_candidates = dedup_setting('MAX_CANDIDATES')
+    hits = {}
+    rows = (InvoiceFingerprint.objects.filter(user_id=invoice.user_id, key__in=keys, invoice_id__lt=invoice.pk)
+            .values_list('invoice_id', 'key')[:max_candidates * len(keys)])
+    for invoice_id, key in rows:
+        bands, field_match = hits.get(invoice_id, (0, False))
+        hits[invoice_id] = (bands + (key != amount_key), field_match or key == amount_key)
+    if not hits:
+        return None
+
+    shortlist = sorted(hits, key=lambda invoice_id: (not hits[invoice_id][1], -hits[invoice_id][0]))[:max_candidates]
+    originals = (Invoice.objects.filter(id__in=shortlist, is_deleted=False, status='completed')
+                 .exclude(duplicate_of_id=invoice.pk)
+                 .values('id', 'invoice_number', 'invoice_date', 'amount', 'due_date', 'extracted_text__minhash'))
+
+    best = None
+    for original in originals:
+        stored = original.pop('extracted_text__minhash')
+        score = similarity(signature, array('I', bytes(stored))) if signature is not None and stored else 0.0
+        field_match = hits[original['id']][1]
+        if field_match or (score >= dedup_setting('TEXT_THRESHOLD') and not _fields_conflict(candidates, original)):
+            if best is None or (field_match, score) > best[0]:
+                best = ((field_match, score), score, original)
+    if best is None:
+        return None
+
+    _, score, original = best
+    data = {
+        'invoice_number': original['invoice_number'],
+        'amount': str(original['amount']) if original['amount'] is not None else None,
+    }
+    if score >= dedup_setting('TEXT_THRESHOLD'):
+        # Only a matching text vouches for the dates; a (number, amount) match alone may be a different document
+        data['invoice_date'] = original['invoice_date'].isoformat() if original['invoice_date'] else None
+        data['due_date'] = original['due_date'].isoformat() if original['due_date'] else None
+    return {
+        'invoice_id': original['id'],
+        'score': round(score, 4),
+        'data': {field: value for field, value in data.items() if value is not None},
+    }
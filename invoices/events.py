@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import weakref
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .models import InvoiceStatusEvent
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Defaults for the status event stream (overridable via settings.STATUS_EVENTS)
+EVENT_DEFAULTS = {
+    'POLL_INTERVAL': 1.0,
+    'LONG_POLL_TIMEOUT': 25,
+    'HEARTBEAT_INTERVAL': 15,
+    'RETENTION_HOURS': 24,
+}
+
+EVENT_FIELDS = ('id', 'invoice_id', 'status', 'created_at')
+
+CATCH_UP_LIMIT = 500  # Events returned per catch-up read / long-poll response
+
+
+def event_setting(name):
+    """Returns a status event setting, falling back to EVENT_DEFAULTS."""
+    return getattr(settings, 'STATUS_EVENTS', {}).get(name, EVENT_DEFAULTS[name])
+
+
+def record_status_event(invoice):
+    """Appends one status transition to the change log."""
+    InvoiceStatusEvent.objects.create(user_id=invoice.user_id, invoice_id=invoice.pk, status=invoice.status)
+
+
+def record_status_events(rows, status):
+    """Appends transitions applied with queryset.update(): `rows` are (invoice_id, user_id) pairs."""
+    InvoiceStatusEvent.objects.bulk_create(
+        InvoiceStatusEvent(user_id=user_id, invoice_id=invoice_id, status=status) for invoice_id, user_id in rows
+    )
+
+
+def prune_status_events():
+    """Deletes events older than RETENTION_HOURS; returns the number removed."""
+    cutoff = timezone.now() - timedelta(hours=event_setting('RETENTION_HOURS'))
+    deleted, _ = InvoiceStatusEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+async def fetch_events(user_id, after, limit=None):
+    """A user's events with id > `after`, oldest first."""
+    queryset = (
+        InvoiceStatusEvent.objects
+        .filter(user_id=user_id, id__gt=after)
+        .order_by('id')
+        .values(*EVENT_FIELDS)[:limit or CATCH_UP_LIMIT]
+    )
+    return [row async for row in queryset]
+
+
+class StatusEventHub:
+    """
+    Fans the change log out to every subscriber of one event loop.
+
+    A single task reads new rows every POLL_INTERVAL while anyone is subscribed and
+    pushes them onto the owners' queues, so idle subscribers cost one asyncio.Queue
+    each and the database sees one query per process, not one per client.
+    """
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self.subscribers = {}  # user_id -> set of asyncio.Queue
+        self.last_id = 0
+        self.task = None
+        self.start_lock = asyncio.Lock()
+
+    async def subscribe(self, user_id):
+        """
+        Registers a subscriber queue for `user_id`.
+
+        Returns once the poller's cursor is set, so anything the caller reads from the
+        log afterwards overlaps with (rather than misses) what the queue will receive.
+        """
+        async with self.start_lock:
+            if self.task is None or self.task.done():
+                latest = await InvoiceStatusEvent.objects.aaggregate(latest=Max('id'))
+                self.last_id = latest['latest'] or 0
+                self.task = asyncio.create_task(self._poll())
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def subscriber_count(self):
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    async def _poll(self):
+        while self.subscribers:
+            try:
+                rows = [
+                    row async for row in
+                    InvoiceStatusEvent.objects.filter(id__gt=self.last_id).order_by('id').values('user_id', *EVENT_FIELDS)
+                ]
+            except Exception as e:
+                logger.error(f"❌ Error reading invoice status events: {e}")
+                rows = []
+
+            for row in rows:
+                self.last_id = row['id']
+                user_id = row.pop('user_id')
+                for queue in self.subscribers.get(user_id, ()):
+                    queue.put_nowait(row)
+
+            await asyncio.sleep(self.poll_interval)
+
+
+# ✅ One hub per event loop (one per ASGI process; WSGI runs each async request in its own loop)
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = StatusEventHub(event_setting('POLL_INTERVAL'))
+    return hub
+
+
+async def wait_for_events(user_id, after, timeout):
+    """Long-poll: events after `after`, waiting up to `timeout` seconds if there are none yet."""
+    hub = get_hub()
+    queue = await hub.subscribe(user_id)
+    try:
+        events = await fetch_events(user_id, after)
+        if not events:
+            try:
+                events = [await asyncio.wait_for(queue.get(), timeout)]
+            except asyncio.TimeoutError:
+                return []
+            while not queue.empty():
+                events.append(queue.get_nowait())
+        return [event for event in events if event['id'] > after]
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+async def stream_events(user_id, after):
+    """Yields events as they happen, or None when HEARTBEAT_INTERVAL passes without any."""
+    hub = get_hub()
+    queue = await hub.subscribe(user_id)
+    try:
+        while True:
+            backlog = await fetch_events(user_id, after)
+            for event in backlog:
+                after = event['id']
+                yield event
+            if len(backlog) < CATCH_UP_LIMIT:
+                break
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), event_setting('HEARTBEAT_INTERVAL'))
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event['id'] > after:  # Already sent during catch-up
+                after = event['id']
+                yield event
+    finally:
+        hub.unsubscribe(user_id, queue)
@@ -0,0 +1,46 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+
+# ✅ Columns exported to the ERP (plain values() rows, no model instances or serializers)
+EXPORT_FIELDS = (
+    'id', 'invoice_number', 'invoice_date', 'due_date', 'amount',
+    'status', 'file_type', 'uploaded_at', 'processing_completed_at',
+)
+
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per server-side cursor round trip
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Pseudo-buffer whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset):
+    """Streams values() rows through a server-side cursor."""
+    return queryset.values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in iter_rows(queryset):
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def stream_ndjson(queryset):
+    encoder = DjangoJSONEncoder()
+    for row in iter_rows(queryset):
+        yield encoder.encode(row) + "\n"
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
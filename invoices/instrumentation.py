@@ -0,0 +1,228 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Pipeline stages timed for every extraction (see ExtractionTrace.stage)
+STAGES = (
+    'cache_lookup', 'file_read', 'pdf_text', 'ocr', 'transcription', 'rules', 'dedup',
+    'prompt_build', 'llm_call', 'json_parse', 'postprocess', 'db_save',
+)
+
+# Seconds; covers sub-millisecond regex work up to multi-minute OCR runs
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = tuple(1024 * 2 ** power for power in range(0, 15, 2))  # 1KB .. 16MB
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+AUDIO_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+RATIO_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+INSTRUMENTATION_DEFAULTS = {
+    'METRICS_PORT': None,
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_DIR': 'profiles',
+}
+
+
+def instrumentation_setting(name):
+    """Returns an instrumentation setting, falling back to INSTRUMENTATION_DEFAULTS."""
+    return getattr(settings, 'INSTRUMENTATION', {}).get(name, INSTRUMENTATION_DEFAULTS[name])
+
+
+class ExtractionTrace:
+    """Stage durations (seconds) and size facts collected while one invoice is extracted."""
+
+    def __init__(self):
+        self.stages = {}
+        self.info = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        """JSON-serializable form stored on Invoice.processing_metrics."""
+        return {
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            **self.info,
+        }
+
+
+# ✅ Minimal Prometheus text-format metrics (process-local; no client library required)
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self.lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'invoice_extraction_stage_seconds', "Time spent in each extraction stage.", DURATION_BUCKETS, ('stage',))
+EXTRACTION_SECONDS = Histogram(
+    'invoice_extraction_seconds', "End-to-end extraction time per invoice.", DURATION_BUCKETS, ('outcome',))
+QUEUE_WAIT_SECONDS = Histogram(
+    'invoice_queue_wait_seconds', "Time from upload to a worker claiming the invoice.", DURATION_BUCKETS)
+INPUT_BYTES = Histogram('invoice_input_bytes', "Size of extracted invoice files.", SIZE_BUCKETS, ('file_type',))
+PAGES = Histogram('invoice_pdf_pages', "Pages per PDF invoice.", COUNT_BUCKETS)
+TEXT_TOKENS = Histogram('invoice_text_tokens', "Estimated tokens of extracted text.", TOKEN_BUCKETS)
+PROMPT_TOKENS = Histogram('invoice_prompt_tokens', "Estimated tokens sent to the LLM.", TOKEN_BUCKETS)
+AUDIO_SECONDS = Histogram('invoice_audio_seconds', "Length of transcribed audio invoices.", AUDIO_BUCKETS)
+REAL_TIME_FACTOR = Histogram(
+    'invoice_transcription_real_time_factor', "Transcription time divided by audio length.", RATIO_BUCKETS)
+EXTRACTIONS = Counter('invoice_extractions_total', "Extraction jobs finished, by outcome.", ('outcome',))
+
+METRICS = (STAGE_SECONDS, EXTRACTION_SECONDS, QUEUE_WAIT_SECONDS, INPUT_BYTES, PAGES, TEXT_TOKENS,
+           PROMPT_TOKENS, AUDIO_SECONDS, REAL_TIME_FACTOR, EXTRACTIONS)
+
+
+def observe_extraction(outcome, trace):
+    """Feeds one job's trace (ExtractionTrace.as_dict()) into the process histograms."""
+    EXTRACTIONS.inc(outcome=outcome)
+    if not trace:
+        return
+    for stage, seconds in trace.get('stages', {}).items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    if 'total_seconds' in trace:
+        EXTRACTION_SECONDS.observe(trace['total_seconds'], outcome=outcome)
+    if 'queue_wait_seconds' in trace:
+        QUEUE_WAIT_SECONDS.observe(trace['queue_wait_seconds'])
+    if 'input_bytes' in trace:
+        INPUT_BYTES.observe(trace['input_bytes'], file_type=trace.get('file_type', 'unknown'))
+    if 'page_count' in trace:
+        PAGES.observe(trace['page_count'])
+    if 'text_tokens' in trace:
+        TEXT_TOKENS.observe(trace['text_tokens'])
+    if 'prompt_tokens' in trace:
+        PROMPT_TOKENS.observe(trace['prompt_tokens'])
+    if 'audio_seconds' in trace:
+        AUDIO_SECONDS.observe(trace['audio_seconds'])
+        REAL_TIME_FACTOR.observe(trace['real_time_factor'])
+
+
+def render_metrics(gauges=None):
+    """Prometheus text exposition of all metrics, plus `gauges` ({name: (help, value)}) read at scrape time."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, (documentation, value) in (gauges or {}).items():
+        lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port, gauges=None):
+    """Serves render_metrics() on http://0.0.0.0:<port>/metrics from a daemon thread; `gauges` is a callable."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            try:
+                body = render_metrics(gauges() if gauges else None).encode()
+            except Exception as e:
+                logger.error(f"❌ Error rendering metrics: {e}")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the worker log
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+@contextmanager
+def maybe_profile(label):
+    """Runs the block under cProfile for a PROFILE_SAMPLE_RATE fraction of calls and dumps a .prof file."""
+    rate = instrumentation_setting('PROFILE_SAMPLE_RATE')
+    if not rate or random.random() >= rate:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile_dir = instrumentation_setting('PROFILE_DIR')
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, f"{label}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+            profiler.dump_stats(path)
+            logger.info(f"🔬 Saved extraction profile to {path}")
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save extraction profile: {e}")
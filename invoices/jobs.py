@@ -0,0 +1,363 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Invoice
+from .llm_service import get_extractor, llm_stats
+from .cache import cache_stats
+from .analytics import record_changes, record_status_changes, snapshot
+from .events import record_status_events
+from .search import store_invoice_text
+from .conditional import forget_invoices
+from .dedup import find_duplicate, index_invoice
+from .instrumentation import ExtractionTrace, maybe_profile
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Defaults for the DB-backed extraction queue (overridable via settings.EXTRACTION_QUEUE)
+QUEUE_DEFAULTS = {
+    'WORKERS': 4,
+    'POOL': 'thread',
+    'BATCH_SIZE': 10,
+    'POLL_INTERVAL': 2.0,
+    'VISIBILITY_TIMEOUT': 300,
+    'MAX_ATTEMPTS': 3,
+}
+
+
+def queue_setting(name):
+    """Returns an extraction queue setting, falling back to QUEUE_DEFAULTS."""
+    return getattr(settings, 'EXTRACTION_QUEUE', {}).get(name, QUEUE_DEFAULTS[name])
+
+
+def enqueue_invoice(invoice):
+    """Marks an invoice as pending so the next free worker picks it up."""
+    invoice.status = 'pending'
+    invoice.error_message = None
+    invoice.processing_started_at = None
+    invoice.processing_completed_at = None
+    invoice.processing_attempts = 0
+    invoice.next_attempt_at = None
+    invoice.save(update_fields=[
+        'status', 'error_message', 'processing_started_at',
+        'processing_completed_at', 'processing_attempts', 'next_attempt_at',
+    ])
+    return invoice
+
+
+def claim_invoices(limit, visibility_timeout=None):
+    """
+    Atomically claims up to `limit` invoices for processing.
+
+    Pending invoices and invoices whose `processing` lease expired (worker crash)
+    are locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never
+    receive the same row. Returns the list of claimed invoice ids.
+    """
+    if visibility_timeout is None:
+        visibility_timeout = queue_setting('VISIBILITY_TIMEOUT')
+
+    now = timezone.now()
+    expired = now - timedelta(seconds=visibility_timeout)
+
+    with transaction.atomic():
+        rows = list(
+            Invoice.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', next_attempt_at__isnull=True) |
+                Q(status='pending', next_attempt_at__lte=now) |
+                Q(status='processing', processing_started_at__lt=expired),
+                is_deleted=False,
+            )
+            .order_by('uploaded_at')
+            .values_list('id', 'user_id', 'status')[:limit]
+        )
+        ids = [row[0] for row in rows]
+        if ids:
+            Invoice.objects.filter(id__in=ids).update(
+                status='processing',
+                processing_started_at=now,
+                processing_completed_at=None,
+                processing_attempts=F('processing_attempts') + 1,
+            )
+            # queryset.update() bypasses save() signals, so the per-user status counts are moved here
+            record_status_changes([(user_id, status) for _, user_id, status in rows], 'processing')
+            record_status_events([(invoice_id, user_id) for invoice_id, user_id, status in rows
+                                  if status != 'processing'], 'processing')
+    return ids
+
+
+def renew_leases(invoice_ids):
+    """Heartbeat for invoices still being extracted, so claim_invoices() doesn't hand them out again."""
+    if invoice_ids:
+        Invoice.objects.filter(id__in=list(invoice_ids), status='processing').update(processing_started_at=timezone.now())
+
+
+def start_process_pool(workers, initializer=None, initargs=()):
+    """
+    Forks a ProcessPoolExecutor's workers right away, while the parent holds no DB connection.
+
+    With the fork context the whole pool is forked on the first submit(). Left to the
+    caller's first job, that happens after the parent queried the DB, and a child
+    closing its inherited copy of the connection ends the parent's session.
+    """
+    connections.close_all()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork'),  # Children share preloaded models copy-on-write
+        initializer=initializer,
+        initargs=initargs,
+    )
+    executor.submit(int).result()
+    return executor
+
+
+def index_invoice_text(invoice, text):
+    """Stores a completed invoice's text for search and its fingerprints for duplicate detection."""
+    try:
+        store_invoice_text(invoice, text)
+        index_invoice(invoice, text)
+    except Exception as e:
+        logger.error(f"❌ Error indexing text of invoice {invoice.id}: {e}")
+
+
+def apply_result(invoice, result):
+    """Copies an extractor result onto the (unsaved) invoice; returns the extracted text to index, if any."""
+    if not result['success']:
+        invoice.status = 'failed'
+        invoice.error_message = result.get('error', 'Unknown extraction error')
+        return None
+
+    # Update invoice with extracted data
+    invoice.invoice_date = result['data'].get('invoice_date')
+    invoice.invoice_number = result['data'].get('invoice_number')
+    invoice.amount = result['data'].get('amount')
+    invoice.due_date = result['data'].get('due_date')
+    invoice.status = 'completed'
+    invoice.error_message = None
+    duplicate = result.get('duplicate')
+    invoice.duplicate_of_id = duplicate['invoice_id'] if duplicate else None
+    invoice.duplicate_score = duplicate['score'] if duplicate else None
+    return result.get('text')
+
+
+# ✅ Fields a worker owns while an invoice is claimed; everything else (is_deleted, user edits) is left alone
+CLAIMED_RESULT_FIELDS = (
+    'invoice_date', 'invoice_number', 'amount', 'due_date', 'status', 'error_message', 'duplicate_of',
+    'duplicate_score', 'processing_started_at', 'processing_completed_at', 'processing_metrics',
+)
+
+
+def save_claimed(invoice, fields):
+    """
+    Writes `fields` of a claimed invoice, unless it was deleted or stopped being processed meanwhile.
+
+    The row is locked and re-read first, so the stats delta is taken from what is
+    stored now rather than from the copy loaded when the job started.
+    """
+    with transaction.atomic():
+        current = Invoice.objects.select_for_update().filter(
+            pk=invoice.pk, status='processing', is_deleted=False,
+        ).first()
+        if current is None:
+            logger.warning(f"⚠️ Invoice {invoice.pk} was deleted or released while processing; result dropped")
+            return False
+        invoice._stats_snapshot = snapshot(current)
+        invoice.save(update_fields=fields)
+    return True
+
+
+def process_invoice(invoice, extractor=None):
+    """Extract invoice data using LLM and store the result, with per-stage timings, on a claimed invoice."""
+    invoice.processing_started_at = invoice.processing_started_at or timezone.now()
+    trace = ExtractionTrace()
+    trace.info['file_type'] = invoice.file_type
+    trace.info['queue_wait_seconds'] = (invoice.processing_started_at - invoice.uploaded_at).total_seconds()
+    started = time.perf_counter()
+    text = None  # Extracted text, indexed for search once the invoice is saved
+
+    try:
+        if invoice.processing_attempts > queue_setting('MAX_ATTEMPTS'):
+            invoice.status = 'failed'
+            invoice.error_message = 'Extraction abandoned after too many attempts'
+            invoice.processing_completed_at = timezone.now()
+            save_claimed(invoice, CLAIMED_RESULT_FIELDS)
+            return invoice
+
+        file_path = invoice.file.path
+
+        # Extract data using LLM (identical files are served from the result cache)
+        extractor = extractor or get_extractor()
+        result = extractor.extract_invoice_data(
+            file_path, file_hash=invoice.file_hash, trace=trace, duplicate_check=partial(find_duplicate, invoice),
+        )
+
+        if not result['success'] and result.get('retry_after'):
+            return park_invoice(invoice, result['retry_after'], result.get('error'))
+
+        text = apply_result(invoice, result)
+
+    except Exception as e:
+        logger.error(f"❌ Error processing invoice {invoice.id}: {e}")
+        invoice.status = 'failed'
+        invoice.error_message = str(e)
+
+    # The save itself is timed into the process histograms only; it can't be inside the row it writes
+    trace.info['total_seconds'] = round(time.perf_counter() - started, 6)
+    invoice.processing_metrics = trace.as_dict()
+    invoice.processing_completed_at = timezone.now()
+    save_started = time.perf_counter()
+    if save_claimed(invoice, CLAIMED_RESULT_FIELDS) and text:
+        index_invoice_text(invoice, text)
+    invoice.processing_metrics['stages']['db_save'] = round(time.perf_counter() - save_started, 6)
+
+    return invoice
+
+
+def park_invoice(invoice, retry_after, reason=None):
+    """Puts a claimed invoice back in the queue until `retry_after` seconds from now, without using up an attempt."""
+    invoice.status = 'pending'
+    invoice.error_message = reason
+    invoice.next_attempt_at = timezone.now() + timedelta(seconds=retry_after)
+    invoice.processing_attempts = max(0, invoice.processing_attempts - 1)
+    save_claimed(invoice, ('status', 'error_message', 'next_attempt_at', 'processing_attempts'))
+    return invoice
+
+
+def queue_depth():
+    """Number of invoices waiting for a worker (including parked ones)."""
+    return Invoice.objects.filter(status='pending', is_deleted=False).count()
+
+
+def extraction_metrics():
+    """Queue depth plus this process's LLM guard, batching, fast-path and cache counters."""
+    extractor = get_extractor()
+    metrics = {'queue_depth': queue_depth(), 'llm': llm_stats(), 'cache': cache_stats()}
+    if hasattr(extractor.model, 'metrics'):
+        metrics['llm_guard'] = extractor.model.metrics()
+    if extractor.batcher is not None:
+        metrics['batching'] = extractor.batcher.stats()
+    return metrics
+
+
+def metrics_gauges():
+    """extraction_metrics() flattened into Prometheus gauges for instrumentation.render_metrics()."""
+    try:
+        metrics = extraction_metrics()
+    finally:
+        connection.close()  # Called from the metrics server's request threads
+    gauges = {'invoice_queue_depth': ("Invoices waiting for a worker.", metrics.pop('queue_depth'))}
+    for group, values in metrics.items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                gauges[f"invoice_{group}_{key}"] = (f"{group} {key} in this process.", float(value))
+    return gauges
+
+
+def run_job(invoice_id):
+    """
+    Worker entry point: loads a claimed invoice by id and processes it.
+
+    Returns (status, processing_metrics) so the parent process can feed its
+    Prometheus histograms even when jobs run in a process pool.
+    """
+    close_old_connections()
+    try:
+        invoice = Invoice.objects.filter(id=invoice_id, status='processing', is_deleted=False).first()
+        if invoice is None:
+            return None, None  # Lease was lost or the invoice was deleted
+        with maybe_profile(f"invoice-{invoice_id}"):
+            process_invoice(invoice)
+        return invoice.status, invoice.processing_metrics
+    finally:
+        close_old_connections()
+
+
+# ✅ Bulk reprocessing (manage.py reprocess_invoices): extraction runs in the pool, writes are batched
+REEXTRACTED_FIELDS = (
+    'invoice_date', 'invoice_number', 'amount', 'due_date', 'status', 'error_message',
+    'processing_started_at', 'processing_completed_at', 'processing_metrics', 'duplicate_of_id', 'duplicate_score',
+)
+
+
+def reextract_invoice(invoice_id):
+    """
+    Pool entry point for bulk reprocessing: re-runs extraction for one invoice without saving it.
+
+    Returns (invoice_id, outcome). The outcome is None if the invoice is gone,
+    {'retry_after': seconds, 'error': ...} when the LLM is unavailable, or
+    {'fields': {...}, 'text': ...} for save_reextracted().
+    """
+    close_old_connections()
+    try:
+        invoice = Invoice.objects.filter(id=invoice_id, is_deleted=False).first()
+        if invoice is None:
+            return invoice_id, None
+
+        invoice.processing_started_at = timezone.now()
+        trace = ExtractionTrace()
+        trace.info['file_type'] = invoice.file_type
+        started = time.perf_counter()
+        try:
+            result = get_extractor().extract_invoice_data(
+                invoice.file.path, file_hash=invoice.file_hash, trace=trace,
+                duplicate_check=partial(find_duplicate, invoice),
+            )
+        except Exception as e:
+            logger.error(f"❌ Error reprocessing invoice {invoice_id}: {e}")
+            result = {'success': False, 'error': str(e)}
+
+        if not result['success'] and result.get('retry_after'):
+            return invoice_id, {'retry_after': result['retry_after'], 'error': result.get('error')}
+
+        text = apply_result(invoice, result)
+        trace.info['total_seconds'] = round(time.perf_counter() - started, 6)
+        invoice.processing_metrics = trace.as_dict()
+        invoice.processing_completed_at = timezone.now()
+        return invoice_id, {'fields': {field: getattr(invoice, field) for field in REEXTRACTED_FIELDS}, 'text': text}
+    finally:
+        close_old_connections()
+
+
+def save_reextracted(outcomes, statuses):
+    """
+    Writes reextract_invoice() outcomes ({invoice_id: outcome}) with one bulk_update.
+
+    Invoices that left `statuses` in the meantime (e.g. re-queued from the API) are
+    skipped. Since bulk_update() bypasses the save() signals, the per-user
+    aggregates, status events, read caches and search text are updated here. Returns
+    {invoice_id: written status}.
+    """
+    with transaction.atomic():
+        invoices = Invoice.objects.select_for_update().filter(
+            id__in=list(outcomes), status__in=statuses, is_deleted=False,
+        ).in_bulk()
+        previous = {invoice_id: snapshot(invoice) for invoice_id, invoice in invoices.items()}
+        for invoice_id, invoice in invoices.items():
+            for field, value in outcomes[invoice_id]['fields'].items():
+                setattr(invoice, field, value)
+            if not invoice.invoice_number:
+                invoice.invoice_number = invoice.default_invoice_number()
+        Invoice.objects.bulk_update(invoices.values(), REEXTRACTED_FIELDS)
+
+        record_changes([(previous[invoice_id], snapshot(invoice)) for invoice_id, invoice in invoices.items()])
+        moved = {}
+        for invoice_id, invoice in invoices.items():
+            if invoice.status != previous[invoice_id]['status']:
+                moved.setdefault(invoice.status, []).append((invoice_id, invoice.user_id))
+        for status, rows in moved.items():
+            record_status_events(rows, status)
+
+    forget_invoices(list(invoices))
+    for invoice_id, invoice in invoices.items():
+        text = outcomes[invoice_id]['text']
+        if text and invoice.status == 'completed':
+            index_invoice_text(invoice, text)
+    return {invoice_id: invoice.status for invoice_id, invoice in invoices.items()}
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import logging
+from django.utils.module_loading import import_string
+from .ai_settings import ai_setting
+from .batching import BATCH_ID_PATTERN
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """Interface for the model that turns an extraction prompt into a text response."""
+
+    name = 'base'
+
+    def invoke(self, prompt):
+        """Returns the model's response to `prompt` as plain text."""
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via LangChain; one client (and its connection pool) per process."""
+
+    name = 'gemini'
+
+    def __init__(self, model=None, google_api_key=None):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        google_api_key = google_api_key or os.getenv('GOOGLE_API_KEY')
+        if not google_api_key:
+            raise ValueError("❌ GOOGLE_API_KEY is missing. Please set it in your environment variables.")
+
+        self.client = ChatGoogleGenerativeAI(
+            model=model or ai_setting('LLM_MODEL', 'gemini-pro'),
+            google_api_key=google_api_key,
+        )
+
+    def invoke(self, prompt):
+        response = self.client.invoke(prompt)
+        return getattr(response, 'content', response)
+
+
+class StubBackend(LLMBackend):
+    """Deterministic local model for tests and benchmarks; never touches the network."""
+
+    name = 'stub'
+
+    def __init__(self, response=None, latency=0.0):
+        self.response = response or {
+            'invoice_date': None,
+            'invoice_number': None,
+            'amount': None,
+            'due_date': None,
+        }
+        self.latency = latency  # Simulated round-trip time in seconds
+
+    def invoke(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+
+        # Batched prompts expect one answer per invoice id
+        keys = BATCH_ID_PATTERN.findall(prompt)
+        if keys:
+            return json.dumps({key: self.response for key in keys})
+        return json.dumps(self.response)
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'stub': StubBackend,
+}
+
+
+def get_backend(name=None):
+    """Builds the LLM backend named in AI_SETTINGS['LLM_BACKEND'] (a key of BACKENDS or a dotted path)."""
+    name = name or ai_setting('LLM_BACKEND', 'gemini')
+    backend_class = BACKENDS.get(name) or import_string(name)
+    return backend_class()
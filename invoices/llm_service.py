@@ -1,68 +1,265 @@
 import os
 import logging
+import hashlib
 import re
 import json
+import time
+import threading
 import tempfile
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from langchain_google_genai import ChatGoogleGenerativeAI
 from PIL import Image
-import pytesseract
-import PyPDF2
 from dotenv import load_dotenv
+from .ai_settings import ai_setting
+from .llm_backends import get_backend
+from .pdf_extraction import extract_pdf_text
+from .ocr import ocr_image
+from .chunking import estimate_tokens, select_relevant_text
+from .batching import BatchSliceError, LLMBatcher, parse_json_response
+from .resilience import GuardedBackend, LLMUnavailable
+from .instrumentation import ExtractionTrace
+from .uploads import file_type_from_name
+from .transcription import TranscriptionUnavailable, transcribe_audio, transcription_setting
 
 load_dotenv()
 
 # Setup logger
 logger = logging.getLogger(__name__)
 
+# ✅ Fields extracted from every invoice, with their prompt description and JSON format
+INVOICE_FIELDS = ('invoice_date', 'invoice_number', 'amount', 'due_date')
+
+FIELD_DESCRIPTIONS = {
+    'invoice_date': '- **Invoice Date**: (e.g., "Statement Date", "Bill Date", "Invoice Date") in YYYY-MM-DD format.',
+    'invoice_number': '- **Invoice Number**: (e.g., "Invoice Number", "Bill Number", "Account Number").',
+    'amount': '- **Total Amount**: (e.g., "Total Amount Due", "Balance Due", "Payment Amount") in numeric format (e.g., 1250.00).',
+    'due_date': '- **Due Date**: (e.g., "Payment Due Date", "Due By Date", "Auto Pay Date") in YYYY-MM-DD format.',
+}
+
+FIELD_FORMATS = {
+    'invoice_date': '"YYYY-MM-DD"',
+    'invoice_number': '"string"',
+    'amount': '"numeric"',
+    'due_date': '"YYYY-MM-DD"',
+}
+
+# ✅ Prompt sent to Gemini; any edit changes PROMPT_VERSION and invalidates cached results
+PROMPT_TEMPLATE = """
+        You are an invoice data extraction assistant. Extract the following information from the provided invoice text:
+
+{field_descriptions}
+
+        Format the response as a **valid JSON object** with these exact keys:
+        ```
+        {{{{
+{json_keys}
+        }}}}
+        ```
+
+        If any field is missing, return `null` for that field.
+        
+        Here is the invoice text:
+        ```
+        {{text}}
+        ```
+
+        JSON Response:
+        """
+
+PROMPT_VERSION = hashlib.sha256(
+    (PROMPT_TEMPLATE + json.dumps(FIELD_DESCRIPTIONS, sort_keys=True)).encode()
+).hexdigest()[:16]
+
+# ✅ Bump when text extraction or post-processing changes in a way that affects results
+EXTRACTOR_VERSION = "2"
+
+
+def build_prompt(text, fields=INVOICE_FIELDS):
+    """Builds the extraction prompt asking only for `fields`."""
+    template = PROMPT_TEMPLATE.format(
+        field_descriptions="\n".join(f"        {FIELD_DESCRIPTIONS[field]}" for field in fields),
+        json_keys=",\n".join(f'            "{field}": {FIELD_FORMATS[field]}' for field in fields),
+    )
+    return template.format(text=text)
+
+
+# ✅ Deterministic fast path: precompiled label patterns with a confidence per pattern
+_DATE = r'(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4}|\d{1,2}\s+[A-Za-z]{3,9}\.?,?\s+\d{4})'
+_AMOUNT = r'[$€£]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})|\d+\.\d{2})'
+_SEP = r'\s*[:#]?\s*'
+_NUMBER = r'((?=[A-Z0-9\-/]*\d)[A-Z0-9][A-Z0-9\-/]{2,})'
+
+FIELD_PATTERNS = {
+    'invoice_number': [
+        (re.compile(r'invoice\s*(?:number|no\.?|num\.?|#)' + _SEP + _NUMBER, re.IGNORECASE), 0.95),
+        (re.compile(r'(?:bill|statement)\s*(?:number|no\.?|#)' + _SEP + _NUMBER, re.IGNORECASE), 0.9),
+        (re.compile(r'account\s*(?:number|no\.?|#)' + _SEP + _NUMBER, re.IGNORECASE), 0.7),
+    ],
+    'amount': [
+        (re.compile(r'total\s+amount\s+due' + _SEP + _AMOUNT, re.IGNORECASE), 0.95),
+        (re.compile(r'(?:amount|balance|total)\s+due' + _SEP + _AMOUNT, re.IGNORECASE), 0.9),
+        (re.compile(r'(?:payment\s+amount|grand\s+total)' + _SEP + _AMOUNT, re.IGNORECASE), 0.85),
+        (re.compile(r'\btotal' + _SEP + _AMOUNT, re.IGNORECASE), 0.6),
+    ],
+    'invoice_date': [
+        (re.compile(r'(?:invoice|bill|statement)\s+date' + _SEP + _DATE, re.IGNORECASE), 0.95),
+        (re.compile(r'\bdate\s+(?:of\s+)?issued?' + _SEP + _DATE, re.IGNORECASE), 0.85),
+    ],
+    'due_date': [
+        (re.compile(r'(?:payment\s+)?due\s+(?:date|by(?:\s+date)?)' + _SEP + _DATE, re.IGNORECASE), 0.95),
+        (re.compile(r'auto\s*pay\s+date' + _SEP + _DATE, re.IGNORECASE), 0.85),
+    ],
+}
+
+DATE_FORMATS = (
+    '%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%d.%m.%Y',
+    '%B %d, %Y', '%b %d, %Y', '%B %d %Y', '%b %d %Y', '%d %B %Y', '%d %b %Y',
+)
+
+# ✅ Process-wide counters for how often the LLM call was avoided
+_llm_stats_lock = threading.Lock()
+_llm_stats = {
+    'documents': 0, 'llm_calls': 0, 'llm_batched': 0, 'llm_skipped': 0, 'fields_from_rules': 0,
+    'prompt_tokens_full': 0, 'prompt_tokens_sent': 0, 'duplicates': 0,
+}
+
+
+def _record_llm_stat(counter, amount=1):
+    with _llm_stats_lock:
+        _llm_stats[counter] += amount
+
+
+def llm_stats():
+    """Returns a snapshot of the fast-path counters with the LLM skip rate and prompt token ratio."""
+    with _llm_stats_lock:
+        snapshot = dict(_llm_stats)
+    snapshot['skip_rate'] = snapshot['llm_skipped'] / snapshot['documents'] if snapshot['documents'] else 0.0
+    snapshot['prompt_token_ratio'] = (
+        snapshot['prompt_tokens_sent'] / snapshot['prompt_tokens_full'] if snapshot['prompt_tokens_full'] else 1.0
+    )
+    return snapshot
+
+
+def compute_file_hash(file_path, chunk_size=64 * 1024):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class InvoiceExtractor:
-    def __init__(self):
-        self.google_api_key = os.getenv('GOOGLE_API_KEY')
-        if not self.google_api_key:
-            raise ValueError("❌ GOOGLE_API_KEY is missing. Please set it in your environment variables.")
+    def __init__(self, backend=None, cache=None, batcher=None):
+        # ✅ Model backend (Gemini by default, see llm_backends.BACKENDS)
+        self.model = backend or get_backend()
+
+        # Optional result cache with get(file_hash) / put(file_hash, text, data)
+        self.cache = cache
 
-        # ✅ Initialize Gemini model via LangChain
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-pro",
-            google_api_key=self.google_api_key
-        )
+        # Optional batching.LLMBatcher that packs concurrent requests into one prompt
+        self.batcher = batcher
 
     def extract_text_from_image(self, file_path):
         """Extracts text from an image file using Tesseract OCR."""
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
+            with Image.open(file_path) as image:
+                text = ocr_image(image)
             return text.strip() if text else None
         except Exception as e:
             logger.error(f"❌ Error extracting text from image: {e}")
             return None
 
-    def extract_text_from_pdf(self, file_path):
-        """Extracts text from a PDF file using PyPDF2."""
+    def extract_text_from_pdf(self, file_path, early_stop=None, stats=None):
+        """Extracts text from a PDF file using PyPDF2 (see pdf_extraction.extract_pdf_text)."""
         try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = " ".join(page.extract_text() for page in reader.pages if page.extract_text())
+            text = extract_pdf_text(file_path, early_stop=early_stop, stats=stats)
             return text.strip() if text else None
         except Exception as e:
             logger.error(f"❌ Error extracting text from PDF: {e}")
             return None
 
-    def extract_invoice_data(self, file_path):
-        """Extracts structured invoice data using Google Gemini AI."""
-        
+    def extract_text_from_audio(self, file_path, stats=None):
+        """Transcribes an audio invoice with Whisper (see transcription.transcribe_audio)."""
+        try:
+            text, transcription_stats = transcribe_audio(file_path)
+        except TranscriptionUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error transcribing audio: {e}")
+            return None
+        if stats is not None:
+            stats.update(transcription_stats)
+        return text.strip() if text else None
+
+    def _check_duplicate(self, duplicate_check, text, candidates, trace):
+        if duplicate_check is None:
+            return None
+        try:
+            with trace.stage('dedup'):
+                duplicate = duplicate_check(text, candidates)
+        except Exception as e:
+            logger.error(f"❌ Error checking for duplicate invoices: {e}")
+            return None
+        if duplicate is not None:
+            _record_llm_stat('duplicates')
+            trace.info['duplicate_of'] = duplicate['invoice_id']
+        return duplicate
+
+    def extract_invoice_data(self, file_path, file_hash=None, trace=None, duplicate_check=None):
+        """
+        Extracts structured invoice data using Google Gemini AI.
+
+        Stage durations and input/text/prompt sizes are recorded on `trace`
+        (an instrumentation.ExtractionTrace) when one is passed. `duplicate_check(text,
+        rule_candidates)` (see dedup.find_duplicate) runs before the LLM call; when it
+        finds an earlier copy, that invoice's fields are reused instead of calling the LLM.
+        """
+        trace = trace if trace is not None else ExtractionTrace()
+        file_type = file_type_from_name(file_path)  # Same extension map the upload endpoints accept
+        try:
+            trace.info['input_bytes'] = os.path.getsize(file_path)
+        except OSError:
+            pass  # Reported below as a text extraction failure
+
+        # Serve identical file content from the result cache (skips OCR and the LLM)
+        if self.cache is not None:
+            with trace.stage('cache_lookup'):
+                file_hash = file_hash or compute_file_hash(file_path)
+                cached = self.cache.get(file_hash)
+            trace.info['cache_hit'] = cached is not None
+            if cached is not None:
+                duplicate = self._check_duplicate(duplicate_check, cached['text'], {}, trace)
+                with trace.stage('postprocess'):
+                    return self._process_invoice_data(cached['data'], cached['text'], duplicate)
+
         # Determine file type and extract raw text
-        file_extension = os.path.splitext(file_path)[1].lower()
         text = None
 
-        if file_extension in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
-            text = self.extract_text_from_image(file_path)
-        elif file_extension == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
+        if file_type == 'image':
+            with trace.stage('ocr'):
+                text = self.extract_text_from_image(file_path)
+        elif file_type == 'pdf':
+            pdf_stats = {}
+            text = self.extract_text_from_pdf(file_path, stats=pdf_stats)
+            if pdf_stats:
+                trace.add('pdf_text', pdf_stats['seconds'] - pdf_stats['ocr_seconds'])
+                if pdf_stats['ocr_pages']:
+                    trace.add('ocr', pdf_stats['ocr_seconds'])
+                trace.info.update({key: pdf_stats[key] for key in ('page_count', 'pages_read', 'ocr_pages')})
+        elif file_type == 'audio':
+            audio_stats = {}
+            try:
+                with trace.stage('transcription'):
+                    text = self.extract_text_from_audio(file_path, stats=audio_stats)
+            except TranscriptionUnavailable as e:
+                logger.warning(f"⚠️ Parking audio invoice, {e}")
+                return {'success': False, 'retry_after': transcription_setting('RETRY_AFTER'), 'error': str(e)}
+            trace.info.update({key: audio_stats[key] for key in ('audio_seconds', 'real_time_factor', 'chunks')
+                               if key in audio_stats})
         else:
             try:
-                with open(file_path, 'r', errors='ignore') as file:
+                with trace.stage('file_read'), open(file_path, 'r', errors='ignore') as file:
                     text = file.read().strip()
             except Exception as e:
                 logger.error(f"❌ Error reading text file: {e}")
@@ -70,58 +267,136 @@ class InvoiceExtractor:
         if not text:
             return {'success': False, 'error': 'Failed to extract text from the invoice'}
 
-        # Prepare LLM prompt
-        prompt = f"""
-        You are an invoice data extraction assistant. Extract the following information from the provided invoice text:
+        _record_llm_stat('documents')
+        trace.info['text_chars'] = len(text)
+        trace.info['text_tokens'] = estimate_tokens(text)
 
-        - **Invoice Date**: (e.g., "Statement Date", "Bill Date", "Invoice Date") in YYYY-MM-DD format.
-        - **Invoice Number**: (e.g., "Invoice Number", "Bill Number", "Account Number").
-        - **Total Amount**: (e.g., "Total Amount Due", "Balance Due", "Payment Amount") in numeric format (e.g., 1250.00).
-        - **Due Date**: (e.g., "Payment Due Date", "Due By Date", "Auto Pay Date") in YYYY-MM-DD format.
+        # ✅ Deterministic fast path; the LLM is only asked for what the rules couldn't resolve
+        data = {}
+        candidates = {}
+        if ai_setting('RULES_ENABLED', True):
+            with trace.stage('rules'):
+                candidates = self.extract_fields_with_rules(text)
+            min_confidence = ai_setting('RULES_MIN_CONFIDENCE', 0.9)
+            data = {field: value for field, (value, confidence) in candidates.items() if confidence >= min_confidence}
+            _record_llm_stat('fields_from_rules', len(data))
 
-        Format the response as a **valid JSON object** with these exact keys:
-        ```
-        {{
-            "invoice_date": "YYYY-MM-DD",
-            "invoice_number": "string",
-            "amount": "numeric",
-            "due_date": "YYYY-MM-DD"
-        }}
-        ```
+        # ✅ Probable re-upload of an invoice we already extracted: reuse the fields it has values for
+        duplicate = self._check_duplicate(duplicate_check, text, candidates, trace)
+        borrowed = {}
+        if duplicate is not None:
+            borrowed = {field: value for field, value in duplicate['data'].items()
+                        if value is not None and field not in data}
+            data.update(borrowed)
+        # Fields borrowed from another invoice must not be cached as what this file produced
+        cacheable = self.cache is not None and not borrowed
 
-        If any field is missing, return `null` for that field.
-        
-        Here is the invoice text:
-        ```
-        {text}
-        ```
+        missing = [field for field in INVOICE_FIELDS if field not in data]
+        trace.info['llm_skipped'] = not missing
+        if not missing:
+            _record_llm_stat('llm_skipped')
+            if cacheable:
+                self.cache.put(file_hash, text, data)
+            with trace.stage('postprocess'):
+                return self._process_invoice_data(data, text, duplicate)
 
-        JSON Response:
-        """
+        # Prepare LLM prompt from the chunks most relevant to the missing fields
+        with trace.stage('prompt_build'):
+            prompt_text = select_relevant_text(text, missing) if ai_setting('CHUNK_SELECTION', True) else text
+        prompt_tokens = estimate_tokens(prompt_text)
+        trace.info['prompt_tokens'] = prompt_tokens
+        _record_llm_stat('prompt_tokens_full', trace.info['text_tokens'])
+        _record_llm_stat('prompt_tokens_sent', prompt_tokens)
 
-        # Call Google Gemini AI API
+        # Call Google Gemini AI API (shared with concurrent extractions when batching is on)
         try:
-            response = self.model.invoke(prompt)
-
-            # Extract LLM response
-            response_text = response.strip()
-            
-            # Try to find JSON in response
-            json_match = re.search(r'({.*})', response_text.replace('\n', ''), re.DOTALL)
-            json_str = json_match.group(1) if json_match else response_text
-            
-            # Parse JSON
-            data = json.loads(json_str)
+            llm_data = None
+            if self.batcher is not None:
+                try:
+                    with trace.stage('llm_call'):
+                        llm_data = self.batcher.submit(prompt_text).result()
+                    _record_llm_stat('llm_batched')
+                    trace.info['llm_batched'] = True
+                except BatchSliceError:
+                    llm_data = None  # Fall back to a single-invoice call
+
+            if llm_data is None:
+                _record_llm_stat('llm_calls')
+                with trace.stage('prompt_build'):
+                    prompt = build_prompt(prompt_text, missing)
+                with trace.stage('llm_call'):
+                    response = self.model.invoke(prompt)
+
+                # Parse JSON
+                with trace.stage('json_parse'):
+                    llm_data = parse_json_response(response)
+
+            # Low-confidence rule matches still beat a null from the LLM
+            for field in missing:
+                value = llm_data.get(field)
+                if value is None and field in candidates:
+                    value = candidates[field][0]
+                data[field] = value
+
+            if cacheable:
+                self.cache.put(file_hash, text, data)
 
             # ✅ Process extracted data
-            return self._process_invoice_data(data)
+            with trace.stage('postprocess'):
+                return self._process_invoice_data(data, text, duplicate)
+
+        except LLMUnavailable as e:
+            logger.warning(f"⚠️ Parking invoice extraction, LLM unavailable: {e}")
+            return {'success': False, 'retry_after': e.retry_after, 'error': f'LLM unavailable: {str(e)}'}
 
         except Exception as e:
             logger.error(f"❌ Error calling Google Gemini API: {e}")
             return {'success': False, 'error': f'LLM processing error: {str(e)}'}
 
-    def _process_invoice_data(self, data):
-        """Validates and processes extracted invoice data."""
+    def extract_fields_with_rules(self, text):
+        """
+        Resolves invoice fields with FIELD_PATTERNS.
+
+        Returns {field: (value, confidence)} for every field with a valid match; values
+        use the same string formats the LLM is asked for, so both sources merge cleanly.
+        """
+        results = {}
+        for field, patterns in FIELD_PATTERNS.items():
+            for pattern, confidence in patterns:
+                match = pattern.search(text)
+                if not match:
+                    continue
+
+                raw = match.group(1).strip()
+                if field in ('invoice_date', 'due_date'):
+                    value = self._normalize_date(raw)
+                elif field == 'amount':
+                    value = raw.replace(',', '') if self._validate_amount(raw) is not None else None
+                else:
+                    value = raw
+
+                if value:
+                    results[field] = (value, confidence)
+                    break  # Patterns are ordered by confidence
+        return results
+
+    def _normalize_date(self, raw):
+        """Converts a date in any of DATE_FORMATS to YYYY-MM-DD, or None."""
+        cleaned = re.sub(r'\s+', ' ', re.sub(r'(?<=[A-Za-z])\.', '', raw)).strip()
+        for date_format in DATE_FORMATS:
+            try:
+                candidate = datetime.strptime(cleaned, date_format).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+            if self._validate_date(candidate):
+                return candidate
+        return None
+
+    def _process_invoice_data(self, data, text=None, duplicate=None):
+        """
+        Validates and processes extracted invoice data; the source `text` (for search) and
+        the `duplicate` match, if any, are passed through.
+        """
         processed_data = {}
 
         # Invoice Date
@@ -136,7 +411,7 @@ class InvoiceExtractor:
         # Due Date
         processed_data['due_date'] = self._validate_date(data.get('due_date'))
 
-        return {'success': True, 'data': processed_data}
+        return {'success': True, 'data': processed_data, 'text': text, 'duplicate': duplicate}
 
     def _validate_date(self, date_str):
         """Validates and converts a date string to YYYY-MM-DD format."""
@@ -150,7 +425,62 @@ class InvoiceExtractor:
         if not amount_str:
             return None
         try:
-            return Decimal(re.sub(r'[^\d.]', '', amount_str))  # Remove non-numeric symbols
+            return Decimal(re.sub(r'[^\d.]', '', str(amount_str)))  # Remove non-numeric symbols
         except (ValueError, TypeError, InvalidOperation):
             return None
 
+
+
+# ✅ Process-wide extractor, created lazily and shared across threads
+_shared_extractor = None
+_shared_extractor_lock = threading.Lock()
+
+
+def get_extractor():
+    """Returns the process-wide InvoiceExtractor, creating it on first use."""
+    global _shared_extractor
+    if _shared_extractor is None:
+        with _shared_extractor_lock:
+            if _shared_extractor is None:
+                from .cache import ExtractionCache
+
+                started = time.perf_counter()
+                backend = get_backend()
+                if ai_setting('LLM_GUARD', True):
+                    backend = GuardedBackend(
+                        backend,
+                        max_concurrent=ai_setting('LLM_MAX_CONCURRENT', 4),
+                        requests_per_minute=ai_setting('LLM_REQUESTS_PER_MINUTE', 60),
+                        max_retries=ai_setting('LLM_MAX_RETRIES', 4),
+                        failure_threshold=ai_setting('LLM_BREAKER_THRESHOLD', 5),
+                        reset_timeout=ai_setting('LLM_BREAKER_RESET', 60.0),
+                        probe_timeout=ai_setting('LLM_BREAKER_PROBE_TIMEOUT', None),
+                    )
+                batcher = None
+                if ai_setting('LLM_BATCHING', False):
+                    batcher = LLMBatcher(
+                        backend,
+                        max_invoices=ai_setting('BATCH_MAX_INVOICES', 10),
+                        token_budget=ai_setting('BATCH_TOKEN_BUDGET', 8000),
+                        flush_interval=ai_setting('BATCH_FLUSH_INTERVAL', 2.0),
+                        max_concurrent=ai_setting('BATCH_MAX_CONCURRENT', 4),
+                    )
+                _shared_extractor = InvoiceExtractor(
+                    backend=backend,
+                    cache=ExtractionCache() if ai_setting('EXTRACTION_CACHE_ENABLED', True) else None,
+                    batcher=batcher,
+                )
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                logger.info(f"✅ Invoice extractor ({_shared_extractor.model.name}) initialized in {elapsed_ms:.1f} ms")
+    return _shared_extractor
+
+
+def reset_extractor():
+    """Drops the shared extractor so the next call to get_extractor() builds a new one."""
+    global _shared_extractor
+    _shared_extractor = None
+
+
+# LLM clients hold sockets/channels that must not be shared with forked children
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_extractor)
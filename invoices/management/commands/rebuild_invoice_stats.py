@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.contrib.auth.models import User
+from invoices.analytics import rebuild_user_stats, verify_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-user invoice summaries from the invoices table and reports drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', default=[],
+                            help="Only check this username (repeatable).")
+        parser.add_argument('--verify-only', action='store_true',
+                            help="Report mismatches without rewriting the summaries.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(Q(invoices__isnull=False) | Q(invoice_stats__isnull=False)).distinct()
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+
+        checked = drifted = 0
+        for user_id, username in users.order_by('id').values_list('id', 'username').iterator():
+            checked += 1
+            problems = verify_user_stats(user_id)
+            if problems:
+                drifted += 1
+                self.stdout.write(self.style.WARNING(f"⚠️ {username}: " + "; ".join(problems)))
+            if problems and not options['verify_only']:
+                rebuild_user_stats(user_id)
+
+        action = "found" if options['verify_only'] else "rebuilt"
+        self.stdout.write(self.style.SUCCESS(f"✅ Checked {checked} users, {action} {drifted} with drifted summaries."))
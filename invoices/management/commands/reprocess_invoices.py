@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, time as day_time
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from invoices.jobs import queue_setting, reextract_invoice, save_reextracted, start_process_pool
+from invoices.ai_settings import ai_setting
+from invoices.models import Invoice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = 'reprocess_invoices.checkpoint.json'
+
+
+def _set_request_budget(requests_per_minute):
+    """Applied before the process-wide extractor (and its GuardedBackend token bucket) is created."""
+    settings.AI_SETTINGS['LLM_REQUESTS_PER_MINUTE'] = requests_per_minute
+
+
+def _init_process_worker(requests_per_minute):
+    django.setup()
+    _set_request_budget(requests_per_minute)
+
+
+def _parse_moment(value, end_of_day=False):
+    """ISO datetime, or a date (start of day, or end of day for --until)."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        moment = datetime.combine(day, day_time.max if end_of_day else day_time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = ("Re-runs extraction for failed (or completed) invoices in a worker pool, writing results in "
+            "batches and checkpointing progress so an interrupted run resumes where it stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', dest='statuses', choices=['failed', 'completed'],
+                            help="Invoice status to reprocess (repeatable, default: failed). Pending and "
+                                 "processing invoices belong to the extraction workers.")
+        parser.add_argument('--since', help="Only invoices uploaded on/after this date or ISO datetime.")
+        parser.add_argument('--until', help="Only invoices uploaded on/before this date or ISO datetime.")
+        parser.add_argument('--error-pattern', help="Case-insensitive regex the error message must match.")
+        parser.add_argument('--user', action='append', dest='users', default=[],
+                            help="Only this username's invoices (repeatable).")
+        parser.add_argument('--limit', type=int, help="Stop after this many invoices (across resumed runs).")
+        parser.add_argument('--workers', type=int, default=queue_setting('WORKERS'),
+                            help="Number of concurrent extraction jobs.")
+        parser.add_argument('--pool', choices=['thread', 'process'], default=queue_setting('POOL'),
+                            help="Run jobs in a thread pool or a process pool.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Results written per bulk_update (and checkpoint).")
+        parser.add_argument('--requests-per-minute', type=int,
+                            default=ai_setting('LLM_REQUESTS_PER_MINUTE', 60),
+                            help="LLM request budget for the whole run, split across process workers. "
+                                 "Leave headroom for the extraction workers sharing the quota.")
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="Checkpoint file.")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+        parser.add_argument('--progress-interval', type=float, default=5.0,
+                            help="Seconds between progress lines.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the matching invoices.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be at least 1.")
+
+        statuses = sorted(options['statuses'] or ['failed'])
+        queryset = Invoice.objects.filter(status__in=statuses, is_deleted=False)
+        if options['since']:
+            queryset = queryset.filter(uploaded_at__gte=_parse_moment(options['since']))
+        if options['until']:
+            queryset = queryset.filter(uploaded_at__lte=_parse_moment(options['until'], end_of_day=True))
+        if options['error_pattern']:
+            queryset = queryset.filter(error_message__iregex=options['error_pattern'])
+        if options['users']:
+            queryset = queryset.filter(user__username__in=options['users'])
+
+        # ✅ Resume only a run with the same selection
+        selection = {
+            'statuses': statuses, 'since': options['since'], 'until': options['until'],
+            'error_pattern': options['error_pattern'], 'users': sorted(options['users']),
+        }
+        checkpoint = self._load_checkpoint(options['checkpoint'], selection, options['restart'])
+        queryset = queryset.filter(id__gt=checkpoint['last_id'])
+
+        total = queryset.count()
+        if options['limit'] is not None:
+            total = max(0, min(total, options['limit'] - checkpoint['processed']))
+        if options['dry_run'] or not total:
+            self.stdout.write(f"🔎 {total} invoice(s) to reprocess"
+                              + (f" (resuming after id {checkpoint['last_id']})" if checkpoint['last_id'] else ""))
+            return
+
+        if options['pool'] == 'process':
+            budget = max(1, options['requests_per_minute'] // workers)
+            executor = start_process_pool(workers, initializer=_init_process_worker, initargs=(budget,))
+        else:
+            _set_request_budget(options['requests_per_minute'])
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reprocess')
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f"🚀 Reprocessing {total} invoice(s) with {workers} {options['pool']} worker(s)"
+                          + (f", resuming after id {checkpoint['last_id']}" if checkpoint['last_id'] else ""))
+        try:
+            self._run(executor, queryset, total, statuses, checkpoint, options)
+        finally:
+            executor.shutdown(wait=True)
+
+        verb = "Stopped" if self._stopping else "Finished"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {verb}: {checkpoint['completed']} completed, {checkpoint['failed']} failed, "
+            f"{checkpoint['skipped']} skipped (checkpoint: {options['checkpoint']})"
+        ))
+
+    def _run(self, executor, queryset, total, statuses, checkpoint, options):
+        batch_size = options['batch_size']
+        window = options['workers'] * 2  # Keeps every worker busy without loading the whole selection
+        budget = total
+
+        def pending_ids():
+            last_id = checkpoint['last_id']
+            while True:
+                ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    return
+                yield from ids
+                last_id = ids[-1]
+
+        source = pending_ids()
+        exhausted = False
+        dispatched = deque()  # Ids in id order; the checkpoint advances past the finished prefix
+        finished = set()
+        results = {}
+        retries = deque()
+        in_flight = {}
+        paused_until = 0.0
+        started = time.monotonic()
+        reported_at = started
+        done_this_run = 0
+
+        def flush():
+            nonlocal done_this_run
+            if results:
+                written = save_reextracted(dict(results), statuses)
+                for status in written.values():
+                    checkpoint[status] += 1
+                checkpoint['skipped'] += len(results) - len(written)
+                finished.update(results)
+                results.clear()
+            while dispatched and dispatched[0] in finished:
+                checkpoint['last_id'] = dispatched.popleft()
+                finished.discard(checkpoint['last_id'])
+                checkpoint['processed'] += 1
+                done_this_run += 1
+            self._save_checkpoint(options['checkpoint'], checkpoint)
+
+        while True:
+            now = time.monotonic()
+            while not self._stopping and len(in_flight) < window and now >= paused_until:
+                if retries:
+                    invoice_id = retries.popleft()
+                elif not exhausted and budget > 0:
+                    invoice_id = next(source, None)
+                    if invoice_id is None:
+                        exhausted = True
+                        break
+                    budget -= 1
+                    dispatched.append(invoice_id)
+                else:
+                    break
+                in_flight[executor.submit(reextract_invoice, invoice_id)] = invoice_id
+
+            if not in_flight and (self._stopping or (not retries and (exhausted or budget <= 0))):
+                break
+
+            if in_flight:
+                completed, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+            else:
+                completed = ()
+                time.sleep(min(1.0, max(0.0, paused_until - now)))  # Waiting out an LLM outage
+            for future in completed:
+                invoice_id = in_flight.pop(future)
+                try:
+                    _, outcome = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Reprocess job for invoice {invoice_id} crashed: {e}")
+                    outcome = None
+                if outcome is None:
+                    checkpoint['skipped'] += 1
+                    finished.add(invoice_id)
+                elif 'retry_after' in outcome:
+                    # Provider rate limit / outage: retry later instead of burning the quota
+                    if time.monotonic() >= paused_until:
+                        logger.warning(f"⚠️ LLM unavailable ({outcome['error']}); pausing {outcome['retry_after']}s")
+                    paused_until = max(paused_until, time.monotonic() + outcome['retry_after'])
+                    retries.append(invoice_id)
+                else:
+                    results[invoice_id] = outcome
+
+            if len(results) >= batch_size:
+                flush()
+
+            if time.monotonic() - reported_at >= options['progress_interval']:
+                reported_at = time.monotonic()
+                self._report(done_this_run + len(results), total, checkpoint, reported_at - started,
+                             paused=reported_at < paused_until)
+
+        flush()
+        self._report(done_this_run, total, checkpoint, time.monotonic() - started)
+
+    def _report(self, done, total, checkpoint, elapsed, paused=False):
+        rate = done / elapsed if elapsed else 0.0
+        eta = f", ETA {(total - done) / rate / 60:.1f} min" if rate and done < total else ""
+        self.stdout.write(
+            f"📈 {done}/{total} ({done * 100 // total}%) - {checkpoint['completed']} completed, "
+            f"{checkpoint['failed']} failed, {checkpoint['skipped']} skipped - {rate:.2f} invoices/s{eta}"
+            + (" - paused, LLM unavailable" if paused else "")
+        )
+
+    def _load_checkpoint(self, path, selection, restart):
+        fresh = {'selection': selection, 'last_id': 0, 'processed': 0, 'completed': 0, 'failed': 0, 'skipped': 0}
+        if restart or not os.path.exists(path):
+            return fresh
+        with open(path) as file:
+            checkpoint = json.load(file)
+        if checkpoint.get('selection') != selection:
+            raise CommandError(f"{path} belongs to a run with different filters; pass --restart or --checkpoint.")
+        return {**fresh, **checkpoint}
+
+    def _save_checkpoint(self, path, checkpoint):
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary, path)
+
+    def _request_stop(self, signum, frame):
+        """Finish in-flight jobs, write their results and the checkpoint, then exit."""
+        self.stdout.write("🛑 Stop requested, finishing in-flight invoices...")
+        self._stopping = True
@@ -0,0 +1,141 @@
+import json
+import logging
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from invoices.events import prune_status_events
+from invoices.instrumentation import instrumentation_setting, observe_extraction, start_metrics_server
+from invoices.jobs import (claim_invoices, extraction_metrics, metrics_gauges, queue_setting, renew_leases, run_job,
+                           start_process_pool)
+from invoices.ai_settings import ai_setting
+
+logger = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 3600  # Seconds between status event log clean-ups
+
+
+def _init_process_worker(requests_per_minute, max_concurrent):
+    """
+    Configures Django in a worker process and gives it its share of the LLM quota.
+
+    Every process builds its own extractor and GuardedBackend, so without the split
+    the pool as a whole would send `workers` times the configured rate.
+    """
+    django.setup()
+    settings.AI_SETTINGS['LLM_REQUESTS_PER_MINUTE'] = requests_per_minute
+    settings.AI_SETTINGS['LLM_MAX_CONCURRENT'] = max_concurrent
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of workers that drive pending invoices through AI extraction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=queue_setting('WORKERS'),
+                            help="Number of concurrent extraction jobs.")
+        parser.add_argument('--pool', choices=['thread', 'process'], default=queue_setting('POOL'),
+                            help="Run jobs in a thread pool or a process pool.")
+        parser.add_argument('--batch-size', type=int, default=queue_setting('BATCH_SIZE'),
+                            help="Maximum number of invoices claimed per poll.")
+        parser.add_argument('--poll-interval', type=float, default=queue_setting('POLL_INTERVAL'),
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--visibility-timeout', type=int, default=queue_setting('VISIBILITY_TIMEOUT'),
+                            help="Seconds without a lease renewal after which an invoice stuck in "
+                                 "'processing' is reclaimed (leases are renewed every third of this).")
+        parser.add_argument('--metrics-interval', type=float, default=0,
+                            help="Log queue depth and LLM limiter metrics every N seconds (thread pool: whole "
+                                 "process; process pool: parent only). 0 disables.")
+        parser.add_argument('--metrics-port', type=int, default=instrumentation_setting('METRICS_PORT'),
+                            help="Serve Prometheus metrics (stage histograms, queue depth) on this port.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is drained instead of polling forever.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        if options['pool'] == 'process':
+            share = (
+                max(1, ai_setting('LLM_REQUESTS_PER_MINUTE', 60) // workers),
+                max(1, ai_setting('LLM_MAX_CONCURRENT', 4) // workers),
+            )
+            executor = start_process_pool(workers, initializer=_init_process_worker, initargs=share)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extraction')
+
+        self.stdout.write(f"🚀 Starting {workers} {options['pool']} extraction worker(s)")
+        metrics_server = None
+        if options['metrics_port']:
+            metrics_server = start_metrics_server(options['metrics_port'], gauges=metrics_gauges)
+            self.stdout.write(f"📊 Serving Prometheus metrics on :{options['metrics_port']}/metrics")
+        processed = 0
+        in_flight = {}  # future -> invoice id
+        metrics_logged_at = time.monotonic()
+        pruned_at = None
+        renewed_at = time.monotonic()
+
+        try:
+            while not self._stopping:
+                if options['metrics_interval'] and time.monotonic() - metrics_logged_at >= options['metrics_interval']:
+                    metrics_logged_at = time.monotonic()
+                    logger.info(f"📊 Extraction metrics: {json.dumps(extraction_metrics())}")
+
+                if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    logger.info(f"🧹 Pruned {prune_status_events()} old invoice status events")
+
+                done = [future for future in in_flight if future.done()]
+                for future in done:
+                    del in_flight[future]
+                    processed += 1
+                    if future.exception():
+                        logger.error(f"❌ Extraction job crashed: {future.exception()}")
+                        observe_extraction('crashed', None)
+                        continue
+                    # Jobs report their trace back, so histograms live here even with a process pool
+                    job_status, trace = future.result()
+                    if job_status is not None:
+                        observe_extraction(job_status, trace)
+
+                # ✅ Long extractions keep their lease; only jobs of a dead worker expire
+                if time.monotonic() - renewed_at >= options['visibility_timeout'] / 3:
+                    renewed_at = time.monotonic()
+                    renew_leases(in_flight.values())
+
+                claimed = []
+                free_slots = workers - len(in_flight)
+                if free_slots > 0:
+                    claimed = claim_invoices(
+                        min(free_slots, options['batch_size']),
+                        visibility_timeout=options['visibility_timeout'],
+                    )
+                    for invoice_id in claimed:
+                        in_flight[executor.submit(run_job, invoice_id)] = invoice_id
+
+                if claimed:
+                    continue
+                if options['once'] and not in_flight:
+                    break
+                if in_flight:
+                    wait(in_flight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(options['poll_interval'])
+        finally:
+            executor.shutdown(wait=True)
+            processed += len(in_flight)
+            if metrics_server is not None:
+                metrics_server.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Extraction workers stopped after {processed} job(s)"))
+
+    def _request_stop(self, signum, frame):
+        """Finish in-flight jobs, then exit."""
+        self.stdout.write("🛑 Stop requested, draining in-flight jobs...")
+        self._stopping = True
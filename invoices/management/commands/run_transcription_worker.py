@@ -0,0 +1,40 @@
+import signal
+from django.core.management.base import BaseCommand, CommandError
+from invoices.ml import get_whisper_model
+from invoices.transcription import TranscriptionServer, is_loopback_address, transcription_setting
+
+
+class Command(BaseCommand):
+    help = "Loads the Whisper model once and transcribes audio invoices for every web/extraction worker on the host."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=transcription_setting('WORKER_ADDRESS'),
+                            help="host:port to listen on (default: TRANSCRIPTION['WORKER_ADDRESS']).")
+        parser.add_argument('--batch-size', type=int, default=transcription_setting('BATCH_SIZE'),
+                            help="Audio chunks decoded per forward pass, across all waiting recordings.")
+        parser.add_argument('--allow-remote', action='store_true',
+                            help="Listen on a non-loopback address. Requests are pickled, so only do this on a "
+                                 "private network, with a strong TRANSCRIPTION_AUTHKEY.")
+
+    def handle(self, *args, **options):
+        if not options['address']:
+            raise CommandError("Set TRANSCRIPTION_WORKER_ADDRESS or pass --address host:port.")
+        if not transcription_setting('AUTHKEY'):
+            raise CommandError("Set TRANSCRIPTION_AUTHKEY to the secret shared with the web and extraction workers.")
+        if not is_loopback_address(options['address']) and not options['allow_remote']:
+            raise CommandError(f"{options['address']} is reachable from other hosts; pass --allow-remote to "
+                               f"listen on it anyway.")
+
+        model = get_whisper_model()
+        server = TranscriptionServer(options['address'], model, batch_size=options['batch_size'])
+
+        def stop(signum, frame):
+            # The interrupted accept() is retried on the closed socket and fails, ending serve_forever()
+            server.close()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"🎙️ Serving transcriptions on {options['address']} (batch size {options['batch_size']})")
+        server.serve_forever()
+        self.stdout.write(self.style.SUCCESS("✅ Transcription worker stopped."))
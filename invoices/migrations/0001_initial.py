@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='invoices/')),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('file_type', models.CharField(choices=[('pdf', 'PDF'), ('image', 'Image'), ('text', 'Text'), ('unknown', 'Unknown')], default='unknown', max_length=10)),
+                ('invoice_date', models.DateField(blank=True, null=True)),
+                ('invoice_number', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('processing_started_at', models.DateTimeField(blank=True, null=True)),
+                ('processing_completed_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(db_index=True, default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-uploaded_at'],
+            },
+        ),
+    ]
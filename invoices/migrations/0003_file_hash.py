@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0002_worker_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='file_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='ExtractionCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64)),
+                ('extractor_version', models.CharField(max_length=20)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('extracted_text', models.TextField()),
+                ('data', models.JSONField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('file_hash', 'extractor_version', 'prompt_version')},
+            },
+        ),
+    ]
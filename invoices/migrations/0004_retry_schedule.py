@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0003_file_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_retry_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'is_deleted', '-uploaded_at', '-id'], name='invoice_user_live_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_status_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='processing_metrics',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_processing_metrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='file_type',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('image', 'Image'), ('text', 'Text'), ('audio', 'Audio'), ('unknown', 'Unknown')], default='unknown', max_length=10),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.conf import settings
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0009_audio_invoices'),
+    ]
+
+    operations = [
+        # invoice_number_trgm_idx and TrigramSimilarity need pg_trgm
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='InvoiceText',
+            fields=[
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extracted_text', serialize=False, to='invoices.invoice')),
+                ('content', models.TextField(blank=True, default='')),
+                ('compressed', models.BinaryField(blank=True, null=True)),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('invoice_number'), name='gin_trgm_ops'), name='invoice_number_trgm_idx'),
+        ),
+        migrations.AddField(
+            model_name='invoicetext',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='invoicetext',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='invoice_text_search_idx'),
+        ),
+    ]
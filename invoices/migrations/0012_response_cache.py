@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-16 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicestats',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import gc
+import logging
+import threading
+import time
+from .ai_settings import ai_setting
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Heavy ML models, loaded on first use (or at startup when AI_SETTINGS['PRELOAD_MODELS'] is on)
+_whisper_model = None
+_whisper_lock = threading.Lock()
+
+
+def get_whisper_model():
+    """Returns the process-wide Whisper model, importing torch/whisper on first use."""
+    global _whisper_model
+    if _whisper_model is None:
+        with _whisper_lock:
+            if _whisper_model is None:
+                import torch
+                import whisper
+
+                started = time.perf_counter()
+                model_name = ai_setting('WHISPER_MODEL', 'base')
+                model = whisper.load_model(model_name)
+                if torch.cuda.is_available():
+                    model = model.to("cuda")
+                _whisper_model = model
+                logger.info(f"✅ Whisper '{model_name}' model loaded in {time.perf_counter() - started:.1f}s")
+    return _whisper_model
+
+
+def preload_models():
+    """
+    Eagerly loads the ML models so that forked workers share them copy-on-write.
+
+    Run it in the parent process (e.g. gunicorn --preload). Objects alive afterwards
+    are moved to the permanent GC generation so collections in the children don't
+    touch their pages and un-share them. Skipped when a shared transcription
+    worker (TRANSCRIPTION['WORKER_ADDRESS']) holds the model instead.
+    """
+    from .transcription import transcription_setting
+
+    if transcription_setting('WORKER_ADDRESS'):
+        return
+
+    try:
+        get_whisper_model()
+    except Exception as e:
+        logger.error(f"❌ Failed to preload Whisper model: {e}")
+        return
+
+    gc.collect()
+    gc.freeze()
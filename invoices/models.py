@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 import os
+import zlib
 
 class Invoice(models.Model):
     """Model representing an uploaded invoice with AI-extracted data."""
@@ -17,13 +22,20 @@ class Invoice(models.Model):
         ('pdf', 'PDF'),
         ('image', 'Image'),
         ('text', 'Text'),
+        ('audio', 'Audio'),
         ('unknown', 'Unknown'),
     )
     file_type = models.CharField(max_length=10, choices=FILE_TYPES, default='unknown')
 
+    # File size in bytes, stored at upload so listings never stat the storage backend
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+
+    # SHA-256 of the file content, computed at upload (key for the extraction cache)
+    file_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+
     # Extracted data from AI
     invoice_date = models.DateField(null=True, blank=True)
-    invoice_number = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    invoice_number = models.CharField(max_length=100, null=True, blank=True)  # Not unique: re-uploads are flagged below
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     due_date = models.DateField(null=True, blank=True)
 
@@ -40,15 +52,29 @@ class Invoice(models.Model):
     # AI processing timestamps
     processing_started_at = models.DateTimeField(null=True, blank=True)
     processing_completed_at = models.DateTimeField(null=True, blank=True)
+    processing_attempts = models.PositiveIntegerField(default=0)  # Incremented each time a worker claims the invoice
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # Parked until then (e.g. LLM rate limited)
+    processing_metrics = models.JSONField(null=True, blank=True)  # Stage timings and sizes of the last extraction
+
+    # Probable earlier copy of this invoice (see invoices.dedup), with the estimated text similarity
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates')
+    duplicate_score = models.FloatField(null=True, blank=True)
 
     # Soft delete (instead of permanent deletion)
     is_deleted = models.BooleanField(default=False, db_index=True)
 
+    def default_invoice_number(self):
+        return f"INV-{self.id or 'NEW'}-{(self.uploaded_at or timezone.now()).strftime('%Y%m%d')}"
+
     def save(self, *args, **kwargs):
-        """Auto-assigns invoice number if missing."""
-        if not self.invoice_number:
-            self.invoice_number = f"INV-{self.id or 'NEW'}-{self.uploaded_at.strftime('%Y%m%d')}"
+        """Auto-assigns invoice number if missing (built from the id, so new rows get it right after the insert)."""
+        assign_number = not self.invoice_number
+        if assign_number and self.pk is not None:
+            self.invoice_number = self.default_invoice_number()
         super().save(*args, **kwargs)
+        if assign_number and not self.invoice_number:
+            self.invoice_number = self.default_invoice_number()
+            Invoice.objects.filter(pk=self.pk).update(invoice_number=self.invoice_number)
 
     def delete(self, *args, **kwargs):
         """Soft delete instead of permanent deletion."""
@@ -60,4 +86,142 @@ class Invoice(models.Model):
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Serves the per-user listing (live rows, newest first) and its keyset pagination
+            models.Index(fields=['user', 'is_deleted', '-uploaded_at', '-id'], name='invoice_user_live_recent_idx'),
+            # Substring invoice number search: on PostgreSQL, invoice_number__icontains compiles to
+            # UPPER("invoice_number"::text) LIKE UPPER(%s), which only an index on that expression serves
+            GinIndex(OpClass(Upper('invoice_number'), name='gin_trgm_ops'), name='invoice_number_trgm_idx'),
+        ]
+
+
+class InvoiceText(models.Model):
+    """Text extracted from an invoice, kept for full-text search (see invoices.search)."""
+
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, primary_key=True, related_name='extracted_text')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')  # Copied so searches stay on one table
+
+    # Short text is stored as-is, longer text zlib-compressed (SEARCH['COMPRESS_THRESHOLD'])
+    content = models.TextField(blank=True, default='')
+    compressed = models.BinaryField(null=True, blank=True)
+    char_count = models.PositiveIntegerField(default=0)
+
+    search_vector = SearchVectorField(null=True)
+    minhash = models.BinaryField(null=True, blank=True)  # Text signature for duplicate detection (invoices.dedup)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.compressed)).decode() if self.compressed else self.content
+
+    def __str__(self):
+        return f"Text of invoice {self.invoice_id} ({self.char_count} chars)"
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='invoice_text_search_idx'),
+        ]
 
+
+
+class ExtractionCacheEntry(models.Model):
+    """Extraction result cached by file content, extractor version and prompt version."""
+
+    file_hash = models.CharField(max_length=64)
+    extractor_version = models.CharField(max_length=20)
+    prompt_version = models.CharField(max_length=20)
+
+    # Cached output of text extraction and the parsed LLM response
+    extracted_text = models.TextField()
+    data = models.JSONField()
+
+    # LRU bookkeeping
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Cache {self.file_hash[:12]} (v{self.extractor_version}/{self.prompt_version})"
+
+    class Meta:
+        unique_together = ('file_hash', 'extractor_version', 'prompt_version')
+
+
+class InvoiceFingerprint(models.Model):
+    """Lookup key of an invoice for duplicate detection: a MinHash LSH band or its (number, amount) key."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='fingerprints')
+    key = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Fingerprint {self.key} of invoice {self.invoice_id}"
+
+    class Meta:
+        indexes = [
+            # find_duplicate(): WHERE user_id = %s AND key IN (...)
+            models.Index(fields=['user', 'key'], name='invoice_fingerprint_key_idx'),
+        ]
+
+
+class InvoiceStats(models.Model):
+    """Per-user invoice totals, maintained incrementally by invoices.analytics."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='invoice_stats')
+
+    invoice_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Live (not soft-deleted) invoices per status
+    pending_count = models.PositiveIntegerField(default=0)
+    processing_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    # Bumped on every write to the user's invoices; invoice reads derive their ETags from it
+    version = models.PositiveBigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.user_id}: {self.invoice_count} invoices, {self.total_amount}"
+
+
+class InvoiceAmountBucket(models.Model):
+    """Per-user amount and count per day, for due-date windows and monthly spend."""
+
+    KINDS = (
+        ('due', 'Due date'),
+        ('month', 'Invoice month'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoice_amount_buckets')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    day = models.DateField()  # Due date, or first day of the invoice month
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind} {self.day} for {self.user_id}: {self.amount}"
+
+    class Meta:
+        unique_together = ('user', 'kind', 'day')
+
+
+class InvoiceStatusEvent(models.Model):
+    """Append-only log of invoice status transitions; the id is the subscribers' cursor."""
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoice_status_events')
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='status_events')
+    status = models.CharField(max_length=20, choices=Invoice.STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Invoice {self.invoice_id} -> {self.status}"
+
+    class Meta:
+        indexes = [
+            # Catch-up reads: WHERE user_id = %s AND id > %s ORDER BY id
+            models.Index(fields=['user', 'id'], name='invoice_event_user_cursor_idx'),
+        ]
@@ -0,0 +1,105 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import pytesseract
+from .ai_settings import ai_setting
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Tesseract runs one process per page; keep each single-threaded so parallel pages don't oversubscribe CPUs
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+
+def preprocess_image(image):
+    """
+    Prepares an image for tesseract: grayscale, normalized to OCR_DPI and capped
+    at OCR_MAX_DIMENSION pixels on the longest side.
+    """
+    target_dpi = ai_setting('OCR_DPI', 300)
+    max_dimension = ai_setting('OCR_MAX_DIMENSION', 3500)
+
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    scale = 1.0
+    source_dpi = image.info.get('dpi', (None, None))[0]
+    if source_dpi and source_dpi > target_dpi:
+        scale = target_dpi / float(source_dpi)
+
+    longest_side = max(image.size) * scale
+    if longest_side > max_dimension:
+        scale *= max_dimension / longest_side
+
+    if scale < 1.0:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+
+    return image
+
+
+def ocr_image(image):
+    """Runs tesseract on a preprocessed copy of `image`."""
+    return pytesseract.image_to_string(preprocess_image(image)) or ''
+
+
+def ocr_pdf_page(file_path, page_index):
+    """Rasterizes one PDF page (0-based) and OCRs it."""
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(
+        file_path,
+        dpi=ai_setting('OCR_DPI', 300),
+        first_page=page_index + 1,
+        last_page=page_index + 1,
+        grayscale=True,
+    )
+    return ocr_image(images[0]) if images else ''
+
+
+# ✅ Rasterization (pdftoppm) and tesseract both run as subprocesses, so threads are enough
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the shared OCR pool, sized to AI_SETTINGS['OCR_WORKERS'] or the CPU count."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=ai_setting('OCR_WORKERS', None) or os.cpu_count(),
+                    thread_name_prefix='ocr',
+                )
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    _pool = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool)
+
+
+def ocr_pdf_pages(file_path, page_indexes):
+    """OCRs the given PDF pages across the pool; returns {page_index: text}."""
+    started = time.perf_counter()
+    futures = {index: get_pool().submit(ocr_pdf_page, file_path, index) for index in page_indexes}
+
+    texts = {}
+    for index, future in futures.items():
+        try:
+            texts[index] = future.result()
+        except Exception as e:
+            logger.error(f"❌ Error running OCR on PDF page {index + 1}: {e}")
+            texts[index] = ''
+
+    if texts:
+        logger.info(f"🔎 OCR'd {len(texts)} scanned PDF page(s) in {time.perf_counter() - started:.2f}s")
+    return texts
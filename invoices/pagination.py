@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class InvoiceCursorPagination(CursorPagination):
+    """Keyset pagination on (uploaded_at, id); no COUNT(*) and constant cost at any depth."""
+
+    ordering = ('-uploaded_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import logging
+import threading
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+from .ai_settings import ai_setting
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Cheap signals that the header fields are already present (used by early-stop mode)
+EARLY_STOP_PATTERNS = {
+    'total': re.compile(r'\b(total|balance|amount)\b[^\n\d]{0,40}\d', re.IGNORECASE),
+    'date': re.compile(r'\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b|\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}', re.IGNORECASE),
+    'number': re.compile(r'\b(invoice|bill|account|statement)\s*(no\.?|number|#)', re.IGNORECASE),
+}
+
+
+def extract_page_range(file_path, start, end):
+    """Extracts the text of pages [start, end) of a PDF; runs inside pool workers."""
+    texts = []
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for index in range(start, end):
+            texts.append(reader.pages[index].extract_text() or '')
+    return texts
+
+
+# ✅ Process pool shared by all extractions in this process, created on first large PDF
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the shared PDF process pool (AI_SETTINGS['PDF_WORKERS'] processes)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=ai_setting('PDF_WORKERS', None) or os.cpu_count())
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    _pool = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool)
+
+
+class EarlyStopTracker:
+    """Records which header fields have shown up in the pages read so far."""
+
+    def __init__(self):
+        self.found = set()
+
+    def feed(self, text):
+        for field, pattern in EARLY_STOP_PATTERNS.items():
+            if field not in self.found and pattern.search(text):
+                self.found.add(field)
+        return self.done
+
+    @property
+    def done(self):
+        return len(self.found) == len(EARLY_STOP_PATTERNS)
+
+
+def iter_pdf_pages(file_path, page_count):
+    """
+    Yields page texts in order, extracting each page exactly once.
+
+    Small documents are read serially; larger ones are fanned out across the
+    process pool in chunks of PDF_PAGES_PER_CHUNK pages and streamed back in order.
+    """
+    chunk_size = ai_setting('PDF_PAGES_PER_CHUNK', 8)
+
+    if page_count < ai_setting('PDF_PARALLEL_MIN_PAGES', 16):
+        with open(file_path, 'rb') as file:
+            for page in PyPDF2.PdfReader(file).pages:
+                yield page.extract_text() or ''
+        return
+
+    futures = [
+        get_pool().submit(extract_page_range, file_path, start, min(start + chunk_size, page_count))
+        for start in range(0, page_count, chunk_size)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        # Early stop (or an error) leaves unread chunks behind; drop the ones not yet started
+        for future in futures:
+            future.cancel()
+
+
+def extract_pdf_text(file_path, early_stop=None, ocr_fallback=None, stats=None):
+    """
+    Extracts the text layer of a PDF.
+
+    With `early_stop`, reading stops once total/date/number candidates have been
+    seen. With `ocr_fallback`, pages without a text layer (scans) are rasterized and
+    OCR'd in parallel. Page count, pages read, time per page and OCR time are written into `stats`.
+    """
+    if early_stop is None:
+        early_stop = ai_setting('PDF_EARLY_STOP', False)
+    if ocr_fallback is None:
+        ocr_fallback = ai_setting('OCR_FALLBACK', True)
+
+    started = time.perf_counter()
+    with open(file_path, 'rb') as file:
+        page_count = len(PyPDF2.PdfReader(file).pages)
+
+    tracker = EarlyStopTracker() if early_stop else None
+    pages = []
+    with closing(iter_pdf_pages(file_path, page_count)) as page_texts:
+        for page_text in page_texts:
+            pages.append(page_text)
+            if tracker and tracker.feed(page_text):
+                break
+
+    # Hybrid mode: only pages with no text layer go through OCR
+    scanned = [index for index, text in enumerate(pages) if not text.strip()]
+    ocr_seconds = 0.0
+    if ocr_fallback and scanned:
+        from .ocr import ocr_pdf_pages
+
+        ocr_started = time.perf_counter()
+        for index, text in ocr_pdf_pages(file_path, scanned).items():
+            pages[index] = text
+        ocr_seconds = time.perf_counter() - ocr_started
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'page_count': page_count,
+        'pages_read': len(pages),
+        'seconds': elapsed,
+        'seconds_per_page': elapsed / len(pages) if pages else 0.0,
+        'early_stopped': len(pages) < page_count,
+        'ocr_pages': len(scanned) if ocr_fallback else 0,
+        'ocr_seconds': ocr_seconds,
+    }
+    if stats is not None:
+        stats.update(report)
+    logger.info(
+        f"📄 Read {report['pages_read']}/{page_count} PDF pages in {elapsed:.2f}s "
+        f"({report['seconds_per_page'] * 1000:.1f} ms/page)"
+    )
+
+    return " ".join(text for text in pages if text)
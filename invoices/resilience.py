@@ -0,0 +1,190 @@
+import time
+import random
+import logging
+import threading
+from .llm_backends import LLMBackend
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Provider errors worth retrying (matched by class name so google/grpc imports stay optional)
+TRANSIENT_ERROR_NAMES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'DeadlineExceeded',
+    'InternalServerError', 'GatewayTimeout', 'Aborted', 'TimeoutError', 'ConnectionError',
+}
+
+
+class LLMUnavailable(Exception):
+    """The circuit breaker is open or retries are exhausted; park the work and try again later."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds until the provider is worth trying again
+
+
+def is_transient(error):
+    """Whether `error` (or its cause) looks like a rate limit or temporary provider failure."""
+    while error is not None:
+        if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+            return True
+        if '429' in str(error) or 'rate limit' in str(error).lower():
+            return True
+        error = error.__cause__
+    return False
+
+
+class TokenBucket:
+    """Allows `rate_per_minute` acquisitions per minute with bursts of up to `burst`."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, int(rate_per_minute // 60) or 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and lets one probe through after `reset_timeout`.
+
+    A probe that reports nothing within `probe_timeout` (a hung call) is given up on,
+    and the next caller probes instead.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0, probe_timeout=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout or reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Returns 0 if a call may proceed, otherwise the seconds until the next probe."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return 0
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                if now - self.probe_started_at >= self.probe_timeout:
+                    self.probe_started_at = now  # The previous probe hung; let this call probe instead
+                    return 0
+                return max(self.probe_started_at + self.probe_timeout - now, 1.0)
+            remaining = self.reset_timeout - (now - self.opened_at)
+            if remaining <= 0:
+                self.state = self.HALF_OPEN
+                self.probe_started_at = now
+                return 0
+            return max(remaining, 1.0)
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"⚠️ LLM circuit breaker opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class GuardedBackend(LLMBackend):
+    """
+    Wraps an LLMBackend with a concurrency limit, a requests-per-minute token bucket,
+    jittered exponential backoff for transient errors and a circuit breaker.
+    """
+
+    def __init__(self, backend, max_concurrent=4, requests_per_minute=60, max_retries=4,
+                 backoff_base=1.0, backoff_max=30.0, failure_threshold=5, reset_timeout=60.0,
+                 probe_timeout=None):
+        self.backend = backend
+        self.name = backend.name
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, probe_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._metrics = {'waiting': 0, 'in_flight': 0, 'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def metrics(self):
+        """Queue depth, in-flight calls, retries and breaker state for this process."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+        snapshot['breaker_state'] = self.breaker.state
+        return snapshot
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def invoke(self, prompt):
+        for attempt in range(self.max_retries + 1):
+            retry_after = self.breaker.allow()
+            if retry_after:
+                self._count('rejected')
+                raise LLMUnavailable("LLM circuit breaker is open", retry_after)
+
+            self._count('waiting')
+            self.semaphore.acquire()
+            self._count('waiting', -1)
+            try:
+                if self.bucket:
+                    self.bucket.acquire()
+                self._count('in_flight')
+                self._count('calls')
+                try:
+                    response = self.backend.invoke(prompt)
+                finally:
+                    self._count('in_flight', -1)
+            except Exception as e:
+                if not is_transient(e):
+                    # The provider answered (bad request, safety block...): it is reachable, so this
+                    # must still close the breaker, or a half-open probe would never be resolved
+                    self.breaker.record_success()
+                    raise
+                self._count('failures')
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise LLMUnavailable(f"LLM unavailable after {attempt + 1} attempt(s): {e}",
+                                         self.breaker.reset_timeout) from e
+                self._count('retries')
+                delay = self._backoff(attempt)
+                logger.info(f"🔁 Transient LLM error ({e}); retrying in {delay:.1f}s")
+            else:
+                self.breaker.record_success()
+                return response
+            finally:
+                self.semaphore.release()
+
+            time.sleep(delay)
@@ -0,0 +1,146 @@
+import html
+import re
+import zlib
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Value
+from .models import Invoice, InvoiceText
+
+# ✅ Defaults for invoice text search (overridable via settings.SEARCH)
+SEARCH_DEFAULTS = {
+    'CONFIG': 'english',  # PostgreSQL text search configuration
+    'COMPRESS_THRESHOLD': 1024,  # Texts longer than this (bytes) are stored zlib-compressed
+    'MAX_INDEXED_CHARS': 200000,  # Text beyond this is stored but not indexed (tsvector is capped at 1 MB)
+    'SNIPPET_CHARS': 200,  # Length of the highlighted excerpt
+    'MAX_RESULTS': 100,
+}
+
+MIN_TRIGRAM_QUERY = 3  # Shorter queries can't use the trigram index
+
+TERM_PATTERN = re.compile(r'-?\w+')
+
+
+def search_setting(name):
+    """Returns a search setting, falling back to SEARCH_DEFAULTS."""
+    return getattr(settings, 'SEARCH', {}).get(name, SEARCH_DEFAULTS[name])
+
+
+def _full_text_supported():
+    return connection.vendor == 'postgresql'
+
+
+def pack_text(text):
+    """Returns (content, compressed) for InvoiceText; only one of them is filled."""
+    encoded = text.encode()
+    if len(encoded) <= search_setting('COMPRESS_THRESHOLD'):
+        return text, None
+    return '', zlib.compress(encoded, 6)
+
+
+def store_invoice_text(invoice, text):
+    """Saves (or replaces) the extracted text of an invoice and refreshes its search vector."""
+    content, compressed = pack_text(text)
+    defaults = {'user_id': invoice.user_id, 'content': content, 'compressed': compressed, 'char_count': len(text)}
+    if _full_text_supported():
+        # Computed by PostgreSQL in the same INSERT/UPDATE
+        indexed = Value(text[:search_setting('MAX_INDEXED_CHARS')])
+        defaults['search_vector'] = SearchVector(indexed, config=search_setting('CONFIG'))
+    InvoiceText.objects.update_or_create(invoice_id=invoice.pk, defaults=defaults)
+
+
+def query_terms(query):
+    """Words of a websearch-style query that should be highlighted (quotes, OR and -negations dropped)."""
+    return [term for term in TERM_PATTERN.findall(query) if not term.startswith('-') and term.lower() != 'or']
+
+
+def highlight(text, terms, length=None):
+    """HTML-escaped excerpt around the first matching term, with matches wrapped in <mark>."""
+    length = length or search_setting('SNIPPET_CHARS')
+    text = " ".join(text.split())
+    if not terms:
+        return html.escape(text[:length])
+
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(0, match.start() - length // 3) if match else 0
+    excerpt = text[start:start + length]
+
+    parts = []
+    position = 0
+    for hit in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[position:hit.start()]))
+        parts.append(f"<mark>{html.escape(hit.group(0))}</mark>")
+        position = hit.end()
+    parts.append(html.escape(excerpt[position:]))
+    return ("…" if start else "") + "".join(parts) + ("…" if start + length < len(text) else "")
+
+
+def _text_matches(user, query, limit):
+    """[(invoice_id, rank)] from the GIN-indexed search vectors, best first."""
+    texts = InvoiceText.objects.filter(user=user, invoice__is_deleted=False)
+    if not _full_text_supported():
+        return [(invoice_id, 0.0) for invoice_id in
+                texts.filter(content__icontains=query).values_list('invoice_id', flat=True)[:limit]]
+
+    search_query = SearchQuery(query, search_type='websearch', config=search_setting('CONFIG'))
+    return list(
+        texts.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', '-invoice_id')
+        .values_list('invoice_id', 'rank')[:limit]
+    )
+
+
+def _number_matches(user, query, limit):
+    """[(invoice_id, similarity)] for invoice numbers containing the query (trigram index)."""
+    if len(query) < MIN_TRIGRAM_QUERY:
+        return []
+    invoices = Invoice.objects.filter(user=user, is_deleted=False, invoice_number__icontains=query)
+    if not _full_text_supported():
+        return [(invoice_id, 1.0) for invoice_id in invoices.values_list('id', flat=True)[:limit]]
+    return list(
+        invoices.annotate(similarity=TrigramSimilarity('invoice_number', query))
+        .order_by('-similarity', '-id')
+        .values_list('id', 'similarity')[:limit]
+    )
+
+
+def search_invoices(user, query, limit=20):
+    """
+    Ranked search over the user's invoices: invoice number matches first, then
+    full-text matches on the extracted text.
+
+    Returns [{'invoice', 'rank', 'matched', 'highlight'}]. Both lookups are index
+    scans capped at `limit`, and only the returned page is decompressed to build
+    the highlighted excerpts.
+    """
+    query = query.strip()
+    limit = min(limit, search_setting('MAX_RESULTS'))
+
+    scores = {}
+    matched = {}
+    for invoice_id, similarity in _number_matches(user, query, limit):
+        scores[invoice_id] = 1.0 + similarity  # Ahead of any ts_rank score
+        matched[invoice_id] = ['invoice_number']
+    for invoice_id, rank in _text_matches(user, query, limit):
+        scores[invoice_id] = max(scores.get(invoice_id, 0.0), rank)
+        matched.setdefault(invoice_id, []).append('text')
+
+    ranked = sorted(scores, key=lambda invoice_id: (-scores[invoice_id], -invoice_id))[:limit]
+    invoices = Invoice.objects.in_bulk(ranked)
+    texts = InvoiceText.objects.filter(invoice_id__in=ranked).only('invoice_id', 'content', 'compressed').in_bulk()
+
+    terms = query_terms(query)
+    results = []
+    for invoice_id in ranked:
+        if invoice_id not in invoices:
+            continue  # Deleted since the index lookup
+        entry = texts.get(invoice_id)
+        results.append({
+            'invoice': invoices[invoice_id],
+            'rank': round(scores[invoice_id], 6),
+            'matched': matched[invoice_id],
+            'highlight': highlight(entry.text, terms) if entry is not None else None,
+        })
+    return results
@@ -1,6 +1,8 @@
+import hashlib
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Invoice
+from .uploads import file_type_from_name, max_file_size, size_error
 from django.core.exceptions import ValidationError
 
 # ✅ User Serializer
@@ -28,9 +30,29 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         """Create user with hashed password."""
         return User.objects.create_user(**validated_data)
 
+# Types an invoice can be stored as; archives are only unpacked by the bulk endpoint
+INVOICE_FILE_TYPES = {file_type for file_type, _ in Invoice.FILE_TYPES if file_type != 'unknown'}
+
+def absolute_url(context, url):
+    """Makes a URL absolute, resolving (and validating) the request host once per serializer context."""
+    request = context.get('request')
+    if not request or not url.startswith('/'):
+        return url
+    if '_host_prefix' not in context:
+        context['_host_prefix'] = request.build_absolute_uri('/')[:-1]
+    return context['_host_prefix'] + url
+
+# ✅ File field whose URL reuses the cached host prefix
+class InvoiceFileField(serializers.FileField):
+    def to_representation(self, value):
+        if not value:
+            return None
+        return absolute_url(self.context, value.url)
+
 # ✅ Invoice Serializer
 class InvoiceSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)  # Prevent user from being modified
+    user = serializers.SerializerMethodField()  # Read-only; same shape as UserSerializer
+    file = InvoiceFileField()
     file_url = serializers.SerializerMethodField()
     file_size = serializers.SerializerMethodField()
     file_type = serializers.CharField(read_only=True)
@@ -40,32 +62,62 @@ class InvoiceSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'user', 'file', 'file_url', 'file_size', 'file_type', 'uploaded_at', 
             'invoice_date', 'invoice_number', 'amount', 'due_date',
-            'status', 'error_message'
+            'status', 'error_message', 'duplicate_of', 'duplicate_score'
         )
         read_only_fields = (
             'id', 'user', 'uploaded_at', 'invoice_date', 'invoice_number', 
-            'amount', 'due_date', 'status', 'error_message', 'file_type'
+            'amount', 'due_date', 'status', 'error_message', 'file_type',
+            'duplicate_of', 'duplicate_score'
         )
 
+    def get_user(self, obj):
+        """Serialize the owner once per response (list rows all belong to the requesting user)."""
+        users = self.context.setdefault('_users', {})
+        if obj.user_id not in users:
+            request = self.context.get('request')
+            user = request.user if request and request.user.pk == obj.user_id else obj.user
+            users[obj.user_id] = UserSerializer(user).data
+        return users[obj.user_id]
+
     def get_file_url(self, obj):
         """Generate full file URL."""
         request = self.context.get('request')
-        return request.build_absolute_uri(obj.file.url) if obj.file and request else None
+        return absolute_url(self.context, obj.file.url) if obj.file and request else None
 
     def get_file_size(self, obj):
-        """Return file size in KB."""
+        """Return file size in KB (stored at upload; older rows fall back to a storage stat)."""
+        if obj.file_size is not None:
+            return obj.file_size // 1024
         return obj.file.size // 1024 if obj.file else None
 
     def validate_file(self, file):
-        """Ensure file is not too large (limit: 10MB)."""
-        if file.size > 10 * 1024 * 1024:  # 10MB limit
-            raise ValidationError("File size must be 10MB or smaller.")
+        """Ensure file is not too large (10MB, 50MB for audio) and is a supported type."""
+        file_type = getattr(file, 'detected_type', None) or file_type_from_name(file.name)
+        if file.size > max_file_size(file_type):
+            raise ValidationError(size_error(file_type))
+        if file_type == 'archive':
+            raise ValidationError("ZIP archives must be uploaded to the bulk endpoint.")
+        if file_type not in INVOICE_FILE_TYPES:
+            raise ValidationError("Unsupported file type.")
         return file
 
     def create(self, validated_data):
-        """Auto-assign user from request."""
+        """Auto-assign user from request and fingerprint the file content."""
         request = self.context.get('request')
         if request and hasattr(request, "user"):
             validated_data["user"] = request.user
+
+        file = validated_data.get('file')
+        if file:
+            # InvoiceUploadHandler hashes and sniffs while streaming; other upload paths fall back here
+            validated_data['file_type'] = getattr(file, 'detected_type', None) or file_type_from_name(file.name)
+            validated_data['file_size'] = file.size
+            validated_data['file_hash'] = getattr(file, 'sha256', None)
+            if not validated_data['file_hash']:
+                digest = hashlib.sha256()
+                for chunk in file.chunks():
+                    digest.update(chunk)
+                validated_data['file_hash'] = digest.hexdigest()
+
         return super().create(validated_data)
 
@@ -0,0 +1,65 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from .analytics import TRACKED_FIELDS, apply_change, bump_versions, snapshot
+from .authentication import invalidate_user
+from .conditional import forget_invoices
+from .events import record_status_event
+from .models import Invoice
+
+
+@receiver(post_init, sender=Invoice)
+def remember_tracked_fields(sender, instance, **kwargs):
+    """Keeps the loaded values so post_save can compute the delta without another query."""
+    deferred = instance.get_deferred_fields()
+    if instance.pk is None or any(field in deferred for field in TRACKED_FIELDS):
+        instance._stats_snapshot = None
+    else:
+        instance._stats_snapshot = snapshot(instance)
+
+
+@receiver(pre_save, sender=Invoice)
+def load_previous_state(sender, instance, **kwargs):
+    # Instances loaded with only()/defer() or built by hand: read the stored row instead
+    if instance.pk is not None and getattr(instance, '_stats_snapshot', None) is None:
+        instance._stats_snapshot = Invoice.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=Invoice)
+def track_invoice_changes(sender, instance, created, raw=False, **kwargs):
+    """Updates the per-user summaries and read caches, and logs status transitions for the event stream."""
+    if raw:
+        return  # Fixture loading; run rebuild_invoice_stats afterwards
+    previous = None if created else getattr(instance, '_stats_snapshot', None)
+    current = snapshot(instance)
+    apply_change(previous, current)
+    bump_versions([instance.user_id])
+    if not created:
+        forget_invoices([instance.pk])
+    if previous is not None and previous['status'] != current['status']:
+        record_status_event(instance)
+    instance._stats_snapshot = current
+
+
+@receiver(post_delete, sender=Invoice)
+def remove_from_invoice_stats(sender, instance, origin=None, **kwargs):
+    # Deleting the owner cascades to their summary rows as well
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Invoice:
+        return
+    apply_change(getattr(instance, '_stats_snapshot', None) or snapshot(instance), None)
+    bump_versions([instance.user_id])
+    forget_invoices([instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Profile edits, password changes and deactivation must not be served from the auth cache."""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def refresh_invoice_reads(sender, instance, created, raw=False, **kwargs):
+    """Invoice payloads embed the owner's username and email, so their ETags must move on profile edits."""
+    if not created and not raw:
+        bump_versions([instance.pk])
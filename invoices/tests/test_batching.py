@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+from django.test import SimpleTestCase
+from invoices.batching import BATCH_ID_PATTERN, BatchSliceError, LLMBatcher
+from invoices.llm_backends import LLMBackend
+from invoices.llm_service import InvoiceExtractor
+from invoices.resilience import LLMUnavailable
+
+FIELDS = {'invoice_date': '2024-05-01', 'invoice_number': 'INV-42', 'amount': '12.50', 'due_date': '2024-05-31'}
+
+
+class RecordingBackend(LLMBackend):
+    """Answers every prompt, leaving out the invoice ids in `skip`, and keeps the prompts it saw."""
+
+    name = 'recording'
+
+    def __init__(self, skip=(), error=None):
+        self.skip = set(skip)
+        self.error = error
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.error is not None:
+            raise self.error
+        keys = BATCH_ID_PATTERN.findall(prompt)
+        if keys:
+            return json.dumps({key: FIELDS for key in keys if key not in self.skip})
+        return json.dumps(FIELDS)
+
+
+class FailingBatcher:
+    """A batcher whose every slice comes back unusable."""
+
+    def submit(self, text):
+        future = Future()
+        future.set_exception(BatchSliceError("no usable result"))
+        return future
+
+
+class LLMBatcherTests(SimpleTestCase):
+    def submit_pair(self, backend):
+        # A frozen clock keeps the first request from going out alone before the second is queued
+        with mock.patch('invoices.batching.time.monotonic', return_value=1.0):
+            batcher = LLMBatcher(backend, max_invoices=2, flush_interval=5.0)
+            futures = [batcher.submit("first invoice"), batcher.submit("second invoice")]
+            futures[0].exception(timeout=5)
+        return batcher, futures
+
+    def test_members_share_one_call(self):
+        backend = RecordingBackend()
+        batcher, futures = self.submit_pair(backend)
+
+        self.assertEqual([future.result(timeout=5) for future in futures], [FIELDS, FIELDS])
+        self.assertEqual(len(backend.prompts), 1)
+        self.assertEqual(batcher.stats()['batched_invoices'], 2)
+
+    def test_missing_slice_fails_only_its_member(self):
+        backend = RecordingBackend(skip={'2'})
+        batcher, (first, second) = self.submit_pair(backend)
+
+        self.assertEqual(first.result(timeout=5), FIELDS)
+        with self.assertRaises(BatchSliceError):
+            second.result(timeout=5)
+        self.assertEqual(batcher.stats()['fallbacks'], 1)
+
+    def test_unparseable_batch_falls_back_for_every_member(self):
+        backend = RecordingBackend(error=ValueError("not JSON"))
+        batcher, futures = self.submit_pair(backend)
+
+        for future in futures:
+            with self.assertRaises(BatchSliceError):
+                future.result(timeout=5)
+        self.assertEqual(batcher.stats()['fallbacks'], 2)
+
+    def test_llm_unavailable_fails_every_member(self):
+        backend = RecordingBackend(error=LLMUnavailable("breaker open", 30))
+        _, futures = self.submit_pair(backend)
+
+        for future in futures:
+            with self.assertRaises(LLMUnavailable):
+                future.result(timeout=5)
+
+    def test_lone_request_is_not_batched(self):
+        backend = RecordingBackend()
+        batcher = LLMBatcher(backend, flush_interval=5.0)
+
+        with self.assertRaises(BatchSliceError):
+            batcher.submit("only invoice").result(timeout=5)
+        self.assertEqual(backend.prompts, [])
+
+
+class BatchFallbackTests(SimpleTestCase):
+    def test_unusable_slice_is_extracted_with_a_single_call(self):
+        backend = RecordingBackend()
+        extractor = InvoiceExtractor(backend=backend, batcher=FailingBatcher())
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as file:
+            file.write("Thank you for your order. Delivery of office supplies to the third floor.")
+        self.addCleanup(os.remove, file.name)
+
+        result = extractor.extract_invoice_data(file.name)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['invoice_number'], 'INV-42')
+        self.assertEqual(len(backend.prompts), 1)
+        self.assertEqual(BATCH_ID_PATTERN.findall(backend.prompts[0]), [])
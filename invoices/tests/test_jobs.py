@@ -0,0 +1,76 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from invoices.jobs import claim_invoices, renew_leases, save_claimed
+from invoices.models import Invoice, InvoiceStats
+
+
+class ClaimInvoicesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='queue-tests', password='queue-tests-password')
+
+    def make_invoice(self, **fields):
+        return Invoice.objects.create(user=self.user, file='invoices/test.pdf', file_type='pdf', **fields)
+
+    def test_claimed_invoice_is_not_claimed_twice(self):
+        first = self.make_invoice()
+        second = self.make_invoice()
+
+        self.assertCountEqual(claim_invoices(10, visibility_timeout=60), [first.pk, second.pk])
+        self.assertEqual(claim_invoices(10, visibility_timeout=60), [])
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'processing')
+        self.assertEqual(first.processing_attempts, 1)
+        stats = InvoiceStats.objects.get(user=self.user)
+        self.assertEqual((stats.pending_count, stats.processing_count), (0, 2))
+
+    def test_claims_respect_the_limit(self):
+        for _ in range(3):
+            self.make_invoice()
+
+        self.assertEqual(len(claim_invoices(2, visibility_timeout=60)), 2)
+        self.assertEqual(len(claim_invoices(2, visibility_timeout=60)), 1)
+
+    def test_expired_lease_is_reclaimed(self):
+        stale = self.make_invoice(status='processing', processing_attempts=1,
+                                  processing_started_at=timezone.now() - timedelta(minutes=10))
+        live = self.make_invoice(status='processing', processing_attempts=1,
+                                 processing_started_at=timezone.now())
+
+        self.assertEqual(claim_invoices(10, visibility_timeout=60), [stale.pk])
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'processing')
+        self.assertEqual(stale.processing_attempts, 2)
+        self.assertGreater(stale.processing_started_at, timezone.now() - timedelta(minutes=1))
+        live.refresh_from_db()
+        self.assertEqual(live.processing_attempts, 1)
+
+    def test_renewed_lease_is_not_reclaimed(self):
+        invoice = self.make_invoice(status='processing', processing_started_at=timezone.now() - timedelta(minutes=10))
+
+        renew_leases([invoice.pk])
+
+        self.assertEqual(claim_invoices(10, visibility_timeout=60), [])
+
+    def test_parked_and_deleted_invoices_are_skipped(self):
+        self.make_invoice(next_attempt_at=timezone.now() + timedelta(minutes=5))
+        deleted = self.make_invoice()
+        deleted.delete()
+
+        self.assertEqual(claim_invoices(10, visibility_timeout=60), [])
+
+    def test_result_is_not_written_to_a_row_deleted_meanwhile(self):
+        invoice = self.make_invoice()
+        claim_invoices(1, visibility_timeout=60)
+        claimed = Invoice.objects.get(pk=invoice.pk)
+        Invoice.objects.get(pk=invoice.pk).delete()
+
+        claimed.status = 'completed'
+        self.assertFalse(save_claimed(claimed, ['status']))
+
+        invoice.refresh_from_db()
+        self.assertTrue(invoice.is_deleted)
+        self.assertEqual(InvoiceStats.objects.get(user=self.user).invoice_count, 0)
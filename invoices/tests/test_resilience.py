@@ -0,0 +1,139 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from invoices.llm_backends import LLMBackend
+from invoices.resilience import CircuitBreaker, GuardedBackend, LLMUnavailable
+
+
+class FakeClock:
+    """Stands in for time.monotonic() so breaker timeouts can be stepped through."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class ServiceUnavailable(Exception):
+    """Matched by name, like the provider's own transient errors."""
+
+
+class FlakyBackend(LLMBackend):
+    """Raises the queued errors in order, then answers."""
+
+    name = 'flaky'
+
+    def __init__(self, errors=(), response='{}'):
+        self.errors = list(errors)
+        self.response = response
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.response
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('invoices.resilience.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+
+    def test_opens_after_threshold_then_half_opens_and_closes(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertGreater(self.breaker.allow(), 0)
+
+        self.clock.advance(10.0)
+        self.assertEqual(self.breaker.allow(), 0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertGreater(self.breaker.allow(), 0)  # Only one probe at a time
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.allow(), 0)
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.advance(10.0)
+        self.assertEqual(self.breaker.allow(), 0)
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertGreater(self.breaker.allow(), 0)
+
+    def test_hung_probe_is_handed_to_the_next_caller(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.advance(10.0)
+        self.assertEqual(self.breaker.allow(), 0)
+
+        self.clock.advance(10.0)  # probe_timeout defaults to reset_timeout
+        self.assertEqual(self.breaker.allow(), 0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+class GuardedBackendTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('invoices.resilience.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def guard(self, backend, **kwargs):
+        options = {'requests_per_minute': 0, 'max_retries': 2, 'failure_threshold': 10, 'reset_timeout': 30.0}
+        options.update(kwargs)
+        return GuardedBackend(backend, **options)
+
+    def test_retries_transient_errors_then_succeeds(self):
+        backend = FlakyBackend([ServiceUnavailable('busy')], response='ok')
+        guarded = self.guard(backend)
+
+        self.assertEqual(guarded.invoke('prompt'), 'ok')
+        self.assertEqual(backend.calls, 2)
+        self.assertEqual(guarded.metrics()['retries'], 1)
+
+    def test_backoff_gives_up_with_llm_unavailable(self):
+        backend = FlakyBackend([ServiceUnavailable('busy')] * 3)
+        guarded = self.guard(backend)
+
+        with self.assertRaises(LLMUnavailable) as raised:
+            guarded.invoke('prompt')
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(raised.exception.retry_after, 30.0)
+
+    def test_rate_limit_message_counts_as_transient(self):
+        backend = FlakyBackend([RuntimeError('429 Too Many Requests')], response='ok')
+
+        self.assertEqual(self.guard(backend).invoke('prompt'), 'ok')
+
+    def test_non_transient_error_is_raised_without_retry(self):
+        backend = FlakyBackend([ValueError('bad request')])
+        guarded = self.guard(backend)
+
+        with self.assertRaises(ValueError):
+            guarded.invoke('prompt')
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(guarded.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_open_breaker_rejects_without_calling_the_backend(self):
+        backend = FlakyBackend([ServiceUnavailable('busy')] * 3)
+        guarded = self.guard(backend, max_retries=0, failure_threshold=1)
+
+        with self.assertRaises(LLMUnavailable):
+            guarded.invoke('prompt')
+        with self.assertRaises(LLMUnavailable) as raised:
+            guarded.invoke('prompt')
+        self.assertEqual(backend.calls, 1)
+        self.assertGreater(raised.exception.retry_after, 0)
+        self.assertEqual(guarded.metrics()['rejected'], 1)
@@ -0,0 +1,272 @@
+import ipaddress
+import logging
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000  # Whisper's input rate
+
+# ✅ Defaults for audio transcription (overridable via settings.TRANSCRIPTION)
+TRANSCRIPTION_DEFAULTS = {
+    'WORKER_ADDRESS': None,  # 'host:port' of run_transcription_worker; None transcribes in-process
+    'AUTHKEY': None,  # Shared secret of the worker and its clients; required when WORKER_ADDRESS is set
+    'CHUNK_SECONDS': 30,  # Whisper's context window
+    'SPLIT_SEARCH_SECONDS': 2.0,  # Window before each chunk boundary searched for the quietest cut point
+    'BATCH_SIZE': 8,  # Chunks decoded per forward pass
+    'LANGUAGE': 'en',
+    'TIMEOUT': 900,  # Seconds a client waits for the worker
+    'RETRY_AFTER': 60,  # Seconds an invoice is parked when the worker is unreachable
+}
+
+
+def transcription_setting(name):
+    """Returns a transcription setting, falling back to TRANSCRIPTION_DEFAULTS."""
+    return getattr(settings, 'TRANSCRIPTION', {}).get(name, TRANSCRIPTION_DEFAULTS[name])
+
+
+class TranscriptionUnavailable(Exception):
+    """The transcription worker could not be reached; the invoice should be retried later."""
+
+
+def _parse_address(address):
+    host, _, port = address.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+def is_loopback_address(address):
+    """True if a 'host:port' address only accepts connections from this machine."""
+    host = _parse_address(address)[0].strip('[]')
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # A host name may resolve to any interface
+
+
+def _authkey():
+    # The connection unpickles what it receives, so it must never be keyed by a guessable or shared secret
+    authkey = transcription_setting('AUTHKEY')
+    if not authkey:
+        raise ImproperlyConfigured("Set TRANSCRIPTION_AUTHKEY to use a transcription worker.")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def load_audio(file_path):
+    """Decodes any ffmpeg-readable file to mono 16 kHz float32 samples."""
+    import whisper
+
+    return whisper.load_audio(file_path, sr=SAMPLE_RATE)
+
+
+def split_audio(audio, chunk_seconds=None, search_seconds=None):
+    """
+    Splits samples into chunks of at most `chunk_seconds`.
+
+    Each cut is moved to the quietest 100 ms frame in the last `search_seconds` of
+    the chunk, so words are rarely split across two chunks.
+    """
+    import numpy as np
+
+    chunk_size = int((chunk_seconds or transcription_setting('CHUNK_SECONDS')) * SAMPLE_RATE)
+    search_size = int((search_seconds or transcription_setting('SPLIT_SEARCH_SECONDS')) * SAMPLE_RATE)
+    frame = SAMPLE_RATE // 10
+
+    chunks = []
+    start = 0
+    while len(audio) - start > chunk_size:
+        window = audio[start + chunk_size - search_size:start + chunk_size]
+        frames = len(window) // frame
+        if frames:
+            energy = np.sqrt(np.mean(window[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+            cut = start + chunk_size - search_size + int(np.argmin(energy)) * frame + frame // 2
+        else:
+            cut = start + chunk_size
+        chunks.append(audio[start:cut])
+        start = cut
+    if len(audio) > start:
+        chunks.append(audio[start:])
+    return chunks
+
+
+def decode_chunks(model, chunks, batch_size=None):
+    """Transcribes ≤30 s chunks in batches of `batch_size` (one forward pass per batch)."""
+    import torch
+    import whisper
+
+    batch_size = batch_size or transcription_setting('BATCH_SIZE')
+    options = whisper.DecodingOptions(
+        language=transcription_setting('LANGUAGE'),
+        without_timestamps=True,
+        fp16=model.device.type == 'cuda',
+    )
+    texts = []
+    for start in range(0, len(chunks), batch_size):
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(chunk), n_mels=model.dims.n_mels)
+            for chunk in chunks[start:start + batch_size]
+        ]).to(model.device)
+        with torch.no_grad():
+            results = whisper.decode(model, mels, options)
+        texts.extend(result.text.strip() for result in results)
+    return texts
+
+
+def _report(audio_seconds, chunk_count, transcribe_seconds):
+    return {
+        'audio_seconds': audio_seconds,
+        'chunks': chunk_count,
+        'transcribe_seconds': transcribe_seconds,
+        # < 1.0 means faster than real time
+        'real_time_factor': transcribe_seconds / audio_seconds if audio_seconds else 0.0,
+    }
+
+
+def transcribe_locally(file_path):
+    """Transcribes in this process with ml.get_whisper_model() (development / single-process setups)."""
+    from .ml import get_whisper_model
+
+    audio = load_audio(file_path)
+    chunks = split_audio(audio)
+    started = time.perf_counter()
+    texts = decode_chunks(get_whisper_model(), chunks)
+    return " ".join(text for text in texts if text), _report(len(audio) / SAMPLE_RATE, len(chunks),
+                                                             time.perf_counter() - started)
+
+
+def transcribe_audio(file_path):
+    """
+    Returns (transcript, stats) for an audio invoice.
+
+    With TRANSCRIPTION['WORKER_ADDRESS'] set, the file path is sent to the shared
+    transcription worker, so the Whisper model is loaded once per host rather than
+    once per web/extraction worker. Raises TranscriptionUnavailable if it can't be reached.
+    """
+    address = transcription_setting('WORKER_ADDRESS')
+    if not address:
+        return transcribe_locally(file_path)
+
+    try:
+        with Client(_parse_address(address), authkey=_authkey()) as connection:
+            connection.send({'path': file_path})
+            if not connection.poll(transcription_setting('TIMEOUT')):
+                raise TranscriptionUnavailable("Timed out waiting for the transcription worker")
+            response = connection.recv()
+    except (OSError, EOFError) as e:
+        raise TranscriptionUnavailable(f"Transcription worker unreachable: {e}") from e
+
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response['text'], response['stats']
+
+
+class _Job:
+    __slots__ = ('path', 'audio_seconds', 'chunks', 'texts', 'response', 'done', 'queued_at')
+
+    def __init__(self, path, audio):
+        self.path = path
+        self.audio_seconds = len(audio) / SAMPLE_RATE
+        self.chunks = split_audio(audio)
+        self.texts = [None] * len(self.chunks)
+        self.response = None
+        self.done = threading.Event()
+        self.queued_at = time.perf_counter()
+
+
+class TranscriptionServer:
+    """
+    Owns the only Whisper model on the host and serves transcription requests.
+
+    Connections are handled on their own threads (audio decoding runs there, in
+    parallel), while a single model thread drains the job queue and decodes the
+    chunks of every waiting recording together in batches of BATCH_SIZE.
+    """
+
+    def __init__(self, address, model, batch_size=None):
+        self.address = _parse_address(address)
+        self.model = model
+        self.batch_size = batch_size or transcription_setting('BATCH_SIZE')
+        self.jobs = queue.Queue()
+        self.listener = None
+
+    def serve_forever(self):
+        self.listener = Listener(self.address, authkey=_authkey())
+        threading.Thread(target=self._model_loop, name='whisper', daemon=True).start()
+        logger.info(f"🎙️ Transcription worker listening on {self.address[0]}:{self.address[1]}")
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                if self.listener is None:
+                    return  # close() was called
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Rejected transcription client: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+
+    def _handle(self, connection):
+        with connection:
+            try:
+                request = connection.recv()
+            except EOFError:
+                return
+            try:
+                job = _Job(request['path'], load_audio(request['path']))
+            except Exception as e:
+                logger.error(f"❌ Error loading audio {request.get('path')}: {e}")
+                connection.send({'error': f"Could not decode audio: {e}"})
+                return
+            self.jobs.put(job)
+            job.done.wait()
+            try:
+                connection.send(job.response)
+            except OSError:
+                pass  # Client gave up
+
+    def _model_loop(self):
+        while True:
+            jobs = [self.jobs.get()]
+            while True:
+                try:
+                    jobs.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            pieces = [(job, index, chunk) for job in jobs for index, chunk in enumerate(job.chunks)]
+            started = time.perf_counter()
+            try:
+                texts = decode_chunks(self.model, [chunk for _, _, chunk in pieces], self.batch_size)
+            except Exception as e:
+                logger.error(f"❌ Error transcribing {len(jobs)} recording(s): {e}")
+                for job in jobs:
+                    job.response = {'error': f"Transcription failed: {e}"}
+                    job.done.set()
+                continue
+
+            for (job, index, _), text in zip(pieces, texts):
+                job.texts[index] = text
+            elapsed = time.perf_counter() - started
+            total_audio = sum(job.audio_seconds for job in jobs)
+            for job in jobs:
+                # Batch time is shared out by audio length
+                share = elapsed * job.audio_seconds / total_audio if total_audio else 0.0
+                stats = _report(job.audio_seconds, len(job.chunks), share)
+                stats['queue_seconds'] = started - job.queued_at
+                job.response = {'text': " ".join(text for text in job.texts if text), 'stats': stats}
+                job.done.set()
+            logger.info(
+                f"🎙️ Transcribed {len(jobs)} recording(s), {total_audio:.0f}s of audio in {elapsed:.1f}s "
+                f"(real-time factor {elapsed / total_audio if total_audio else 0:.3f})"
+            )
@@ -0,0 +1,325 @@
+import os
+import hashlib
+import logging
+import tempfile
+import zipfile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from .models import Invoice
+from .analytics import record_created
+
+try:
+    import magic
+except ImportError:  # libmagic missing; fall back to SIGNATURES
+    magic = None
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# ✅ Upload limits shared by single and bulk uploads
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB per invoice
+MAX_AUDIO_FILE_SIZE = 50 * 1024 * 1024  # Recorded calls run longer than scans
+
+EXTENSION_FILE_TYPES = {
+    '.pdf': 'pdf',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.png': 'image',
+    '.tiff': 'image',
+    '.tif': 'image',
+    '.bmp': 'image',
+    '.txt': 'text',
+    '.mp3': 'audio',
+    '.wav': 'audio',
+    '.m4a': 'audio',
+    '.ogg': 'audio',
+    '.flac': 'audio',
+}
+
+
+# Magic-byte signatures used when python-magic/libmagic is unavailable
+SIGNATURES = (
+    (b'%PDF', 'pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image'),
+    (b'\xff\xd8\xff', 'image'),
+    (b'II*\x00', 'image'),
+    (b'MM\x00*', 'image'),
+    (b'BM', 'image'),
+    (b'PK\x03\x04', 'archive'),
+    (b'ID3', 'audio'),
+    (b'\xff\xfb', 'audio'),
+    (b'\xff\xf3', 'audio'),
+    (b'\xff\xf2', 'audio'),
+    (b'OggS', 'audio'),
+    (b'fLaC', 'audio'),
+)
+
+SNIFF_BYTES = 2048
+
+
+def upload_setting(name, default):
+    """Returns a bulk upload setting from settings.BULK_UPLOAD."""
+    return getattr(settings, 'BULK_UPLOAD', {}).get(name, default)
+
+
+def max_file_size(file_type):
+    """Upload size limit in bytes for an Invoice.FILE_TYPES key."""
+    return MAX_AUDIO_FILE_SIZE if file_type == 'audio' else MAX_FILE_SIZE
+
+
+def size_error(file_type):
+    return f"File size must be {max_file_size(file_type) // (1024 * 1024)}MB or smaller."
+
+
+def file_type_from_name(name):
+    """Maps a file name to an Invoice.FILE_TYPES key ('unknown' if unsupported)."""
+    return EXTENSION_FILE_TYPES.get(os.path.splitext(name)[1].lower(), 'unknown')
+
+
+def file_type_from_mime(mime_type):
+    """Maps a MIME type to an Invoice.FILE_TYPES key, 'archive' for ZIPs, or 'unknown'."""
+    if mime_type == 'application/pdf':
+        return 'pdf'
+    if mime_type.startswith('image/'):
+        return 'image'
+    if mime_type.startswith('text/'):
+        return 'text'
+    if mime_type.startswith('audio/'):
+        return 'audio'
+    if mime_type in ('application/zip', 'application/x-zip-compressed'):
+        return 'archive'
+    return 'unknown'
+
+
+def sniff_file_type(head, name=''):
+    """Detects the file type from the first bytes of a file, falling back to its extension for text."""
+    if magic is not None:
+        file_type = file_type_from_mime(magic.from_buffer(head[:SNIFF_BYTES], mime=True))
+    else:
+        file_type = next((kind for signature, kind in SIGNATURES if head.startswith(signature)), 'unknown')
+        # Containers whose magic isn't at offset 0: RIFF/WAVE and MP4 audio (.m4a)
+        if file_type == 'unknown' and ((head[:4] == b'RIFF' and head[8:12] == b'WAVE') or head[4:8] == b'ftyp'):
+            file_type = 'audio'
+        if file_type == 'unknown' and file_type_from_name(name) == 'text' and b'\x00' not in head[:SNIFF_BYTES]:
+            file_type = 'text'
+    return file_type
+
+
+class HashingReader:
+    """File-like wrapper that computes SHA-256 and the byte count of everything read through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''  # First bytes, kept for type sniffing
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.digest.update(data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+class InvoiceUploadedFile(UploadedFile):
+    """Uploaded file spooled by InvoiceUploadHandler, with its SHA-256 and sniffed type."""
+
+    def __init__(self, file, name, content_type, size, charset, content_type_extra, sha256, detected_type):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+        self.detected_type = detected_type
+
+
+class InvoiceUploadHandler(FileUploadHandler):
+    """
+    Streams uploads into a spooled temp file while enforcing limits chunk by chunk.
+
+    The first chunk is sniffed for its real type, oversized or unsupported files are
+    skipped as soon as that is known, and the SHA-256 is computed as data arrives.
+    Skipped files are listed in `rejected` (see rejected_uploads()).
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.rejected = []
+        self.request_too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Nothing can be accepted from a body bigger than the largest allowed request
+        max_request_size = upload_setting('MAX_REQUEST_SIZE', 512 * 1024 * 1024)
+        self.request_too_large = bool(content_length) and content_length > max_request_size
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.request_too_large:
+            self.rejected.append(_reject(self.file_name, "Request body is too large."))
+            raise StopUpload(connection_reset=True)
+
+        self.is_archive = self.file_name.lower().endswith('.zip')
+        if self.is_archive:
+            self.max_size = upload_setting('MAX_ARCHIVE_SIZE', 256 * 1024 * 1024)
+        else:
+            self.max_size = max_file_size(file_type_from_name(self.file_name))
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.detected_type = None
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+            dir=settings.FILE_UPLOAD_TEMP_DIR,
+        )
+
+    def _skip(self, error):
+        self.rejected.append(_reject(self.file_name, error))
+        self.file.close()
+        raise SkipFile(error)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.detected_type = sniff_file_type(raw_data, self.file_name)
+            expected = 'archive' if self.is_archive else file_type_from_name(self.file_name)
+            if self.detected_type == 'unknown' or self.detected_type != expected:
+                self._skip("Unsupported file type.")
+
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self._skip("Archive is too large." if self.is_archive else size_error(file_type_from_name(self.file_name)))
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        return InvoiceUploadedFile(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+            sha256=self.digest.hexdigest(),
+            detected_type=self.detected_type,
+        )
+
+
+def rejected_uploads(request):
+    """Files the InvoiceUploadHandler skipped while parsing `request`."""
+    rejected = []
+    for handler in getattr(request, 'upload_handlers', []):
+        rejected.extend(getattr(handler, 'rejected', []))
+    return rejected
+
+
+def _reject(name, error):
+    return {'name': name, 'error': error}
+
+
+def iter_zip_members(uploaded_zip):
+    """
+    Yields (name, stream, size, error) for each file in a ZIP upload.
+
+    Members are decompressed lazily one at a time, so the archive is never held in
+    memory. Sizes come from the central directory, so oversized members and
+    unsupported types are rejected before any bytes are inflated.
+    """
+    max_total = upload_setting('MAX_ARCHIVE_UNCOMPRESSED', 1024 * 1024 * 1024)
+    total = 0
+    with zipfile.ZipFile(uploaded_zip) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            file_type = file_type_from_name(name)
+            if file_type == 'unknown':
+                yield name, None, info.file_size, "Unsupported file type."
+                continue
+            if info.file_size > max_file_size(file_type):
+                yield name, None, info.file_size, size_error(file_type)
+                continue
+            total += info.file_size
+            if total > max_total:
+                yield name, None, info.file_size, "Archive exceeds the uncompressed size limit."
+                continue
+            with archive.open(info) as stream:
+                yield name, stream, info.file_size, None
+
+
+def iter_upload_files(files):
+    """Flattens uploaded files and ZIP archives into (name, stream, size, error) tuples."""
+    for uploaded in files:
+        if uploaded.name.lower().endswith('.zip'):
+            try:
+                yield from iter_zip_members(uploaded)
+            except zipfile.BadZipFile:
+                yield uploaded.name, None, uploaded.size, "Invalid ZIP archive."
+            continue
+
+        file_type = file_type_from_name(uploaded.name)
+        if file_type == 'unknown':
+            yield uploaded.name, None, uploaded.size, "Unsupported file type."
+        elif uploaded.size > max_file_size(file_type):
+            yield uploaded.name, None, uploaded.size, size_error(file_type)
+        else:
+            yield uploaded.name, uploaded, uploaded.size, None
+
+
+def ingest_files(user, files):
+    """
+    Stores every accepted file and creates their invoices with one bulk_create.
+
+    Invoices are created as `pending`, so the extraction workers pick them up.
+    Returns (accepted, rejected): lists of {'name', 'id'} and {'name', 'error'} dicts.
+    """
+    max_files = upload_setting('MAX_FILES', 500)
+    upload_to = Invoice._meta.get_field('file').upload_to
+
+    names = []
+    invoices = []
+    rejected = []
+    for name, stream, size, error in iter_upload_files(files):
+        if error:
+            rejected.append(_reject(name, error))
+            continue
+        if len(invoices) >= max_files:
+            rejected.append(_reject(name, f"Too many files; at most {max_files} per request."))
+            continue
+
+        try:
+            reader = HashingReader(stream)
+            stored_name = default_storage.save(os.path.join(upload_to, name), File(reader, name=name))
+        except Exception as e:
+            logger.error(f"❌ Error storing bulk upload {name}: {e}")
+            rejected.append(_reject(name, "Could not store file."))
+            continue
+
+        # Direct uploads were sniffed by InvoiceUploadHandler; archive members are sniffed here
+        file_type = getattr(stream, 'detected_type', None) or sniff_file_type(reader.head, name)
+        if file_type != file_type_from_name(name):
+            default_storage.delete(stored_name)
+            rejected.append(_reject(name, "Unsupported file type."))
+            continue
+
+        names.append(name)
+        invoices.append(Invoice(
+            user=user,
+            file=stored_name,
+            file_type=file_type,
+            file_hash=reader.hexdigest(),
+            file_size=reader.size,
+            status='pending',
+        ))
+
+    if invoices:
+        invoices = Invoice.objects.bulk_create(invoices, batch_size=upload_setting('BULK_CREATE_BATCH_SIZE', 100))
+        record_created(invoices)  # bulk_create skips save() signals
+    accepted = [{'name': name, 'id': invoice.id} for name, invoice in zip(names, invoices)]
+    return accepted, rejected
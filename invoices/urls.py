@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import InvoiceViewSet, UserRegistrationView, UserProfileView
+from .views import InvoiceViewSet, UserRegistrationView, UserProfileView, invoice_events, invoice_event_stream
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 # ✅ Router setup for invoices
@@ -16,6 +16,10 @@ urlpatterns = [
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
+    # ✅ Invoice status events (before the router so `events` isn't read as an invoice id)
+    path('invoices/events/', invoice_events, name='invoice-events'),
+    path('invoices/events/stream/', invoice_event_stream, name='invoice-event-stream'),
+
     # ✅ Invoice-related endpoints
     path('', include(router.urls)),
 ]
@@ -1,13 +1,28 @@
 import os
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
 from django.contrib.auth.models import User
 from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from .models import Invoice
 from .serializers import InvoiceSerializer, UserSerializer, UserRegistrationSerializer
-from .llm_service import InvoiceExtractor
+from .jobs import enqueue_invoice
+from .uploads import ingest_files, rejected_uploads
+from .pagination import InvoiceCursorPagination
+from .exports import CONTENT_TYPES, STREAMERS
+from .analytics import user_analytics, user_version
+from .conditional import (cache_detail, cached_detail, etag_matches, invoice_etag, not_modified,
+                          response_cache_setting, tag_response)
+from .search import search_invoices, search_setting
+from .events import event_setting, stream_events, wait_for_events
+from .authentication import CachedJWTAuthentication
 
 class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -25,9 +40,19 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def paginator(self):
+        """Page-number pagination by default; `?pagination=cursor` opts into keyset pagination."""
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = InvoiceCursorPagination()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
     def get_queryset(self):
-        """Allow filtering invoices by status and date."""
-        queryset = Invoice.objects.filter(user=self.request.user).order_by('-uploaded_at')
+        """Allow filtering invoices by status and date (soft-deleted invoices are hidden)."""
+        queryset = Invoice.objects.filter(user=self.request.user, is_deleted=False).order_by('-uploaded_at', '-id')
         status_filter = self.request.query_params.get('status', None)
         date_filter = self.request.query_params.get('date', None)
 
@@ -39,45 +64,48 @@ class InvoiceViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-    def perform_create(self, serializer):
-        """Save the invoice and start processing."""
-        invoice = serializer.save(user=self.request.user, status='pending')
-        self.process_invoice(invoice)
-        return invoice
+    def list(self, request, *args, **kwargs):
+        """Invoice list with a weak ETag; answers 304 without querying invoices if nothing changed."""
+        if not response_cache_setting('ENABLED'):
+            return super().list(request, *args, **kwargs)
+        etag = invoice_etag(request, user_version(request.user.pk))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return tag_response(super().list(request, *args, **kwargs), etag)
 
-    def process_invoice(self, invoice):
-        """Extract invoice data using LLM."""
-        if invoice.status in ['processing', 'completed']:
-            return  # Avoid redundant processing
+    def retrieve(self, request, *args, **kwargs):
+        """Invoice detail with a weak ETag; completed invoices are served from the detail cache."""
+        if not response_cache_setting('ENABLED'):
+            return super().retrieve(request, *args, **kwargs)
+        version = user_version(request.user.pk)
+        etag = invoice_etag(request, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
-        try:
-            # Update status to processing
-            invoice.status = 'processing'
-            invoice.save()
-
-            file_path = invoice.file.path
-
-            # Extract data using LLM
-            extractor = InvoiceExtractor()
-            result = extractor.extract_invoice_data(file_path)
-
-            if result['success']:
-                # Update invoice with extracted data
-                invoice.invoice_date = result['data'].get('invoice_date')
-                invoice.invoice_number = result['data'].get('invoice_number')
-                invoice.amount = result['data'].get('amount')
-                invoice.due_date = result['data'].get('due_date')
-                invoice.status = 'completed'
-            else:
-                invoice.status = 'failed'
-                invoice.error_message = result.get('error', 'Unknown extraction error')
+        data = cached_detail(request, kwargs[self.lookup_field], version)
+        if data is None:
+            invoice = self.get_object()
+            data = self.get_serializer(invoice).data
+            cache_detail(request, invoice, version, data)
+        return tag_response(Response(data), etag)
 
-            invoice.save()
+    def create(self, request, *args, **kwargs):
+        """Accept the upload and return immediately; extraction runs in the worker pool."""
+        serializer = self.get_serializer(data=request.data)
 
-        except Exception as e:
-            invoice.status = 'failed'
-            invoice.error_message = str(e)
-            invoice.save()
+        # Files rejected while streaming (size/type) never reach the serializer
+        rejected = rejected_uploads(request)
+        if rejected:
+            return Response({"file": [rejected[0]['error']]}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers=headers)
+
+    def perform_create(self, serializer):
+        """Save the invoice as pending so an extraction worker picks it up."""
+        return serializer.save(user=self.request.user, status='pending')
 
     @action(detail=True, methods=['post'])
     def reprocess(self, request, pk=None):
@@ -87,7 +115,153 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if invoice.status != 'failed':
             return Response({"error": "Only failed invoices can be reprocessed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.process_invoice(invoice)
+        enqueue_invoice(invoice)
         serializer = self.get_serializer(invoice)
-        return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Upload many invoices at once as a multipart list (`files`) and/or ZIP archives."""
+        files = request.FILES.getlist('files') + request.FILES.getlist('file')
+        streaming_rejected = rejected_uploads(request)
+        if not files and not streaming_rejected:
+            return Response({"error": "No files were uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+
+        accepted, rejected = ingest_files(request.user, files)
+        rejected = streaming_rejected + rejected
+        return Response(
+            {"accepted": accepted, "rejected": rejected},
+            status=status.HTTP_202_ACCEPTED if accepted else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream invoices as CSV or NDJSON (`?output=csv|ndjson`).
+
+        Honors the `status`/`date` filters; `since` (ISO datetime) returns only invoices
+        completed after that watermark, oldest first, for incremental pulls.
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in STREAMERS:
+            return Response({"error": "output must be 'csv' or 'ndjson'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset()
+        since = request.query_params.get('since')
+        if since:
+            since_value = parse_datetime(since)
+            if since_value is None:
+                return Response({"error": "since must be an ISO 8601 datetime."}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(status='completed', processing_completed_at__gt=since_value)
+        queryset = queryset.order_by('processing_completed_at', 'id')
+
+        response = StreamingHttpResponse(STREAMERS[output](queryset), content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="invoices.{output}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """Dashboard totals, status counts, amount due in the next `days` (default 30) and monthly spend."""
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"error": "days must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= days <= 366:
+            return Response({"error": "days must be between 0 and 366."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(user_analytics(request.user, days=days))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over extracted invoice text and invoice numbers (`?q=`, optional `limit`)."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= search_setting('MAX_RESULTS'):
+            return Response({"error": f"limit must be between 1 and {search_setting('MAX_RESULTS')}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = search_invoices(request.user, query, limit=limit)
+        serializer = self.get_serializer([result['invoice'] for result in results], many=True)
+        return Response({
+            "query": query,
+            "results": [
+                {**data, "rank": result['rank'], "matched": result['matched'], "highlight": result['highlight']}
+                for data, result in zip(serializer.data, results)
+            ],
+        })
+
+
+
+# ✅ Status event endpoints are plain async Django views (DRF views are sync), so an idle
+# subscriber is a suspended coroutine instead of a blocked worker thread when served over ASGI.
+
+@sync_to_async
+def _event_user(request):
+    """JWT auth for the event endpoints; EventSource can't set headers, so `?token=` is accepted too."""
+    authenticator = CachedJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        return authenticator.get_user(authenticator.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _event_cursor(request):
+    """Last event id the client has seen (`?after=` or the SSE Last-Event-ID header), or None if invalid."""
+    value = request.headers.get('Last-Event-ID') or request.GET.get('after') or '0'
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return None
+
+
+async def invoice_events(request):
+    """
+    Long-poll for status changes: GET /invoices/events/?after=<cursor>.
+
+    Returns immediately if events newer than `after` exist, otherwise waits up to
+    LONG_POLL_TIMEOUT seconds. Pass the returned `cursor` as `after` next time.
+    """
+    user = await _event_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    after = _event_cursor(request)
+    if after is None:
+        return JsonResponse({"error": "after must be an integer."}, status=400)
+
+    events = await wait_for_events(user.pk, after, event_setting('LONG_POLL_TIMEOUT'))
+    cursor = events[-1]['id'] if events else after
+    return JsonResponse({"events": events, "cursor": cursor})
+
+
+async def invoice_event_stream(request):
+    """Server-Sent Events stream of status changes: GET /invoices/events/stream/?after=<cursor>."""
+    user = await _event_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    after = _event_cursor(request)
+    if after is None:
+        return JsonResponse({"error": "after must be an integer."}, status=400)
+
+    async def sse():
+        encoder = DjangoJSONEncoder()
+        yield "retry: 3000\n\n"
+        async for event in stream_events(user.pk, after):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: status\ndata: {encoder.encode(event)}\n\n"
 
+    response = StreamingHttpResponse(sse(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response